@@ -0,0 +1,284 @@
+"""
+Crawls a synthetic web served from loopback (see synthetic_web.py) and reports pages/sec, per stage latency, peak RSS
+and database size, without touching the internet.
+
+Results are appended to benchmarks/results/crawl_benchmark.jsonl along with the git revision, and compared against
+the last result recorded with the same settings so regressions between revisions show up.
+
+Run from the src directory: python -m benchmarks.crawl_benchmark [--async] [--pages 2000] [--hosts 20]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+sys.path.insert(0, ".")
+
+from benchmarks.synthetic_web import SyntheticWebConfig, serve  # noqa
+
+RESULTS_PATH = "./benchmarks/results/crawl_benchmark.jsonl"
+
+
+class PeakRSSSampler:
+    """
+    Samples the process' resident set size from a background thread and keeps the highest value.
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while True:
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return revision + ("-dirty" if dirty else "")
+
+
+def directory_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            size += os.path.getsize(os.path.join(root, file))
+    return size
+
+
+def crawl_sync(crawler, max_pages: int, duration: float) -> None:
+    """
+    Steps the crawler like main.py does until max_pages are crawled, duration runs out or the frontier empties.
+    """
+    from crawler.exceptions import NoUrlException
+
+    deadline = time.monotonic() + duration
+    try:
+        while crawler.stats.pages_crawled < max_pages and time.monotonic() < deadline:
+            crawler.step()
+    except NoUrlException:
+        pass
+
+
+async def crawl_async(crawler, max_pages: int, duration: float) -> None:
+    """
+    Runs the async crawler until max_pages are crawled, duration runs out or the frontier empties.
+    """
+    task = asyncio.create_task(crawler.crawl())
+    deadline = time.monotonic() + duration
+
+    while not task.done():
+        if crawler.stats.pages_crawled >= max_pages or time.monotonic() >= deadline:
+            task.cancel()
+            break
+        await asyncio.sleep(0.05)
+
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def run_crawl(seed_urls: list[str], work_directory: str, use_async: bool, args) -> dict:
+    # The database module reads its path on import, so only import the crawler once it's set.
+    os.environ["OWS_DB_PATH"] = os.path.join(work_directory, "pages.db")
+
+    from crawler import AsyncCrawler, Crawler
+    from crawler.crawleroptions import DefaultCrawlerOptions
+
+    options = DefaultCrawlerOptions()
+    options.allow_private_hosts = True
+    options.frontier_checkpoint_path = os.path.join(work_directory, "frontier.db")
+    options.seen_url_store_path = os.path.join(work_directory, "seen.db")
+    options.use_seen_url_filter = args.seen_url_filter
+    options.max_concurrent_requests = args.concurrency
+
+    crawler_class = AsyncCrawler if use_async else Crawler
+    crawler = crawler_class(seed_url=seed_urls[0], crawler_options=options)
+    crawler.url_manager.add_many_to_to_crawl_queue(set(seed_urls[1:]))
+
+    with PeakRSSSampler() as rss:
+        start = time.perf_counter()
+        if use_async:
+            asyncio.run(crawl_async(crawler, args.pages, args.duration))
+        else:
+            crawl_sync(crawler, args.pages, args.duration)
+        elapsed = time.perf_counter() - start
+
+        # Include flushing the writer and checkpoint, the crawl isn't done until they're on disk.
+        crawler.close()
+
+    stats = crawler.stats
+    return dict(
+        pages=stats.pages_crawled,
+        pages_ok=stats.pages_ok,
+        elapsed=elapsed,
+        pages_per_second=stats.pages_crawled / elapsed if elapsed else 0.0,
+        bytes_downloaded=stats.bytes_downloaded,
+        peak_rss_mb=rss.peak / 2**20,
+        db_size_mb=directory_size(work_directory) / 2**20,
+        stages={
+            stage: dict(
+                p50=p50,
+                p95=p95,
+                p99=p99,
+                total=stats.stage_times[stage].sum,
+                count=stats.stage_times[stage].count,
+            )
+            for stage, (p50, p95, p99) in stats.stage_quantiles().items()
+        },
+    )
+
+
+def print_result(result: dict, previous: dict | None) -> None:
+    print(
+        f"{result['pages']} pages ({result['pages_ok']} ok) in {result['elapsed']:.1f}s: "
+        f"{result['pages_per_second']:.1f} pages/s, {result['bytes_downloaded'] / 2**20:.1f} MiB downloaded, "
+        f"peak RSS {result['peak_rss_mb']:.1f} MiB, databases {result['db_size_mb']:.1f} MiB"
+    )
+
+    print(
+        f"{'stage':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'total s':>9} {'count':>7}"
+    )
+    for stage, times in result["stages"].items():
+        print(
+            f"{stage:>12} {times['p50'] * 1000:>9.2f} {times['p95'] * 1000:>9.2f} {times['p99'] * 1000:>9.2f} "
+            f"{times['total']:>9.2f} {times['count']:>7}"
+        )
+
+    if previous is None:
+        return
+
+    print(f"Compared to {previous['revision']} ({previous['timestamp']}):")
+    for key, label in (
+        ("pages_per_second", "pages/s"),
+        ("peak_rss_mb", "peak RSS MiB"),
+        ("db_size_mb", "database MiB"),
+    ):
+        before, after = previous[key], result[key]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{label:>14}: {before:.1f} -> {after:.1f} ({change:+.1f}%)")
+
+
+def load_previous(path: str, settings: dict) -> dict | None:
+    if not os.path.isfile(path):
+        return None
+
+    previous = None
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["settings"] == settings:
+                previous = record
+    return previous
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages to crawl.")
+    parser.add_argument(
+        "--duration", type=float, default=120, help="Maximum seconds to crawl."
+    )
+    parser.add_argument("--hosts", type=int, default=20)
+    parser.add_argument("--pages-per-host", type=int, default=200)
+    parser.add_argument("--links-per-page", type=int, default=20)
+    parser.add_argument("--median-page-size", type=int, default=20_000)
+    parser.add_argument("--crawl-delay-hosts", type=int, default=2)
+    parser.add_argument(
+        "--concurrency", type=int, default=64, help="Requests in flight, --async only."
+    )
+    parser.add_argument("--seen-url-filter", action="store_true")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument(
+        "--no-save", action="store_true", help="Don't append the result to --results."
+    )
+    args = parser.parse_args()
+
+    web_config = SyntheticWebConfig(
+        hosts=args.hosts,
+        pages_per_host=args.pages_per_host,
+        links_per_page=args.links_per_page,
+        median_page_size=args.median_page_size,
+        crawl_delay_hosts=args.crawl_delay_hosts,
+    )
+
+    # The server runs in its own process so it doesn't count towards the crawler's CPU time and memory.
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    stop = context.Event()
+    server = context.Process(target=serve, args=(web_config, ready, stop), daemon=True)
+    server.start()
+    seed_urls = ready.get(timeout=60)
+
+    work_directory = tempfile.mkdtemp(prefix="ows-crawl-benchmark-")
+    try:
+        result = run_crawl(seed_urls, work_directory, args.use_async, args)
+    finally:
+        stop.set()
+        server.join()
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    settings = dict(
+        web=web_config.to_dict(),
+        mode="async" if args.use_async else "sync",
+        max_pages=args.pages,
+        duration=args.duration,
+        concurrency=args.concurrency if args.use_async else 1,
+        seen_url_filter=args.seen_url_filter,
+    )
+    previous = load_previous(args.results, settings)
+    print_result(result, previous)
+
+    if not args.no_save:
+        record = dict(
+            revision=git_revision(),
+            timestamp=datetime.datetime.now().isoformat(timespec="seconds"),
+            settings=settings,
+            **result,
+        )
+        os.makedirs(os.path.dirname(args.results), exist_ok=True)
+        with open(args.results, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    run()
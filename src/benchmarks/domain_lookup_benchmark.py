@@ -0,0 +1,67 @@
+"""
+Compares domain lookups on the old domains schema (no index, LOWER() in the query) against the indexed, normalized
+schema, for growing table sizes.
+
+Run from the src directory: python -m benchmarks.domain_lookup_benchmark
+"""
+
+import random
+import sqlite3
+import time
+
+
+def make_table(connection: sqlite3.Connection, row_count: int, indexed: bool) -> None:
+    connection.execute("DROP TABLE IF EXISTS domains")
+    connection.execute(
+        "CREATE TABLE domains (id INTEGER PRIMARY KEY, domain VARCHAR, robots VARCHAR, last_crawled DATETIME)"
+    )
+    connection.executemany(
+        "INSERT INTO domains (domain, robots) VALUES (?, '')",
+        ((f"d{i}.example.com",) for i in range(row_count)),
+    )
+    if indexed:
+        connection.execute("CREATE UNIQUE INDEX ix_domains_domain ON domains (domain)")
+    connection.commit()
+
+
+def time_lookups(
+    connection: sqlite3.Connection, query: str, row_count: int, lookups: int
+) -> float:
+    """
+    :return: Microseconds per lookup.
+    """
+    domains = [f"d{random.randrange(row_count)}.example.com" for _ in range(lookups)]
+
+    start = time.perf_counter()
+    for domain in domains:
+        connection.execute(query, (domain,)).fetchone()
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def run(lookups: int = 200) -> None:
+    connection = sqlite3.connect(":memory:")
+
+    print(f"{'domains':>9} {'lower() us':>11} {'indexed us':>11}")
+
+    for row_count in (1_000, 10_000, 100_000, 1_000_000):
+        make_table(connection, row_count, indexed=False)
+        old_us = time_lookups(
+            connection,
+            "SELECT * FROM domains WHERE LOWER(domain) = ? LIMIT 1",
+            row_count,
+            lookups,
+        )
+
+        make_table(connection, row_count, indexed=True)
+        new_us = time_lookups(
+            connection,
+            "SELECT * FROM domains WHERE domain = ? LIMIT 1",
+            row_count,
+            lookups,
+        )
+
+        print(f"{row_count:>9} {old_us:>11.2f} {new_us:>11.2f}")
+
+
+if __name__ == "__main__":
+    run()
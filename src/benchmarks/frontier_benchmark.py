@@ -0,0 +1,103 @@
+"""
+Compares the old dict of lists frontier against crawler.frontier.Frontier, with URLs spread over every priority and a
+few depths, and reports the memory the frontier takes per URL.
+
+Run from the src directory: python -m benchmarks.frontier_benchmark
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, ".")
+
+from crawler.frontier import PRIORITY_LEVELS, Frontier  # noqa
+
+
+def legacy_push(to_crawl: dict[str, list[str]], domain: str, url: str) -> None:
+    if domain in to_crawl.keys():
+        to_crawl[domain].append(url)
+    else:
+        to_crawl[domain] = [url]
+
+
+def legacy_pop(to_crawl: dict[str, list[str]]) -> str:
+    domain_choice = random.choice(list(to_crawl.keys()))
+    current_url = random.choice(to_crawl[domain_choice])
+    to_crawl[domain_choice].remove(current_url)
+
+    if len(to_crawl[domain_choice]) == 0:
+        del to_crawl[domain_choice]
+    return current_url
+
+
+def frontier_pop(frontier: Frontier) -> str:
+    return frontier.pop(frontier.random_domain()).url
+
+
+def make_urls(url_count: int, domain_count: int) -> list[tuple[str, str, int, int]]:
+    """
+    :return: List of (domain, URL, priority, depth).
+    """
+    rng = random.Random(0)
+    urls = []
+    for i in range(url_count):
+        domain = f"d{i % domain_count}.example.com"
+        urls.append(
+            (
+                domain,
+                f"https://{domain}/page/{i}",
+                rng.randrange(PRIORITY_LEVELS),
+                rng.randrange(8),
+            )
+        )
+    return urls
+
+
+def time_pops(queue, pop, count: int) -> float:
+    """
+    :return: Microseconds per pop.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        pop(queue)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def run(pop_count: int = 200) -> None:
+    print(
+        f"{'urls':>10} {'domains':>8} {'legacy us/pop':>14} {'frontier us/pop':>16} {'frontier B/url':>15}"
+    )
+
+    for url_count, domain_count in (
+        (10_000, 100),
+        (100_000, 1_000),
+        (1_000_000, 10_000),
+        (1_000_000, 100),
+    ):
+        urls = make_urls(url_count, domain_count)
+
+        legacy = dict()
+        for domain, url, _, _ in urls:
+            legacy_push(legacy, domain, url)
+
+        # The URL strings are shared with the list above, only the frontier's own structures are counted.
+        tracemalloc.start()
+        frontier = Frontier()
+        for domain, url, priority, depth in urls:
+            frontier.push(domain, url, priority, depth)
+        frontier_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        legacy_us = time_pops(legacy, legacy_pop, pop_count)
+        frontier_us = time_pops(frontier, frontier_pop, pop_count)
+
+        print(
+            f"{url_count:>10} {domain_count:>8} {legacy_us:>14.2f} {frontier_us:>16.2f} "
+            f"{frontier_bytes / url_count:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
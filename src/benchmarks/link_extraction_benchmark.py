@@ -0,0 +1,71 @@
+"""
+Compares building the lxml tree (Page's DOM path) against the streaming extractor on large pages.
+
+Run from the src directory: python -m benchmarks.link_extraction_benchmark
+"""
+
+import datetime
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from crawler.page import Page  # noqa
+
+
+def make_page(link_count: int, filler_paragraphs: int) -> bytes:
+    parts = [
+        "<html><head><title>Benchmark page</title>",
+        '<meta name="description" content="benchmark">',
+        "</head><body>",
+    ]
+    for i in range(link_count):
+        parts.append(
+            f'<div><p>Item {i}</p><a href="/item/{i}?page=2">item {i}</a></div>'
+        )
+    for i in range(filler_paragraphs):
+        parts.append(f"<p>{'lorem ipsum dolor sit amet ' * 20}</p>")
+    parts.append("</body></html>")
+    return "".join(parts).encode()
+
+
+def time_extraction(content: bytes, stream_parse: bool, repeat: int) -> float:
+    """
+    :return: Milliseconds per page.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        page = Page(
+            status_code=200,
+            elapsed=datetime.timedelta(),
+            content=content,
+            url="https://example.com/index.html",
+            response_headers={},
+            stream_parse=stream_parse,
+        )
+        page.get_links()
+        _ = page.html_title
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+def run(repeat: int = 10) -> None:
+    print(f"{'links':>7} {'size kb':>8} {'dom ms':>8} {'stream ms':>10}")
+
+    for link_count, filler_paragraphs in (
+        (50, 10),
+        (1_000, 100),
+        (10_000, 1_000),
+        (50_000, 5_000),
+    ):
+        content = make_page(link_count, filler_paragraphs)
+
+        dom_ms = time_extraction(content, stream_parse=False, repeat=repeat)
+        stream_ms = time_extraction(content, stream_parse=True, repeat=repeat)
+
+        print(
+            f"{link_count:>7} {len(content) // 1024:>8} {dom_ms:>8.2f} {stream_ms:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
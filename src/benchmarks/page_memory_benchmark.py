@@ -0,0 +1,104 @@
+"""
+Pushes a long run of pages through the same steps as Crawler.step (links, fingerprint text, title, release) and
+samples RSS along the way, for the current Page and for the old design that cached html_tree and html_title in
+lru_caches keyed on the page.
+
+Each variant runs in its own process so they don't share a heap. RSS should level off after the first checkpoint for
+Page, the legacy variant holds on to the last 128 pages' bodies and trees.
+
+Run from the src directory: python -m benchmarks.page_memory_benchmark
+"""
+
+import datetime
+import multiprocessing
+import sys
+
+from functools import lru_cache
+
+import psutil
+
+sys.path.insert(0, ".")
+
+from crawler.page import Page  # noqa
+
+from lxml.html import document_fromstring  # noqa
+
+
+class LegacyPage(Page):
+    """
+    Page with the old module level lru_caches on html_tree and html_title, which keep the page alive.
+    """
+
+    @property
+    @lru_cache()
+    def html_tree(self):
+        return document_fromstring(self.content)
+
+    @property
+    @lru_cache()
+    def html_title(self) -> str:
+        return self._find_title()
+
+    def release(self) -> None:
+        # The old Page kept its body until it was garbage collected.
+        pass
+
+
+def make_page(index: int, link_count: int, filler_paragraphs: int) -> bytes:
+    parts = [f"<html><head><title>Page {index}</title></head><body>"]
+    for i in range(link_count):
+        parts.append(f'<div><a href="/page/{index}/{i}">link {i}</a></div>')
+    for i in range(filler_paragraphs):
+        parts.append(f"<p>page {index} paragraph {i} {'lorem ipsum dolor ' * 20}</p>")
+    parts.append("</body></html>")
+    return "".join(parts).encode()
+
+
+def crawl_pages(
+    page_class: type[Page], page_count: int, checkpoint_every: int, results
+) -> None:
+    process = psutil.Process()
+    rss = []
+
+    for i in range(page_count):
+        page = page_class(
+            status_code=200,
+            elapsed=datetime.timedelta(),
+            content=make_page(i, link_count=200, filler_paragraphs=100),
+            url=f"https://example{i % 50}.com/page/{i}",
+            response_headers={},
+            stream_parse=False,
+        )
+        page.get_links()
+        _ = page.text
+        _ = page.html_title
+        page.release()
+
+        if (i + 1) % checkpoint_every == 0:
+            rss.append(process.memory_info().rss / 2**20)
+
+    results.put(rss)
+
+
+def run(page_count: int = 5000, checkpoint_every: int = 500) -> None:
+    context = multiprocessing.get_context("spawn")
+
+    rss_by_variant = dict()
+    for name, page_class in (("Page", Page), ("legacy", LegacyPage)):
+        results = context.Queue()
+        process = context.Process(
+            target=crawl_pages, args=(page_class, page_count, checkpoint_every, results)
+        )
+        process.start()
+        rss_by_variant[name] = results.get()
+        process.join()
+
+    print(f"{'pages':>8} {'Page RSS MiB':>14} {'legacy RSS MiB':>16}")
+    for i, (rss, legacy_rss) in enumerate(
+        zip(rss_by_variant["Page"], rss_by_variant["legacy"])
+    ):
+        print(f"{(i + 1) * checkpoint_every:>8} {rss:>14.1f} {legacy_rss:>16.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,92 @@
+"""
+Builds a synthetic link graph in a temporary pages database and times loading it, computing PageRank and writing the
+scores back, along with the peak RSS of each phase. Link targets follow a power law like on the web, a few URLs get
+most of the links.
+
+Run from the src directory: python -m benchmarks.pagerank_benchmark [--urls 1000000] [--edges 10000000]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+
+from benchmarks.crawl_benchmark import PeakRSSSampler  # noqa
+
+
+def make_graph(connection, url_count: int, edge_count: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    connection.execute("BEGIN")
+    connection.executemany(
+        "INSERT INTO urls (id, url) VALUES (?, ?)",
+        ((i, f"https://example{i % 10_000}.com/{i}") for i in range(1, url_count + 1)),
+    )
+
+    links_per_source = max(edge_count // url_count, 1)
+    edges = (
+        (source, int(url_count * rng.paretovariate(1.2)) % url_count + 1)
+        for source in range(1, url_count + 1)
+        for _ in range(links_per_source)
+    )
+    connection.executemany(
+        "INSERT OR IGNORE INTO links (source_id, target_id) VALUES (?, ?)", edges
+    )
+    connection.execute("COMMIT")
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200_000)
+    parser.add_argument("--edges", type=int, default=2_000_000)
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="ows-pagerank-benchmark-")
+    # The database module reads its path on import, so only import it once it's set.
+    os.environ["OWS_DB_PATH"] = os.path.join(directory, "pages.db")
+
+    from database import db, pagerank
+
+    try:
+        connection = sqlite3.connect(db.DB_PATH, isolation_level=None)
+
+        start = time.perf_counter()
+        make_graph(connection, args.urls, args.edges)
+        print(f"Built the graph in {time.perf_counter() - start:.1f}s")
+
+        timings = []
+        with PeakRSSSampler() as rss:
+            start = time.perf_counter()
+            graph = pagerank.LinkGraph(connection, chunk_size=args.chunk_size)
+            timings.append(("load", time.perf_counter() - start, rss.peak))
+
+            start = time.perf_counter()
+            rank, in_degree = pagerank.pagerank(graph)
+            timings.append(("pagerank", time.perf_counter() - start, rss.peak))
+
+            start = time.perf_counter()
+            pagerank.write_scores(connection, graph, rank, in_degree)
+            timings.append(("write", time.perf_counter() - start, rss.peak))
+            graph.close()
+
+        print(
+            f"{graph.edge_count} edges between {args.urls} URLs, "
+            f"{'numpy' if pagerank.numpy is not None else 'pure Python'}"
+        )
+        print(f"{'phase':>9} {'seconds':>8} {'peak RSS MiB':>13}")
+        for phase, seconds, peak in timings:
+            print(f"{phase:>9} {seconds:>8.1f} {peak / 2**20:>13.1f}")
+
+        connection.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
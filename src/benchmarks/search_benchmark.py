@@ -0,0 +1,189 @@
+"""
+Grows a search index over a synthetic corpus and reports, at every corpus size, the rate the last batch of documents
+was indexed at and the latency of a mix of queries. The same queries are timed as LIKE scans over a plain table
+holding the same text, which is what searching the pages table amounts to without the index.
+
+Words are drawn from a Zipf distribution so there are very common and very rare terms, like in real text.
+
+Run from the src directory: python -m benchmarks.search_benchmark [--sizes 10000 50000 100000] [--no-like]
+"""
+
+import argparse
+import itertools
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+
+from database.search import SearchDocument, SearchIndex  # noqa
+
+LETTERS = "bcdfghjklmnprstvz"
+VOWELS = "aeiou"
+
+
+def make_vocabulary(size: int) -> list[str]:
+    """
+    Makes pronounceable made-up words, so the tokenizer and stemmer treat them like real ones.
+    """
+    syllables = [c + v for c in LETTERS for v in VOWELS]
+    words = []
+    for length in itertools.count(2):
+        for parts in itertools.product(syllables, repeat=length):
+            words.append("".join(parts))
+            if len(words) == size:
+                return words
+
+
+class Corpus:
+    def __init__(self, vocabulary_size: int, words_per_page: int, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.words_per_page = words_per_page
+        self.vocabulary = make_vocabulary(vocabulary_size)
+        self.cum_weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, vocabulary_size + 1))
+        )
+
+    def words(self, count: int) -> list[str]:
+        return self.rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=count)
+
+    def documents(self, start: int, count: int) -> list[SearchDocument]:
+        return [
+            SearchDocument(
+                url=f"https://example{i % 1000}.com/page/{i}",
+                domain=f"example{i % 1000}.com",
+                crawled_at=None,
+                title=" ".join(self.words(6)),
+                text=" ".join(self.words(self.words_per_page)),
+            )
+            for i in range(start, start + count)
+        ]
+
+
+def queries(corpus: Corpus) -> dict[str, tuple[str, bool, int]]:
+    """
+    :return: Name -> (query, raw, page).
+    """
+    vocabulary = corpus.vocabulary
+    common, mid, rare = vocabulary[1], vocabulary[200], vocabulary[len(vocabulary) // 2]
+    return {
+        "common term": (common, False, 1),
+        "rare term": (rare, False, 1),
+        "two terms": (f"{common} {mid}", False, 1),
+        "phrase": (f'"{vocabulary[0]} {common}"', True, 1),
+        "prefix": (f"{mid[:4]}*", True, 1),
+        "page 10": (common, False, 10),
+    }
+
+
+def time_query(
+    index: SearchIndex, query: str, raw: bool, page: int, repeats: int
+) -> list[float]:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        index.search(query, page=page, raw=raw)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def time_like(connection: sqlite3.Connection, word: str, repeats: int) -> list[float]:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        connection.execute(
+            "SELECT url FROM pages WHERE content LIKE ? OR title LIKE ? LIMIT 10",
+            (f"%{word}%", f"%{word}%"),
+        ).fetchall()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def quantile(times: list[float], q: float) -> float:
+    if len(times) == 1:
+        return times[0]
+    return statistics.quantiles(times, n=100, method="inclusive")[int(q * 100) - 1]
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000]
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument(
+        "--no-like", action="store_true", help="Skip timing LIKE scans."
+    )
+    args = parser.parse_args()
+
+    corpus = Corpus(args.vocabulary, args.words_per_page)
+    query_set = queries(corpus)
+
+    directory = tempfile.mkdtemp(prefix="ows-search-benchmark-")
+    try:
+        index = SearchIndex(os.path.join(directory, "search.db"))
+        like = None
+        if not args.no_like:
+            like = sqlite3.connect(os.path.join(directory, "pages.db"))
+            like.execute("CREATE TABLE pages (url TEXT, title TEXT, content TEXT)")
+
+        indexed = 0
+        for size in sorted(args.sizes):
+            index_time = 0.0
+            added = size - indexed
+            while indexed < size:
+                documents = corpus.documents(
+                    indexed, min(args.batch_size, size - indexed)
+                )
+
+                start = time.perf_counter()
+                index.add_documents(documents, last_page_id=indexed + len(documents))
+                index_time += time.perf_counter() - start
+
+                if like is not None:
+                    with like:
+                        like.executemany(
+                            "INSERT INTO pages VALUES (?, ?, ?)",
+                            ((d.url, d.title, d.text) for d in documents),
+                        )
+                indexed += len(documents)
+
+            index_size = sum(
+                os.path.getsize(os.path.join(directory, file))
+                for file in os.listdir(directory)
+                if file.startswith("search.db")
+            )
+            print(
+                f"{size} documents: indexed the last {added} at {added / index_time:.0f} docs/s, "
+                f"index {index_size / 2**20:.1f} MiB"
+            )
+            print(f"{'query':>14} {'p50 ms':>9} {'p95 ms':>9} {'LIKE p50 ms':>12}")
+            for name, (query, raw, page) in query_set.items():
+                times = time_query(index, query, raw, page, args.repeats)
+
+                like_ms = ""
+                if like is not None and name == "rare term":
+                    like_times = time_like(like, query, max(1, args.repeats // 10))
+                    like_ms = f"{statistics.median(like_times) * 1000:.2f}"
+                print(
+                    f"{name:>14} {quantile(times, 0.5) * 1000:>9.2f} {quantile(times, 0.95) * 1000:>9.2f} "
+                    f"{like_ms:>12}"
+                )
+
+        index.close()
+        if like is not None:
+            like.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
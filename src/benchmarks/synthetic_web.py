@@ -0,0 +1,244 @@
+"""
+A synthetic web served from loopback for the crawl benchmark, see crawl_benchmark.py.
+
+Every host gets its own HTTP server on its own loopback address (127.0.0.2, 127.0.0.3, ...) so the crawler sees them as
+separate domains. Where loopback aliases can't be bound (macOS without configured aliases) every host listens on
+127.0.0.1 with its own port instead. The graph is generated from a seed, so the same config always serves the same
+site.
+"""
+
+import http.server
+import random
+import threading
+import time
+
+from dataclasses import dataclass, asdict
+
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+
+
+@dataclass
+class SyntheticWebConfig:
+    # Amount of hosts and pages on each of them.
+    hosts: int = 20
+    pages_per_host: int = 100
+
+    # Links on every page, and the share of them pointing to another host.
+    links_per_page: int = 20
+    external_link_ratio: float = 0.2
+
+    # Median body size in bytes, sizes are log-normally distributed around it.
+    median_page_size: int = 20_000
+
+    # Share of pages that are slow to respond, and how slow.
+    slow_page_ratio: float = 0.02
+    slow_page_delay: float = 0.5
+
+    # Share of pages that redirect to another page on the host.
+    redirect_ratio: float = 0.02
+
+    # Share of pages with a large body, and its size in bytes.
+    large_page_ratio: float = 0.005
+    large_page_size: int = 2_000_000
+
+    # Share of links to pages that don't exist.
+    broken_link_ratio: float = 0.01
+
+    # Amount of hosts whose robots.txt asks for a crawl delay, and the delay in seconds.
+    crawl_delay_hosts: int = 2
+    crawl_delay: int = 1
+
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class SyntheticWeb:
+    """
+    The pages of the synthetic web, generated up front so serving them costs as little as possible.
+    """
+
+    def __init__(self, config: SyntheticWebConfig, host_names: list[str]):
+        """
+        :param config: The web's config.
+        :param host_names: host:port of every host, in host index order.
+        """
+        self.config = config
+        self.host_names = host_names
+
+        rng = random.Random(config.seed)
+
+        # (host, page) -> kind of page, body size and links.
+        self.kinds: dict[tuple[int, int], str] = dict()
+        self.sizes: dict[tuple[int, int], int] = dict()
+        self.links: dict[tuple[int, int], list[str]] = dict()
+
+        for host in range(config.hosts):
+            for page in range(config.pages_per_host):
+                roll = rng.random()
+                if roll < config.slow_page_ratio:
+                    kind = "slow"
+                elif roll < config.slow_page_ratio + config.redirect_ratio:
+                    kind = "redirect"
+                elif (
+                    roll
+                    < config.slow_page_ratio
+                    + config.redirect_ratio
+                    + config.large_page_ratio
+                ):
+                    kind = "large"
+                else:
+                    kind = "normal"
+                self.kinds[(host, page)] = kind
+
+                if kind == "large":
+                    self.sizes[(host, page)] = config.large_page_size
+                else:
+                    self.sizes[(host, page)] = int(
+                        rng.lognormvariate(0, 0.75) * config.median_page_size
+                    )
+
+                links = []
+                for _ in range(config.links_per_page):
+                    target_host = host
+                    if rng.random() < config.external_link_ratio:
+                        target_host = rng.randrange(config.hosts)
+
+                    if rng.random() < config.broken_link_ratio:
+                        path = f"/missing/{rng.randrange(1_000_000)}"
+                    else:
+                        path = f"/p/{rng.randrange(config.pages_per_host)}"
+
+                    if target_host == host:
+                        links.append(path)
+                    else:
+                        links.append(f"http://{host_names[target_host]}{path}")
+                self.links[(host, page)] = links
+
+    @property
+    def seed_urls(self) -> list[str]:
+        return [f"http://{host_name}/p/0" for host_name in self.host_names]
+
+    def robots_txt(self, host: int) -> bytes:
+        lines = ["User-agent: *", "Disallow: /private"]
+        if host < self.config.crawl_delay_hosts:
+            lines.append(f"Crawl-delay: {self.config.crawl_delay}")
+        return ("\n".join(lines) + "\n").encode()
+
+    def page_body(self, host: int, page: int) -> bytes:
+        links = "".join(
+            f'<li><a href="{link}">link {i}</a></li>'
+            for i, link in enumerate(self.links[(host, page)])
+        )
+        head = f"<html><head><title>Host {host} page {page}</title></head><body><ul>{links}</ul>"
+
+        # Salt the filler so pages aren't near-duplicates of each other.
+        salt = f"host{host} page{page} "
+        filler_size = max(self.sizes[(host, page)] - len(head), 0)
+        paragraph = f"<p>{salt}{FILLER * 4}</p>"
+        filler = paragraph * (filler_size // len(paragraph) + 1)
+        return (head + filler[:filler_size] + "</body></html>").encode()
+
+
+def make_handler(web: SyntheticWeb, host: int):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_body(self, status: int, content_type: str, body: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/robots.txt":
+                self.send_body(200, "text/plain", web.robots_txt(host))
+                return
+
+            parts = self.path.split("/")
+            if len(parts) != 3 or parts[1] != "p" or not parts[2].isdigit():
+                self.send_body(404, "text/html", b"<html>Not found</html>")
+                return
+
+            page = int(parts[2])
+            if page >= web.config.pages_per_host:
+                self.send_body(404, "text/html", b"<html>Not found</html>")
+                return
+
+            kind = web.kinds[(host, page)]
+            if kind == "redirect":
+                self.send_response(301)
+                self.send_header(
+                    "Location", f"/p/{(page + 1) % web.config.pages_per_host}"
+                )
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            if kind == "slow":
+                time.sleep(web.config.slow_page_delay)
+
+            self.send_body(200, "text/html; charset=utf-8", web.page_body(host, page))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def bind_servers(host_count: int) -> list[http.server.ThreadingHTTPServer]:
+    """
+    Binds a server for every host, on its own loopback address when possible.
+    :param host_count: Amount of hosts.
+    :return: The servers, not serving yet.
+    """
+    servers = []
+    use_aliases = True
+    for host in range(host_count):
+        address = f"127.0.{(host + 2) // 256}.{(host + 2) % 256}"
+        if use_aliases:
+            try:
+                servers.append(
+                    http.server.ThreadingHTTPServer(
+                        (address, 0), http.server.BaseHTTPRequestHandler
+                    )
+                )
+                continue
+            except OSError:
+                use_aliases = False
+        servers.append(
+            http.server.ThreadingHTTPServer(
+                ("127.0.0.1", 0), http.server.BaseHTTPRequestHandler
+            )
+        )
+    return servers
+
+
+def serve(config: SyntheticWebConfig, ready, stop) -> None:
+    """
+    Serves the synthetic web until stop is set, meant to be the target of a separate process so the server doesn't
+    count towards the crawler's CPU time and memory.
+    :param config: The web's config.
+    :param ready: Queue the seed URLs are put on once every host is listening.
+    :param stop: Event that stops the servers.
+    :return: None
+    """
+    servers = bind_servers(config.hosts)
+    host_names = [
+        f"{server.server_address[0]}:{server.server_address[1]}" for server in servers
+    ]
+    web = SyntheticWeb(config, host_names)
+
+    for host, server in enumerate(servers):
+        server.RequestHandlerClass = make_handler(web, host)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    ready.put(web.seed_urls)
+    stop.wait()
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -1 +1,3 @@
 from .crawler import Crawler
+from .async_crawler import AsyncCrawler
+from .sharding import ShardCrawler, run_sharded
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests.exceptions
+
+from .crawler import Crawler
+from .exceptions import NoUrlException, WaitBeforeRetryException
+from .page import Page
+from .revisits import RevisitScheduler
+from .urls import get_protocol_and_domain_from_url
+
+logger = logging.getLogger("AsyncCrawler")
+
+
+class AsyncCrawler(Crawler):
+    """
+    Crawler that keeps many requests in flight at once.
+
+    Network work (robots.txt, page downloads, DNS lookups for link compliance) runs on a thread pool, while the
+    URLManager and database session are only ever touched from the event loop's thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.max_requests = self.options.max_concurrent_requests
+        self.max_requests_per_host = self.options.max_concurrent_requests_per_host
+        self.worker_count = self.options.async_workers
+
+        self.executor: ThreadPoolExecutor | None = None
+        self.request_slots: asyncio.Semaphore | None = None
+        self.host_slots: dict[str, asyncio.Semaphore] = dict()
+        self.host_slot_users: dict[str, int] = dict()
+
+        self.in_flight = 0
+
+        # Set whenever new URLs are queued, wakes workers waiting on crawl delays.
+        self.frontier_changed: asyncio.Event | None = None
+
+    async def _run_blocking(self, func, *args):
+        """
+        Runs a blocking function on the crawler's thread pool.
+        :param func: The function to run.
+        :param args: Arguments for the function.
+        :return: The function's return value.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def _acquire_host_slot(self, domain: str) -> asyncio.Semaphore:
+        if domain not in self.host_slots:
+            self.host_slots[domain] = asyncio.Semaphore(self.max_requests_per_host)
+            self.host_slot_users[domain] = 0
+        self.host_slot_users[domain] += 1
+        return self.host_slots[domain]
+
+    def _release_host_slot(self, domain: str) -> None:
+        self.host_slot_users[domain] -= 1
+
+        # Drop the semaphore once nobody is using it so the dict doesn't grow with every domain ever seen.
+        if self.host_slot_users[domain] == 0:
+            del self.host_slot_users[domain]
+            del self.host_slots[domain]
+
+    async def _fetch(self, domain: str, func, *args):
+        """
+        Runs a network bound function while holding a global and per-host request slot.
+        The host slot is taken first, so requests queued behind a busy host don't hold global slots other hosts could
+        use.
+        :param domain: The domain being requested.
+        :param func: The blocking function making the request.
+        :param args: Arguments for the function.
+        :return: The function's return value.
+        """
+        host_slot = self._acquire_host_slot(domain)
+        try:
+            async with host_slot:
+                async with self.request_slots:
+                    return await self._run_blocking(func, *args)
+        finally:
+            self._release_host_slot(domain)
+
+    async def register_domain_async(self, domain: str, protocol: str):
+        domain_model = self.get_domain(domain)
+        if domain_model:
+            return domain_model
+
+        try:
+            robots = await self._fetch(domain, self.get_domain_robots, domain, protocol)
+        except requests.exceptions.ConnectionError:
+            return None
+
+        # Another worker might have registered the domain while we were waiting.
+        return self.get_domain(domain) or self.add_domain(domain, robots)
+
+    async def page_follows_robots_async(
+        self, url: str, domain: str, domain_model
+    ) -> bool:
+        """
+        Checks the URL against the domain's robots.txt, parsing it on the thread pool if it isn't cached.
+        :param url: URL to check.
+        :param domain: The URL's domain.
+        :param domain_model: The domain's DomainModel, None if its robots.txt couldn't be fetched.
+        :return: False if robots.txt disallows the URL.
+        """
+        if not self.options.follow_robots_txt:
+            return True
+
+        if domain_model is None:
+            # Nothing to check against, the domain's robots.txt is fetched again on its next page.
+            return True
+
+        # Read on the event loop's thread, the database session isn't shared with the pool.
+        robots_txt = domain_model.robots
+        robots_parser = await self._run_blocking(
+            self.robots_cache.get, domain, lambda: robots_txt
+        )
+        return self.page_follows_robots(url, domain, robots_parser)
+
+    async def step_async(self, url: str, depth: int = 0) -> Page | None:
+        """
+        Crawls a single URL, the asynchronous counterpart of Crawler.step.
+        :param url: The URL to crawl.
+        :param depth: How many links away from a seed the URL was found.
+        :return: Page or None if there was an error.
+        """
+        start_time = time.time_ns()
+        logger_url_str = f"\"{url[:60]}{'...' if len(url) > 60 else ''}\""
+
+        protocol, domain = get_protocol_and_domain_from_url(url)
+        with self.stats.time_stage("domain"):
+            domain_model = await self.register_domain_async(domain, protocol)
+        self.schedule_domain(domain, domain_model)
+
+        logger.info(f"[Crawling] Crawling page {logger_url_str}")
+
+        revisit = self.revisits.pop(url) if self.revisits is not None else None
+
+        try:
+            with self.stats.time_stage("robots"):
+                if not await self.page_follows_robots_async(url, domain, domain_model):
+                    return None
+
+            page = await self._fetch(
+                domain,
+                self.download_page,
+                url,
+                RevisitScheduler.conditional_headers(revisit),
+            )
+        except requests.exceptions.ConnectionError as e:
+            logger.info(f"[Request Error] on page {logger_url_str} {e}")
+            self.stats.pages_crawled += 1
+            self.stats.pages_failed += 1
+            return None
+
+        self.mark_domain_crawled(domain)
+
+        if page is None:
+            return None
+
+        if self.is_unchanged_revisit(page, revisit):
+            self.stats.update(page=page, elapsed_time=time.time_ns() - start_time)
+            page.release()
+            return page
+
+        duplicate = False
+        if 300 > page.status_code >= 200:
+            # A changed page would match its own earlier version, so only new pages are checked.
+            if revisit is None and self.near_duplicate_index is not None:
+                fingerprint = await self._run_blocking(self.page_fingerprint, page)
+                duplicate = self.is_near_duplicate(page, fingerprint)
+
+            if not (duplicate and self.options.skip_near_duplicate_links):
+                links = await self._run_blocking(
+                    self.get_compliant_links, page, depth + 1
+                )
+                self.record_links(page, links)
+                self.enqueue_links(links, depth + 1, page.url)
+                self._notify_frontier_changed()
+        else:
+            logger.info(f"[Response] HTTP {page.status_code} @ {logger_url_str}")
+
+        if not (duplicate and self.options.skip_near_duplicate_storage):
+            self.store_page(page, revisit)
+
+        # Update statistics, the step's time includes writing the page.
+        total_time = time.time_ns() - start_time
+        self.stats.update(page=page, elapsed_time=total_time)
+
+        page.release()
+        return page
+
+    def update_gauges(self) -> None:
+        super().update_gauges()
+        self.stats.set_gauge(
+            "requests_in_flight",
+            self.in_flight,
+            "Requests the async crawler has in flight.",
+        )
+
+    def _notify_frontier_changed(self) -> None:
+        self.frontier_changed.set()
+        self.frontier_changed.clear()
+
+    async def _wait_for_frontier(self, timeout: float) -> None:
+        """
+        Waits until new URLs are queued, a worker finishes or the timeout runs out.
+        :param timeout: Maximum amount of seconds to wait.
+        :return: None
+        """
+        try:
+            await asyncio.wait_for(self.frontier_changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self) -> None:
+        while True:
+            if self.db_writer is not None:
+                self.url_manager.crawled(self.db_writer.pop_crawled())
+            self.schedule_revisits()
+
+            try:
+                with self.stats.time_stage("frontier"):
+                    url, _, depth = self.url_manager.get_next_entry()
+            except NoUrlException:
+                # Other workers may still add links, only stop once everything has drained.
+                if self.in_flight == 0:
+                    return
+                await self._wait_for_frontier(timeout=1)
+                continue
+            except WaitBeforeRetryException as e:
+                # Every queued domain is waiting on its crawl delay, sleep until one is ready or new URLs arrive.
+                await self._wait_for_frontier(timeout=e.retry_after)
+                continue
+
+            self.in_flight += 1
+            try:
+                await self.step_async(url, depth)
+            except Exception as e:
+                logger.error(f"[STEP ERROR] Error in step {e}")
+            finally:
+                self.finish_url(url)
+                self.in_flight -= 1
+                self.profiler.step_done()
+                self._notify_frontier_changed()
+
+    async def crawl(self) -> None:
+        """
+        Crawls until there are no URLs left.
+        :return: None
+        """
+        self.request_slots = asyncio.Semaphore(self.max_requests)
+        self.frontier_changed = asyncio.Event()
+
+        # More workers than request slots, so the semaphore rather than the worker count limits requests in flight.
+        worker_count = max(self.worker_count, self.max_requests)
+        with ThreadPoolExecutor(max_workers=worker_count) as self.executor:
+            workers = [asyncio.create_task(self._worker()) for _ in range(worker_count)]
+            profiler_poller = asyncio.create_task(self._poll_profiler())
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                profiler_poller.cancel()
+
+    async def _poll_profiler(self, interval: float = 0.25) -> None:
+        """
+        Lets the profiler start and stop on the event loop's thread, see StepProfiler.
+        :param interval: Seconds between polls.
+        :return: None
+        """
+        while True:
+            self.profiler.poll()
+            await asyncio.sleep(interval)
+
+    def run(self) -> None:
+        """
+        Runs the crawler on a new event loop until there are no URLs left.
+        :return: None
+        """
+        asyncio.run(self.crawl())
@@ -0,0 +1,187 @@
+import logging
+import os
+import sqlite3
+import time
+
+from typing import Iterable
+
+logger = logging.getLogger("Checkpoint")
+
+
+class FrontierCheckpoint:
+    """
+    Durable copy of the URLManager's frontier and seen URLs.
+
+    URLs stay in the saved frontier after they're popped, until they're removed once their page has been stored. A
+    crawl resumed after a crash crawls the URLs that were in flight again.
+
+    Changes are buffered and written to a SQLite file in a single transaction once enough of them pile up or enough
+    time has passed, so a crash only loses the last batch. The file is compacted every few flushes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 5000,
+        flush_interval: float = 5,
+        compact_every: int = 100,
+    ):
+        """
+        :param path: Path to the SQLite file.
+        :param batch_size: How many buffered changes trigger a flush.
+        :param flush_interval: Maximum amount of seconds changes stay buffered.
+        :param compact_every: Compact the file every this many flushes.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS frontier "
+            "(url TEXT PRIMARY KEY, domain TEXT, priority INTEGER, depth INTEGER) WITHOUT ROWID"
+        )
+        columns = {
+            row[1] for row in self.connection.execute("PRAGMA table_info(frontier)")
+        }
+        # Checkpoints from before the frontier was prioritized, their URLs are scored again when they're loaded.
+        for column in ("priority", "depth"):
+            if column not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE frontier ADD COLUMN {column} INTEGER"
+                )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS crawled (url TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+
+        # Pending changes, queued and popped never overlap so they can be applied in any order.
+        self.queued_pending: dict[str, tuple] = (
+            dict()
+        )  # URL -> (domain, priority, depth)
+        self.popped_pending: set[str] = set()
+        self.seen_pending: set[str] = set()
+
+        self.last_flush = time.monotonic()
+        self.flush_count = 0
+
+    def is_empty(self) -> bool:
+        return (
+            self.connection.execute("SELECT 1 FROM frontier LIMIT 1").fetchone() is None
+        )
+
+    def load_to_crawl(self) -> dict[str, list[str]]:
+        """
+        Loads the saved frontier.
+        :return: Dict of domain -> list of URLs, the format URLManager takes.
+        """
+        to_crawl = dict()
+        for domain, url in self.connection.execute("SELECT domain, url FROM frontier"):
+            if domain in to_crawl:
+                to_crawl[domain].append(url)
+            else:
+                to_crawl[domain] = [url]
+        return to_crawl
+
+    def iter_frontier(self) -> Iterable[tuple[str, str, int | None, int | None]]:
+        """
+        Streams the saved frontier.
+        :return: Iterable of (domain, URL, priority, depth), priority and depth are None for URLs saved before they
+        were kept.
+        """
+        return self.connection.execute(
+            "SELECT domain, url, priority, depth FROM frontier"
+        )
+
+    def load_crawled(self) -> set[str]:
+        """
+        Loads the saved seen URLs.
+        :return: Set of URLs.
+        """
+        return {url for (url,) in self.connection.execute("SELECT url FROM crawled")}
+
+    def iter_crawled(self) -> Iterable[str]:
+        """
+        Streams the saved seen URLs without holding them all in memory.
+        :return: Iterable of URLs.
+        """
+        return (url for (url,) in self.connection.execute("SELECT url FROM crawled"))
+
+    def queued(self, url: str, domain: str, priority: int = 0, depth: int = 0) -> None:
+        self.popped_pending.discard(url)
+        self.queued_pending[url] = (domain, priority, depth)
+        self._maybe_flush()
+
+    def remove(self, url: str) -> None:
+        """
+        Removes a URL from the saved frontier, once it's crawled or dropped.
+        :param url: The URL.
+        :return: None
+        """
+        self.queued_pending.pop(url, None)
+        self.popped_pending.add(url)
+        self._maybe_flush()
+
+    def seen(self, urls: Iterable[str]) -> None:
+        self.seen_pending.update(urls)
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        pending = (
+            len(self.queued_pending) + len(self.popped_pending) + len(self.seen_pending)
+        )
+        if (
+            pending >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes all buffered changes in a single transaction.
+        :return: None
+        """
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM frontier WHERE url = ?",
+                ((url,) for url in self.popped_pending),
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO frontier (url, domain, priority, depth) VALUES (?, ?, ?, ?)",
+                ((url, *entry) for url, entry in self.queued_pending.items()),
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO crawled (url) VALUES (?)",
+                ((url,) for url in self.seen_pending),
+            )
+
+        self.queued_pending.clear()
+        self.popped_pending.clear()
+        self.seen_pending.clear()
+
+        self.last_flush = time.monotonic()
+        self.flush_count += 1
+
+        if self.flush_count % self.compact_every == 0:
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Folds the write-ahead log into the database and releases the space used by popped URLs.
+        :return: None
+        """
+        logger.info(f"[Checkpoint] Compacting {self.path}")
+        self.connection.execute("PRAGMA incremental_vacuum")
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        self.flush()
+        self.compact()
+        self.connection.close()
@@ -1,7 +1,5 @@
 import datetime
 
-from sqlalchemy import func
-
 import sys
 import time
 import logging
@@ -10,22 +8,47 @@ import functools
 
 import requests.exceptions
 
+from sqlalchemy.orm.attributes import set_committed_value
+
+from urllib import robotparser
+
 sys.path.insert(0, "..")
 
 from .crawlerstats import CrawlerStats  # noqa
-from .exceptions import NoUrlException, WaitBeforeRetryException  # noqa
-from .requester import Requester  # noqa
+from .exceptions import (
+    InvalidURLException,
+    NoUrlException,
+    WaitBeforeRetryException,
+)  # noqa
+from .requester import Requester, read_response_body  # noqa
 from .crawleroptions import BaseCrawlerOptions, DefaultCrawlerOptions  # noqa
 from .page import Page  # noqa
-from .robots import does_page_follow_robots_rules  # noqa
+from .robots import (
+    RobotsCache,
+    does_page_follow_robots_rules,
+    get_robots_crawl_delay,
+)  # noqa
+from .metrics import MetricsFileDumper, MetricsServer  # noqa
+from .networking import DNSCache  # noqa
+from .profiling import StepProfiler  # noqa
+from .revisits import Revisit, RevisitScheduler  # noqa
+from .scoring import URLScorer  # noqa
 from .url_checker import check_url_compliance  # noqa
+from .checkpoint import FrontierCheckpoint  # noqa
+from .seen import SeenURLFilter  # noqa
+from .simhash import SimHashIndex, simhash  # noqa
+from .traps import DOMAIN_BUDGET_PATTERN, TrapDetector  # noqa
 from .urls import URLManager, get_protocol_and_domain_from_url  # noqa
 
-from database import db, page_checker  # noqa (Ignore import error)
+from database import db, page_checker, search  # noqa (Ignore import error)
+from database.blobs import content_hash, store_page_rows  # noqa
+from database.links import InDegreeReader, store_links  # noqa
+from database.revisits import due_revisits, touch_pages, upsert_revisits  # noqa
+from database.writer import DBWriter  # noqa
 
 if typing.TYPE_CHECKING:
     # Allow IDE to find correct import.
-    from ..database import db, page_checker
+    from ..database import db, page_checker, search
 
 DB_MAX_CONTENT_CHARS = 15000000
 
@@ -35,15 +58,16 @@ logger = logging.getLogger("Crawler")
 class Crawler:
     def __init__(
         self,
-        seed_url: str,
+        seed_url: str | None,
         crawled: set[str] | None = None,
         to_crawl: dict[str, list[str]] | None = None,
         crawler_options: BaseCrawlerOptions | None = None,
     ):
         """
-        :param seed_url: The URL to seed from.
+        :param seed_url: The URL to seed from, None to start with an empty frontier.
         :param crawled: A set of pages to ignore as they've been crawled already.
-        :param to_crawl: A set of pages to crawl, these shouldn't intersect with crawled.
+        :param to_crawl: A set of pages to crawl, these shouldn't intersect with crawled. When not given the crawl
+        resumes from the frontier checkpoint if there is one.
         :param crawler_options: The configuration of the Crawler.
         """
 
@@ -52,20 +76,244 @@ class Crawler:
         self.stats = CrawlerStats()
         self.requester = Requester(crawler_options=self.options)
 
+        if self.options.use_seen_url_filter:
+            seen_urls = SeenURLFilter(
+                capacity=self.options.seen_url_filter_capacity,
+                error_rate=self.options.seen_url_filter_error_rate,
+                store_path=self.options.seen_url_store_path,
+            )
+            seen_urls.update(crawled or set())
+            crawled = seen_urls
+
+        checkpoint = None
+        if self.options.frontier_checkpoint_path:
+            checkpoint = FrontierCheckpoint(
+                path=self.options.frontier_checkpoint_path,
+                batch_size=self.options.frontier_checkpoint_batch_size,
+                flush_interval=self.options.frontier_checkpoint_interval,
+            )
+
+        self.in_degree_reader: InDegreeReader | None = None
+        self.url_scorer: URLScorer | None = None
+        if self.options.prioritize_frontier:
+            self.url_scorer = self.options.url_scorer
+            if self.url_scorer is None:
+                if self.options.score_by_in_links:
+                    self.in_degree_reader = InDegreeReader()
+                self.url_scorer = URLScorer(in_link_counts=self.in_degree_reader)
+
+        self.trap_detector: TrapDetector | None = None
+        if self.options.detect_crawl_traps:
+            self.trap_detector = TrapDetector(
+                max_queued_per_domain=self.options.max_queued_urls_per_domain,
+                max_crawled_per_domain=self.options.max_crawled_urls_per_domain,
+                max_path_depth=self.options.max_url_path_depth,
+                max_repeated_segments=self.options.max_repeated_path_segments,
+                max_query_parameters=self.options.max_url_query_parameters,
+                max_urls_per_pattern=self.options.trap_pattern_max_urls,
+                max_chain_length=self.options.trap_chain_max_length,
+                max_step=self.options.trap_chain_max_step,
+                max_tracked=self.options.trap_patterns_tracked,
+                trap_observer=self._record_trap,
+                rejection_observer=self.stats.record_trapped_url,
+            )
+
         self.url_manager = URLManager(
-            seed_url=seed_url, crawled=crawled, to_crawl=to_crawl
+            seed_url=seed_url,
+            crawled=crawled,
+            to_crawl=to_crawl,
+            checkpoint=checkpoint,
+            scorer=self.url_scorer,
+            traps=self.trap_detector,
+        )
+
+        self.near_duplicate_index: SimHashIndex | None = None
+        if self.options.detect_near_duplicates:
+            self.near_duplicate_index = SimHashIndex(
+                threshold=self.options.near_duplicate_threshold,
+                max_size=self.options.near_duplicate_index_size,
+            )
+
+        self.robots_cache = RobotsCache(
+            max_size=self.options.robots_cache_size, ttl=self.options.robots_cache_ttl
         )
 
         self.current_url: str | None = None
 
-        self.db_session = db.Session()
+        # Objects are kept after commits, the crawler is the only one writing the rows it holds.
+        self.db_session = db.Session(expire_on_commit=False)
+
+        self.db_writer: DBWriter | None = None
+        if self.options.use_db_writer:
+            self.db_writer = DBWriter(
+                batch_size=self.options.db_writer_batch_size,
+                flush_interval=self.options.db_writer_flush_interval,
+                max_queue_size=self.options.db_writer_queue_size,
+                codec=self.options.page_content_codec,
+                compression_level=self.options.page_content_compression_level,
+                flush_observer=functools.partial(self.stats.observe, "db_flush"),
+            )
+
+        self.search_indexer: search.SearchIndexer | None = None
+        if self.options.index_pages_for_search:
+            self.search_indexer = search.SearchIndexer(
+                path=self.options.search_index_path or search.SEARCH_DB_PATH,
+                batch_size=self.options.search_index_batch_size,
+                interval=self.options.search_index_interval,
+            )
+
+        self.dns_cache = DNSCache(
+            ttl=self.options.dns_cache_ttl,
+            negative_ttl=self.options.dns_negative_cache_ttl,
+            max_size=self.options.dns_cache_size,
+            resolver_threads=self.options.dns_resolver_threads,
+        )
 
         self.url_compliance_checker = functools.partial(
-            check_url_compliance, self.options
+            check_url_compliance, self.options, dns_cache=self.dns_cache
         )
         self.page_follows_db_rules = functools.partial(
             page_checker.page_follows_db_rules, self.options
         )
+        self.headers_follow_db_rules = functools.partial(
+            page_checker.headers_follow_db_rules, self.options
+        )
+
+        self.revisits: RevisitScheduler | None = None
+        if self.options.revisit_pages:
+            self.revisits = RevisitScheduler(
+                initial_interval=self.options.revisit_initial_interval,
+                min_interval=self.options.revisit_min_interval,
+                max_interval=self.options.revisit_max_interval,
+                changed_factor=self.options.revisit_changed_factor,
+                unchanged_factor=self.options.revisit_unchanged_factor,
+                max_pending=self.options.revisit_batch_size,
+            )
+        self._next_revisit_check = 0.0
+
+        self.profiler = StepProfiler(
+            directory=self.options.profile_directory,
+            control_path=self.options.profile_control_path,
+            steps=self.options.profile_steps,
+            seconds=self.options.profile_seconds,
+            top_functions=self.options.profile_top_functions,
+        )
+
+        self.metrics_server: MetricsServer | None = None
+        if self.options.metrics_port is not None:
+            self.metrics_server = MetricsServer(
+                self.render_metrics, port=self.options.metrics_port
+            )
+
+        self.metrics_dumper: MetricsFileDumper | None = None
+        if self.options.metrics_dump_path:
+            self.metrics_dumper = MetricsFileDumper(
+                self.render_metrics,
+                path=self.options.metrics_dump_path,
+                interval=self.options.metrics_dump_interval,
+            )
+
+    def update_gauges(self) -> None:
+        """
+        Copies queue depths and cache sizes into the stats' gauges.
+        :return: None
+        """
+        self.stats.set_gauge(
+            "frontier_urls",
+            self.url_manager.to_crawl.url_count,
+            "URLs queued to crawl.",
+        )
+        self.stats.set_gauge(
+            "frontier_domains",
+            len(self.url_manager.to_crawl),
+            "Domains with URLs queued to crawl.",
+        )
+        if self.db_writer is not None:
+            self.stats.set_gauge(
+                "db_writer_queue",
+                self.db_writer.queue.qsize(),
+                "Writes waiting on the database writer.",
+            )
+        if self.search_indexer is not None:
+            self.stats.set_gauge(
+                "search_documents_indexed",
+                self.search_indexer.documents_indexed,
+                "Pages added to the search index.",
+            )
+        self.stats.set_gauge(
+            "robots_cache_hit_rate",
+            self.robots_cache.hit_rate,
+            "Share of robots.txt lookups served from the cache.",
+        )
+        self.stats.set_gauge(
+            "requests_made", self.requester.requests_made, "HTTP requests sent."
+        )
+        self.stats.set_gauge(
+            "connections_opened",
+            self.requester.connections_opened,
+            "TCP connections opened.",
+        )
+
+    def _record_trap(self, domain: str, pattern: str) -> None:
+        if pattern == DOMAIN_BUDGET_PATTERN:
+            logger.info(f"[Traps] {domain} used up its crawl budget")
+        else:
+            logger.info(f"[Traps] Stopped queuing {domain}{pattern}")
+        self.stats.record_trap(domain, pattern)
+
+    def render_metrics(self) -> str:
+        """
+        Gets the crawler's metrics in the Prometheus text format, safe to call from another thread.
+        :return: The metrics.
+        """
+        self.update_gauges()
+        return self.stats.to_prometheus(top_domains=self.options.metrics_top_domains)
+
+    def close(self) -> None:
+        """
+        Flushes anything the crawler has buffered, call once the crawler is done.
+        :return: None
+        """
+        logger.info(
+            f"[Robots] Cache: {len(self.robots_cache)} domains, {self.robots_cache.hits} hits, "
+            f"{self.robots_cache.misses} misses, {self.robots_cache.expirations} expirations, "
+            f"{self.robots_cache.evictions} evictions."
+        )
+        logger.info(
+            f"[Requester] {self.requester.requests_made} requests over {self.requester.connections_opened} "
+            f"connections ({self.requester.connections_reused} reused)."
+        )
+        if self.stats.urls_trapped:
+            logger.info(
+                f"[Traps] {sum(self.stats.urls_trapped.values())} URLs dropped "
+                f"({', '.join(f'{reason}: {count}' for reason, count in self.stats.urls_trapped.most_common())}), "
+                f"{len(self.stats.trapped_domains)} domains trapped."
+            )
+        for stage, (p50, p95, p99) in self.stats.stage_quantiles().items():
+            logger.info(
+                f"[Stats] {stage}: p50 {p50 * 1000:.1f}ms, p95 {p95 * 1000:.1f}ms, p99 {p99 * 1000:.1f}ms"
+            )
+        self.requester.close()
+        self.dns_cache.close()
+
+        # Keep whatever was profiled if the crawl ends mid window.
+        self.profiler.stop()
+
+        if self.db_writer is not None:
+            self.db_writer.close()
+            self.url_manager.crawled(self.db_writer.pop_crawled())
+
+        # After the writer, so the pages it just flushed get indexed.
+        if self.search_indexer is not None:
+            self.search_indexer.close()
+        self.url_manager.close()
+        if self.in_degree_reader is not None:
+            self.in_degree_reader.close()
+
+        if self.metrics_dumper is not None:
+            self.metrics_dumper.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
 
     def get_domain_robots(self, domain: str, protocol: str) -> str:
         protocol = protocol + (":" if not protocol[-1] == ":" else "")
@@ -82,185 +330,604 @@ class Crawler:
     def get_domain(self, domain: str) -> db.DomainModel:
         domain_model = (
             self.db_session.query(db.DomainModel)
-            .filter(func.lower(db.DomainModel.domain) == domain)
+            .filter(db.DomainModel.domain == db.normalize_domain(domain))
             .first()
         )
         return domain_model
 
-    @functools.lru_cache(maxsize=1024)
     def get_robots_txt(self, domain):
-        domain_model = (
-            self.db_session.query(db.DomainModel)
-            .filter(func.lower(db.DomainModel.domain) == domain)
-            .first()
-        )
+        domain_model = self.get_domain(domain)
 
         if not domain_model:
             try:
-                domain_model = db.DomainModel(
-                    domain=domain, robots=self.get_domain_robots(domain, "http")
+                domain_model = self.add_domain(
+                    domain, self.get_domain_robots(domain, "http")
                 )
-                self.db_session.add(domain_model)
-                self.db_session.commit()
             except requests.exceptions.ConnectionError:
                 return ""
 
         return domain_model.robots
 
-    def get_page(self, url: str) -> Page | None:
+    def get_robots_parser(self, domain: str) -> robotparser.RobotFileParser:
         """
-        Gets a page from the server.
-        :param url: URL to the webpage.
-        :return: Page or None if there was an error.
+        Gets the domain's parsed robots.txt rules from the robots cache.
+        :param domain: The domain.
+        :return: The parsed rules.
         """
-        # Perform any checks.
-
-        protocol, domain = get_protocol_and_domain_from_url(url)
+        return self.robots_cache.get(domain, lambda: self.get_robots_txt(domain))
 
+    def register_domain(self, domain: str, protocol: str) -> db.DomainModel | None:
+        """
+        Makes sure the domain is in the domain table, fetching its robots.txt if it isn't.
+        :param domain: The domain to register.
+        :param protocol: The protocol to fetch the robots.txt with.
+        :return: The DomainModel or None if the robots.txt couldn't be fetched.
+        """
         domain_model = self.get_domain(domain)
-
-        logger_url_str = f"\"{url[:60]}{'...' if len(url) > 60 else ''}\""
+        if domain_model:
+            self.schedule_domain(domain, domain_model)
+            return domain_model
 
         try:
-            if self.options.follow_robots_txt and not does_page_follow_robots_rules(
-                self.options, url, self.get_robots_txt(domain), domain=domain_model
-            ):
-                logger.info(
-                    f"[Robots.txt] Page @ {logger_url_str} conflicts with robots.txt"
+            robots = self.get_domain_robots(domain, protocol)
+        except requests.exceptions.ConnectionError:
+            self.schedule_domain(domain, None)
+            return None
+
+        domain_model = self.add_domain(domain, robots)
+        self.schedule_domain(domain, domain_model)
+        return domain_model
+
+    def schedule_domain(self, domain: str, domain_model: db.DomainModel | None) -> None:
+        """
+        Gives the URLManager the domain's crawl delay the first time the domain is seen.
+        :param domain: The domain to schedule.
+        :param domain_model: The domain's DomainModel, None if it couldn't be registered.
+        :return: None
+        """
+        if self.url_manager.has_crawl_delay(domain):
+            return
+
+        delay = self.options.min_crawl_delay
+        last_crawled = None
+
+        if domain_model is not None:
+            if self.options.follow_robots_txt:
+                robots_delay = get_robots_crawl_delay(
+                    self.options, self.get_robots_parser(domain)
                 )
-                return None
-        except WaitBeforeRetryException:
-            self.url_manager.add_to_to_crawl_queue(url, domain)
+                delay = max(delay, robots_delay)
+
+            if domain_model.last_crawled:
+                last_crawled = domain_model.last_crawled.timestamp()
+
+        self.url_manager.set_crawl_delay(domain, delay, last_crawled=last_crawled)
+
+    def add_domain(self, domain: str, robots: str) -> db.DomainModel:
+        """
+        Inserts a new domain into the domain table.
+        :param domain: The domain to insert.
+        :param robots: The domain's robots.txt.
+        :return: The new DomainModel.
+        """
+        domain_model = db.DomainModel(domain=db.normalize_domain(domain), robots=robots)
+        self.db_session.add(domain_model)
+        self.db_session.commit()
+        self.get_domain.cache_clear()
+        return domain_model
+
+    def page_follows_robots(
+        self,
+        url: str,
+        domain: str,
+        robots_parser: robotparser.RobotFileParser | None = None,
+    ) -> bool:
+        """
+        Checks the URL against the domain's robots.txt.
+        :param url: URL to check.
+        :param domain: The URL's domain.
+        :param robots_parser: The domain's parsed robots.txt if it has been looked up already, see get_robots_parser.
+        :return: False if robots.txt disallows the URL.
+        """
+        if not self.options.follow_robots_txt:
+            return True
+
+        if not does_page_follow_robots_rules(
+            self.options, url, robots_parser or self.get_robots_parser(domain)
+        ):
             logger.info(
-                f"[Robots.txt] Cannot crawl {logger_url_str} as it was crawled too recently."
+                f"[Robots.txt] Page @ \"{url[:60]}{'...' if len(url) > 60 else ''}\" conflicts with robots.txt"
             )
+            return False
+        return True
 
-        # Get the page.
-        request = self.requester.get(
-            url=url, stream=True, timeout=self.options.page_timeout
-        )
-
-        content = b""
+    def download_page(self, url: str, headers: dict | None = None) -> Page | None:
+        """
+        Downloads the page, this doesn't touch the database so it's safe to call from a worker thread.
+        The status and headers are checked before the body is read, error responses come back without a body and
+        responses that would never be stored aren't downloaded at all.
+        :param url: URL to the webpage.
+        :param headers: Extra request headers, i.e. a revisit's validators.
+        :return: Page or None if the page was empty or rejected by its headers.
+        """
+        with self.stats.time_stage("ttfb"):
+            request = self.requester.get(
+                url=url, stream=True, timeout=self.options.page_timeout, headers=headers
+            )
 
-        max_bytes = self.options.max_page_size
-        chunk_size = self.options.content_buffer_size
-        total_bytes = 0
+        logger_url_str = f"\"{url[:60]}{'...' if len(url) > 60 else ''}\""
+        max_bytes = int(self.options.max_page_size)
 
-        for chunk in request.iter_content(chunk_size=chunk_size):
-            total_bytes += len(chunk)
-            content += chunk
-            if total_bytes >= max_bytes:
-                break
+        if not self.headers_follow_db_rules(request.headers):
+            logger.info(
+                f"[Response] Skipping {logger_url_str}, content-type {request.headers.get('content-type')}"
+            )
+            request.close()
+            return None
 
-        if content == b"":
+        content_length = request.headers.get("content-length")
+        if (
+            content_length
+            and content_length.isdigit()
+            and int(content_length) > max_bytes
+        ):
+            logger.info(
+                f"[Response] Skipping {logger_url_str}, {content_length} bytes is over the max page size"
+            )
+            request.close()
             return None
 
+        if 300 > request.status_code >= 200:
+            with self.stats.time_stage("download"):
+                content = read_response_body(
+                    request,
+                    max_bytes=max_bytes,
+                    initial_chunk_size=self.options.content_buffer_size,
+                    max_chunk_size=self.options.max_content_buffer_size,
+                )
+
+            if content == b"":
+                return None
+        else:
+            # The body of an error response isn't used, and a 304 has none.
+            request.close()
+            content = b""
+
         # Do some basic parsing.
-        page = Page(
+        return Page(
             status_code=request.status_code,
             elapsed=request.elapsed,
             content=content,
             response_headers=request.headers,
             url=url,
+            link_limit=self.options.max_links_per_page,
+            stream_parse=self.options.stream_parse_pages,
+            link_candidate_limit=(
+                self.options.max_link_candidates_per_page
+                if self.url_scorer is not None
+                else None
+            ),
         )
 
-        if domain_model:
-            domain_model.last_crawled = datetime.datetime.now()
+    def mark_domain_crawled(self, domain: str) -> None:
+        """
+        Updates the domain's last_crawled time.
+        :param domain: The domain that was crawled.
+        :return: None
+        """
+        now = datetime.datetime.now()
+        self.url_manager.mark_domain_crawled(domain, now.timestamp())
+
+        domain_model = self.get_domain(domain)
+
+        if not domain_model:
+            return
+
+        if self.db_writer is not None:
+            # Update the cached model without dirtying the session, the writer persists the change.
+            set_committed_value(domain_model, "last_crawled", now)
+            self.db_writer.update_domain(domain_model.domain, now)
+
+            # Nothing to write, this just ends the session's read transaction so it doesn't pin the WAL.
+            self.db_session.commit()
+        else:
+            domain_model.last_crawled = now
             self.db_session.commit()
 
+    def get_page(self, url: str, headers: dict | None = None) -> Page | None:
+        """
+        Gets a page from the server.
+        :param url: URL to the webpage.
+        :param headers: Extra request headers, see download_page.
+        :return: Page or None if there was an error.
+        """
+        # Perform any checks.
+        protocol, domain = get_protocol_and_domain_from_url(url)
+
+        with self.stats.time_stage("robots"):
+            if not self.page_follows_robots(url, domain):
+                return None
+
+        # Get the page.
+        page = self.download_page(url, headers)
+        self.mark_domain_crawled(domain)
+
         return page
 
-    def step(self) -> Page | None:
+    def get_compliant_links(
+        self, page: Page, depth: int = 1
+    ) -> dict[str, float | None]:
         """
-        Steps through an iteration of the crawler.
+        Gets the links from the page that pass the URL compliance checks, the best ones if the frontier is prioritized.
+        :param page: The page to get the links from.
+        :param depth: Depth of the links, one more than the page's.
+        :return: Dict of compliant URL -> score, see scoring.URLScorer, scores are None without a scorer.
         """
-        try:
-            start_time = time.time_ns()
+        with self.stats.time_stage("parse"):
+            if self.url_scorer is not None:
+                links = page.get_scored_links(self.url_scorer, depth)
+            else:
+                links = dict.fromkeys(page.get_links())
 
-            url = self.url_manager.get_next_url()
+        with self.stats.time_stage("compliance"):
+            passed_urls = self._filter_compliant_links(links)
+        return {url: score for url, score in links.items() if url in passed_urls}
 
-            # Check if domain is in domain table.
-            protocol, domain = get_protocol_and_domain_from_url(url)
+    def _filter_compliant_links(self, links: set[str]) -> set[str]:
+        passed_urls = set()
 
-            domain_model = (
-                self.db_session.query(db.DomainModel)
-                .filter(func.lower(db.DomainModel.domain) == domain)
-                .all()
-            )
+        # Resolve every host up front so the compliance checks don't wait on DNS one link at a time.
+        hosts = set()
+        for url in links:
+            try:
+                hosts.add(get_protocol_and_domain_from_url(url)[1])
+            except InvalidURLException:
+                continue
+        self.dns_cache.resolve_many(hosts)
 
-            if not domain_model:
-                try:
-                    domain_model = db.DomainModel(
-                        domain=domain, robots=self.get_domain_robots(domain, protocol)
-                    )
-                    self.db_session.add(domain_model)
-                    self.db_session.commit()
-                except requests.exceptions.ConnectionError:
-                    pass
+        for url in links:
+            if self.url_compliance_checker(url):
+                passed_urls.add(url)
 
-            # Get the page, and update the crawling queue to hold the new links.
-            logger.info(
-                f"[Crawling] Crawling page \"{url[:60]}{'...' if len(url) > 60 else ''}\""
+        return passed_urls
+
+    def page_fingerprint(self, page: Page) -> int | None:
+        """
+        Gets the page's SimHash fingerprint, safe to call from a worker thread.
+        :param page: The page.
+        :return: The fingerprint, None if the page has too little text to compare, see simhash.
+        """
+        with self.stats.time_stage("simhash"):
+            return simhash(
+                page.text, min_features=self.options.near_duplicate_min_shingles
             )
-            try:
-                page = self.get_page(url)
 
-            except requests.exceptions.ConnectionError as e:
-                logger.info(
-                    f"[Request Error] on page \"{url[:60]}{'...' if len(url) > 60 else ''}\" {e}"
-                )
-                self.stats.pages_crawled += 1
-                self.stats.pages_failed += 1
-                return None
+    def is_near_duplicate(self, page: Page, fingerprint: int | None = None) -> bool:
+        """
+        Checks if the page is a near-duplicate of a page crawled earlier, remembering it if it isn't.
+        :param page: The page.
+        :param fingerprint: The page's fingerprint if it has already been computed.
+        :return: True if the page is a near-duplicate, never for pages with too little text to compare.
+        """
+        if self.near_duplicate_index is None:
+            return False
+
+        if fingerprint is None:
+            fingerprint = self.page_fingerprint(page)
+        if fingerprint is None:
+            return False
+
+        original = self.near_duplicate_index.find(fingerprint)
+        if original is None:
+            self.near_duplicate_index.add(fingerprint, page.url)
+            return False
+
+        logger.info(
+            f"[Duplicate] \"{page.url[:60]}{'...' if len(page.url) > 60 else ''}\" is a near-duplicate of "
+            f"\"{original[:60]}{'...' if len(original) > 60 else ''}\""
+        )
+        self.stats.record_duplicate(page.domain)
+        return True
 
-            except Exception as e:
-                logger.error(f"[GET PAGE ERROR] {e}")
-                return None
+    def schedule_revisits(self) -> None:
+        """
+        Queues the revisits that are due, only looks for them once every revisit_check_interval seconds.
+        :return: None
+        """
+        if self.revisits is None:
+            return
+
+        now = time.monotonic()
+        if now < self._next_revisit_check:
+            return
+        self._next_revisit_check = now + self.options.revisit_check_interval
+
+        limit = self.revisits.capacity
+        if not limit:
+            return
+
+        rows = due_revisits(
+            self.db_session,
+            datetime.datetime.utcnow(),
+            after=self.revisits.cursor,
+            limit=limit,
+        )
+        # End the read transaction so it doesn't pin the WAL.
+        self.db_session.commit()
 
-            if page is None:
-                return None
+        # Revisited URLs have been crawled before, so they're queued without checking the seen URLs.
+        urls = self.revisits.add_due(rows, limit)
+        self.url_manager.requeue_urls(urls)
+
+        if urls:
+            logger.info(f"[Revisit] Queued {len(urls)} due revisits")
 
-            if 300 > page.status_code >= 200:
-                passed_urls = set()
+    def write_revisit(
+        self, row: dict, touched_at: datetime.datetime | None = None
+    ) -> None:
+        """
+        Writes a page's revisit row.
+        :param row: The row, see RevisitScheduler.revisit_row.
+        :param touched_at: When the page was found unchanged, bumps its stored crawled_at.
+        :return: None
+        """
+        if self.db_writer is not None:
+            self.db_writer.update_revisit(row)
+            if touched_at is not None:
+                self.db_writer.touch_page(row["url"], touched_at)
+            return
+
+        upsert_revisits(self.db_session, [row])
+        if touched_at is not None:
+            touch_pages(self.db_session, {row["url"]: touched_at})
+        self.db_session.commit()
+
+    def is_unchanged_revisit(self, page: Page, revisit: Revisit | None) -> bool:
+        """
+        Checks whether a revisit found the page unchanged, rescheduling it if it did. Changed pages are rescheduled
+        once they're stored, see store_page.
+        :param page: The crawled page.
+        :param revisit: The page's revisit, None if it was crawled for the first time.
+        :return: True if the page is unchanged, it then doesn't need to be parsed or stored again.
+        """
+        if revisit is None:
+            return False
+
+        now = datetime.datetime.utcnow()
+        if page.status_code == 304:
+            body_hash = None
+        elif 300 > page.status_code >= 200:
+            body_hash = content_hash(page.content)
+            if body_hash != revisit.content_hash:
+                return False
+        else:
+            # Errors aren't changes, but back off so a failing page isn't refetched every check.
+            self.write_revisit(self._revisit_row(page, revisit, False, None, now))
+            return False
+
+        logger.info(
+            f"[Revisit] \"{page.url[:60]}{'...' if len(page.url) > 60 else ''}\" is unchanged"
+        )
+        with self.stats.time_stage("db_write"):
+            self.write_revisit(
+                self._revisit_row(page, revisit, False, body_hash, now), touched_at=now
+            )
+        self.stats.pages_unchanged += 1
+        return True
 
-                for url in page.get_links():
-                    if self.url_compliance_checker(url):
-                        passed_urls.add(url)
+    def _revisit_row(
+        self,
+        page: Page,
+        revisit: Revisit | None,
+        changed: bool,
+        body_hash: str | None,
+        now: datetime.datetime,
+    ) -> dict:
+        return self.revisits.revisit_row(
+            url=page.url,
+            domain=db.normalize_domain(page.domain),
+            previous=revisit,
+            changed=changed,
+            content_hash=body_hash,
+            etag=page.headers.get("etag"),
+            last_modified=page.headers.get("last-modified"),
+            now=now,
+        )
 
-                self.url_manager.add_many_to_to_crawl_queue(passed_urls)
+    def store_page(self, page: Page, revisit: Revisit | None = None) -> None:
+        """
+        Writes the page to the database if it follows the database rules, and schedules its next visit.
+        :param page: The page to store.
+        :param revisit: The page's revisit, None if it was crawled for the first time.
+        :return: None
+        """
+        with self.stats.time_stage("db_write"):
+            self._store_page(page, revisit)
+
+    def _store_page(self, page: Page, revisit: Revisit | None) -> None:
+        url = page.url
+        now = datetime.datetime.utcnow()
+
+        if self.page_follows_db_rules(page):
+            logger.info("[DB] Writing page to database")
+            row = dict(
+                status_code=page.status_code,
+                elapsed=page.elapsed.total_seconds(),
+                crawled_at=now,
+                url=page.url,
+                domain=db.normalize_domain(page.domain),
+                title=page.html_title,
+                etag=page.headers.get("etag"),
+                last_modified=page.headers.get("last-modified"),
+                content=page.content.decode().encode("UTF-8")[:DB_MAX_CONTENT_CHARS],
+            )
 
-            else:
-                logger.info(
-                    f"[Response] HTTP {page.status_code} @ \"{url[:60]}{'...' if len(url) > 60 else ''}\""
+            # A revisit that got an error was already backed off by is_unchanged_revisit, it isn't a change.
+            if self.revisits is not None and (
+                revisit is None or 300 > page.status_code >= 200
+            ):
+                self.write_revisit(
+                    self._revisit_row(
+                        page, revisit, True, content_hash(page.content), now
+                    )
                 )
 
-            # Update statistics.
-            total_time = time.time_ns() - start_time
-            self.stats.update(page=page, elapsed_time=total_time)
-
-            # Write new page to database:
-
-            if self.page_follows_db_rules(page):
-                logger.info("[DB] Writing page to database")
-                page_model = db.PageModel(
-                    status_code=page.status_code,
-                    elapsed=page.elapsed.total_seconds(),
-                    url=page.url,
-                    domain=page.domain,
-                    title=page.html_title,
-                    content=page.content.decode().encode("UTF-8")[
-                        :DB_MAX_CONTENT_CHARS
-                    ],
+            if self.db_writer is not None:
+                self.db_writer.add_page(row)
+            else:
+                store_page_rows(
+                    self.db_session,
+                    [row],
+                    codec=self.options.page_content_codec,
+                    level=self.options.page_content_compression_level,
                 )
-                self.db_session.add(page_model)
 
                 # Save to db.
                 self.db_session.commit()
-            else:
-                logger.info(
-                    f"[DB] \"{url[:60]}{'...' if len(url) > 60 else ''}\" doesn't follow database rules."
-                )
+        else:
+            logger.info(
+                f"[DB] \"{url[:60]}{'...' if len(url) > 60 else ''}\" doesn't follow database rules."
+            )
+
+            if revisit is not None and 300 > page.status_code >= 200:
+                # No longer storable, keep checking back but less often.
+                self.write_revisit(self._revisit_row(page, revisit, False, None, now))
+
+    def record_links(self, page: Page, links: typing.Iterable[str]) -> None:
+        """
+        Adds the page's links to the link graph.
+        :param page: The crawled page.
+        :param links: Compliant links found on it.
+        :return: None
+        """
+        if not self.options.store_link_graph:
+            return
+
+        if self.db_writer is not None:
+            self.db_writer.add_links(page.url, links)
+        else:
+            store_links(self.db_session, {page.url: links})
+            self.db_session.commit()
+
+    def enqueue_links(
+        self, links: dict[str, float | None], depth: int, referrer: str | None = None
+    ) -> None:
+        """
+        Queues links found on a crawled page, overridden by crawlers that hand links off elsewhere.
+        :param links: Compliant links to queue -> their score, see get_compliant_links.
+        :param depth: Depth of the links, one more than the page's.
+        :param referrer: URL of the page the links were found on.
+        :return: None
+        """
+        self.url_manager.add_many_to_to_crawl_queue(
+            links, depth=depth, scores=links, referrer=referrer
+        )
+
+    def finish_url(self, url: str) -> None:
+        """
+        Removes a crawled URL from the frontier checkpoint once its page is in the database, see URLManager.crawled.
+        :param url: The URL.
+        :return: None
+        """
+        if self.db_writer is not None:
+            self.db_writer.mark_crawled(url)
+        else:
+            self.url_manager.crawled((url,))
+
+    def crawl_url(self, url: str, depth: int, start_time: int) -> Page | None:
+        """
+        Crawls a URL popped from the frontier, see step.
+        :param url: The URL.
+        :param depth: How many links away from a seed the URL was found.
+        :param start_time: When the step started, in nanoseconds.
+        :return: Page or None if there was an error.
+        """
+        # Check if domain is in domain table.
+        protocol, domain = get_protocol_and_domain_from_url(url)
+        with self.stats.time_stage("domain"):
+            self.register_domain(domain, protocol)
+
+        # Get the page, and update the crawling queue to hold the new links.
+        logger.info(
+            f"[Crawling] Crawling page \"{url[:60]}{'...' if len(url) > 60 else ''}\""
+        )
+        revisit = self.revisits.pop(url) if self.revisits is not None else None
+
+        try:
+            page = self.get_page(url, RevisitScheduler.conditional_headers(revisit))
+
+        except requests.exceptions.ConnectionError as e:
+            logger.info(
+                f"[Request Error] on page \"{url[:60]}{'...' if len(url) > 60 else ''}\" {e}"
+            )
+            self.stats.pages_crawled += 1
+            self.stats.pages_failed += 1
+            return None
+
+        except Exception as e:
+            logger.error(f"[GET PAGE ERROR] {e}")
+            return None
+
+        if page is None:
+            return None
+
+        if self.is_unchanged_revisit(page, revisit):
+            # Nothing new to parse or store.
+            self.stats.update(page=page, elapsed_time=time.time_ns() - start_time)
+            page.release()
             return page
+
+        duplicate = False
+        if 300 > page.status_code >= 200:
+            # A changed page would match its own earlier version, so only new pages are checked.
+            if revisit is None:
+                duplicate = self.is_near_duplicate(page)
+
+            if not (duplicate and self.options.skip_near_duplicate_links):
+                links = self.get_compliant_links(page, depth + 1)
+                self.record_links(page, links)
+                self.enqueue_links(links, depth + 1, page.url)
+
+        else:
+            logger.info(
+                f"[Response] HTTP {page.status_code} @ \"{url[:60]}{'...' if len(url) > 60 else ''}\""
+            )
+
+        # Write new page to database:
+        if not (duplicate and self.options.skip_near_duplicate_storage):
+            self.store_page(page, revisit)
+
+        # Update statistics, the step's time includes writing the page.
+        total_time = time.time_ns() - start_time
+        self.stats.update(page=page, elapsed_time=total_time)
+
+        # The links are queued and the row is copied, don't keep the body or tree alive with the page.
+        page.release()
+        return page
+
+    def step(self) -> Page | None:
+        """
+        Steps through an iteration of the crawler.
+        """
+        try:
+            start_time = time.time_ns()
+
+            if self.db_writer is not None:
+                self.url_manager.crawled(self.db_writer.pop_crawled())
+            self.schedule_revisits()
+
+            try:
+                with self.stats.time_stage("frontier"):
+                    url, _, depth = self.url_manager.get_next_entry()
+            except WaitBeforeRetryException as e:
+                # Every queued domain is still waiting on its crawl delay, sleep until the first one is ready.
+                time.sleep(e.retry_after)
+                return None
+
+            try:
+                return self.crawl_url(url, depth, start_time)
+            finally:
+                self.finish_url(url)
         except NoUrlException as e:
             raise e
         except Exception as e:
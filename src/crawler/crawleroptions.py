@@ -1,11 +1,32 @@
 class BaseCrawlerOptions:
     def __init__(self):
+        # How many hosts to keep keep-alive connection pools for, and how many connections to keep open per host.
+        self.connection_pools: int = 100
+        self.connections_per_host: int = 4
+
+        # Close a host's connection pool once it hasn't been requested for this many seconds.
+        self.connection_idle_timeout: float = 60
+
         # Should the crawler follow the rules of /robots.txt (https://www.rfc-editor.org/rfc/rfc9309.html)
         self.follow_robots_txt: bool = True
 
         # How long to wait for request to /robots.txt to complete.
         self.robots_timeout = 10
 
+        # How many domains to keep parsed robots.txt rules for, and how many seconds before they're re-parsed.
+        self.robots_cache_size: int = 10000
+        self.robots_cache_ttl: float = 3600
+
+        # How many seconds to cache DNS lookups for, and failed lookups for.
+        self.dns_cache_ttl: float = 300
+        self.dns_negative_cache_ttl: float = 60
+
+        # Maximum amount of hosts in the DNS cache.
+        self.dns_cache_size: int = 100000
+
+        # How many DNS lookups to run at once when resolving the hosts of a page's links.
+        self.dns_resolver_threads: int = 16
+
         # What should the user agent (UA) for the crawler be
         self.ua: str | None = None
 
@@ -13,18 +34,180 @@ class BaseCrawlerOptions:
         self.check_url_ending: bool = True
         self.ignored_url_endings: set[str] = set()
 
+        # Crawl hosts that resolve to private or local addresses, only meant for local testing and benchmarks.
+        self.allow_private_hosts: bool = False
+
         # Check the content-type from the response headers
         self.check_content_type: bool = True
 
         # Max page content size
         self.max_page_size = 1.5e7  # 15 mb.
 
-        # Request stream buffer size.
+        # Maximum amount of links to take from a page.
+        self.max_links_per_page: int = 100
+
+        # How many hrefs are read from a page when the frontier is prioritized, the best max_links_per_page are kept.
+        self.max_link_candidates_per_page: int = 500
+
+        # Extract links and titles with a single streaming pass instead of building the whole lxml tree.
+        self.stream_parse_pages: bool = True
+
+        # Fingerprint pages with SimHash to find near-duplicates of pages crawled earlier.
+        self.detect_near_duplicates: bool = True
+
+        # Maximum amount of differing fingerprint bits (out of 64) for two pages to be near-duplicates.
+        self.near_duplicate_threshold: int = 3
+
+        # Pages with fewer distinct 3-word shingles than this, i.e. script-only or nearly empty pages, aren't checked.
+        self.near_duplicate_min_shingles: int = 8
+
+        # How many fingerprints to remember.
+        self.near_duplicate_index_size: int = 1000000
+
+        # What to skip for near-duplicate pages.
+        self.skip_near_duplicate_links: bool = True
+        self.skip_near_duplicate_storage: bool = True
+
+        # Request stream buffer size, the first read of a body uses this size and every read after doubles it up to
+        # max_content_buffer_size.
         self.content_buffer_size = 2048
+        self.max_content_buffer_size = 1048576
 
         # How long to wait before timeing out request to a page (not including robots.txt see: self.robots_timeout)
         self.page_timeout = 20
 
+        # Minimum amount of seconds between two requests to the same domain, robots.txt delays can only raise this.
+        self.min_crawl_delay: float = 0
+
+        # Track seen URLs with a bloom filter instead of a set so memory stays flat on long crawls.
+        self.use_seen_url_filter: bool = False
+
+        # How many URLs the seen URL filter is sized for and its false positive rate at that size.
+        self.seen_url_filter_capacity: int = 10_000_000
+        self.seen_url_filter_error_rate: float = 0.001
+
+        # SQLite file used to confirm seen URL filter hits so no URL is wrongly skipped, None to trust the filter.
+        self.seen_url_store_path: str | None = "./dbs/seen.db"
+
+        # SQLite file the frontier is checkpointed to so a crawl can resume after a crash, None to disable.
+        self.frontier_checkpoint_path: str | None = None
+
+        # How many frontier changes to buffer, and for how many seconds at most, before writing them to the checkpoint.
+        self.frontier_checkpoint_batch_size: int = 5000
+        self.frontier_checkpoint_interval: float = 5
+
+        # Codec page bodies are stored with ("zlib", "zstd" if zstandard is installed, or "none") and its level,
+        # None for the codec's default.
+        self.page_content_codec: str = "zlib"
+        self.page_content_compression_level: int | None = None
+
+        # Write pages and domain updates from a background thread in batches instead of committing every step.
+        self.use_db_writer: bool = True
+
+        # How many writes, and for how many seconds at most, the writer batches into one transaction.
+        self.db_writer_batch_size: int = 500
+        self.db_writer_flush_interval: float = 2
+
+        # How many writes can be waiting on the writer before the crawler blocks.
+        self.db_writer_queue_size: int = 10000
+
+        # How many requests the async crawler keeps in flight at once.
+        self.max_concurrent_requests = 256
+
+        # How many requests the async crawler keeps in flight to a single domain.
+        self.max_concurrent_requests_per_host = 2
+
+        # How many pages the async crawler works on at once, also the size of its thread pool. Kept above
+        # max_concurrent_requests so pages being parsed or checked don't leave request slots unused.
+        self.async_workers = 512
+
+        # Port to serve Prometheus metrics on at 127.0.0.1:<port>/metrics, None to disable.
+        self.metrics_port: int | None = None
+
+        # File to dump Prometheus metrics to every metrics_dump_interval seconds, None to disable.
+        self.metrics_dump_path: str | None = None
+        self.metrics_dump_interval: float = 15
+
+        # How many of the most crawled domains get per domain metrics.
+        self.metrics_top_domains: int = 50
+
+        # Creating this file starts profiling the crawl loop, as does SIGUSR1 when running main.py. None to disable
+        # the file. It can hold "steps=N" or "seconds=N" to override the window below.
+        self.profile_control_path: str | None = "./profile.request"
+
+        # How many steps, or if set how many seconds, a profiling window lasts.
+        self.profile_steps: int = 1000
+        self.profile_seconds: float | None = None
+
+        # Where profiles are dumped and how many of the hottest functions get logged.
+        self.profile_directory: str = "./dbs/profiles"
+        self.profile_top_functions: int = 25
+
+        # Schedule stored pages to be crawled again, with ETag/Last-Modified so unchanged pages cost a 304.
+        self.revisit_pages: bool = True
+
+        # Seconds until a new page is revisited, and the bounds its interval adapts within.
+        self.revisit_initial_interval: float = 86400
+        self.revisit_min_interval: float = 3600
+        self.revisit_max_interval: float = 30 * 86400
+
+        # What a page's interval is multiplied by when a revisit finds it changed, and when it finds it unchanged.
+        self.revisit_changed_factor: float = 0.5
+        self.revisit_unchanged_factor: float = 1.5
+
+        # Seconds between looking for due revisits, and how many revisits can be queued at once.
+        self.revisit_check_interval: float = 60
+        self.revisit_batch_size: int = 1000
+
+        # Keep an SQLite FTS5 index of stored pages' titles and text up to date from a background thread, see
+        # database.search. The thread shares the GIL with the crawler, so by default the index is kept up to date by
+        # running python -m database.search index --follow from the src directory in its own process instead.
+        self.index_pages_for_search: bool = False
+
+        # The index's file, None to put search.db next to the pages database.
+        self.search_index_path: str | None = None
+
+        # How many pages are indexed per transaction, and seconds between looking for newly stored pages.
+        self.search_index_batch_size: int = 500
+        self.search_index_interval: float = 10
+
+        # Store the links found on every page as integer id edges for database.pagerank.
+        self.store_link_graph: bool = True
+
+        # Crawl the best scored URLs first, see crawler.scoring. Otherwise ready domains are picked by how long they've
+        # been waiting and their shallowest URLs are crawled first.
+        self.prioritize_frontier: bool = True
+
+        # Scores URLs for the frontier, a crawler.scoring.URLScorer, None for the default one.
+        self.url_scorer = None
+
+        # Let the default scorer favour URLs many pages link to, as last counted by database.pagerank.
+        self.score_by_in_links: bool = False
+
+        # Keep crawl traps like calendars, faceted search and relative link loops out of the frontier, see
+        # crawler.traps.TrapDetector.
+        self.detect_crawl_traps: bool = True
+
+        # Maximum amount of URLs queued for a domain at once, and crawled from it during a run, None for no limit.
+        self.max_queued_urls_per_domain: int | None = 10_000
+        self.max_crawled_urls_per_domain: int | None = 50_000
+
+        # Maximum amount of path segments, times a segment can repeat in a path, and query parameters of a new URL.
+        self.max_url_path_depth: int = 12
+        self.max_repeated_path_segments: int = 3
+        self.max_url_query_parameters: int = 8
+
+        # A URL template with non-numeric query values, i.e. search facets, stops being queued after this many URLs.
+        self.trap_pattern_max_urls: int = 5000
+
+        # A URL template stops being queued after this many links in a row, each found on the page before it, moved
+        # one of its numbers by at most trap_chain_max_step, i.e. the next month of a calendar.
+        self.trap_chain_max_length: int = 200
+        self.trap_chain_max_step: int = 100
+
+        # How many faceted URL templates, and how many URLs of chains, are tracked at once.
+        self.trap_patterns_tracked: int = 100_000
+
 
 class DefaultCrawlerOptions(BaseCrawlerOptions):
     def __init__(
@@ -35,6 +218,8 @@ class DefaultCrawlerOptions(BaseCrawlerOptions):
 
         self.ua: str = "OWS-CRAWLER/0.1-DEV (https://github.com/quintindunn/OWS)"
 
+        self.frontier_checkpoint_path = "./dbs/frontier.db"
+
         with open(ignored_file_extensions_path, "r") as f:
             extensions = f.readlines()[1:]
         self.ignored_url_endings = set(extensions)
@@ -1,8 +1,29 @@
+import contextlib
+import time
+
 try:
+    from .metrics import Histogram, format_histogram, format_labels
     from .page import Page
 except ImportError:
+    from metrics import Histogram, format_histogram, format_labels
     from page import Page
 
+from collections import Counter
+
+# Stages of a crawler step that are timed, in the order they happen.
+STAGES = (
+    "frontier",
+    "domain",
+    "robots",
+    "ttfb",
+    "download",
+    "parse",
+    "compliance",
+    "simhash",
+    "db_write",
+    "db_flush",
+)
+
 
 class CrawlerStats:
     def __init__(self):
@@ -10,17 +31,135 @@ class CrawlerStats:
         self.pages_failed: int = 0
         self.pages_ok: int = 0
 
+        # Revisits that found the page unchanged, by a 304 or an identical body.
+        self.pages_unchanged: int = 0
+
         self.total_crawl_time: int = 0
         self.domains: list[str] = []
 
+        # Domain -> pages crawled, and domain -> pages that were near-duplicates of an earlier page.
+        self.domain_pages_crawled: Counter[str] = Counter()
+        self.domain_duplicates: Counter[str] = Counter()
+
+        self.bytes_downloaded: int = 0
+        self.domain_bytes: Counter[str] = Counter()
+
+        # Reason -> URLs the trap detector kept out of the frontier, and domain -> URL templates that tripped on it,
+        # "*" for a domain that used up its crawl budget. See traps.TrapDetector.
+        self.urls_trapped: Counter[str] = Counter()
+        self.trapped_domains: dict[str, list[str]] = dict()
+
+        # Stage -> seconds spent in it per step, see STAGES. "step" holds the time of whole steps.
+        self.stage_times: dict[str, Histogram] = {
+            stage: Histogram() for stage in STAGES + ("step",)
+        }
+
+        # Point in time values like queue depths, set by the crawler before the metrics are rendered.
+        self.gauges: dict[str, tuple[float, str]] = dict()
+
     @property
     def average_crawl_time(self) -> float:
         """
         Gets the average time for the crawler to crawl a page.
         :return: A float of the average time to crawl a page.
         """
+        if not self.pages_crawled:
+            return 0.0
         return self.total_crawl_time / self.pages_crawled
 
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Records the time a step spent in a stage.
+        :param stage: The stage, see STAGES.
+        :param seconds: Time spent in the stage.
+        :return: None
+        """
+        histogram = self.stage_times.get(stage)
+        if histogram is None:
+            histogram = self.stage_times.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    def set_gauge(self, name: str, value: float, description: str) -> None:
+        """
+        Sets a point in time value exported with the metrics.
+        :param name: Metric name without the ows_crawler_ prefix.
+        :param value: The value.
+        :param description: Help text for the metric.
+        :return: None
+        """
+        self.gauges[name] = (value, description)
+
+    @contextlib.contextmanager
+    def time_stage(self, stage: str):
+        """
+        Times the body of the with statement as a stage, also when it raises.
+        :param stage: The stage, see STAGES.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def stage_quantiles(
+        self, quantiles: tuple[float, ...] = (0.5, 0.95, 0.99)
+    ) -> dict[str, list[float]]:
+        """
+        Gets latency quantiles of every stage that was timed.
+        :param quantiles: The quantiles to estimate.
+        :return: Stage -> estimated seconds per quantile.
+        """
+        return {
+            stage: [histogram.quantile(q) for q in quantiles]
+            for stage, histogram in list(self.stage_times.items())
+            if histogram.count
+        }
+
+    def record_duplicate(self, domain: str) -> None:
+        """
+        Counts a near-duplicate page against its domain.
+        :param domain: The page's domain.
+        :return: None
+        """
+        self.domain_duplicates[domain] += 1
+
+    def duplicate_rate(self, domain: str) -> float:
+        """
+        Gets the share of the domain's crawled pages that were near-duplicates.
+        :param domain: The domain.
+        :return: A float between 0 and 1.
+        """
+        crawled = self.domain_pages_crawled[domain]
+        return self.domain_duplicates[domain] / crawled if crawled else 0.0
+
+    def most_duplicated_domains(self, count: int = 10) -> list[tuple[str, float]]:
+        """
+        Gets the domains wasting the most fetches on near-duplicates.
+        :param count: How many domains to return.
+        :return: A list of (domain, duplicate rate) with the most duplicates first.
+        """
+        return [
+            (domain, self.duplicate_rate(domain))
+            for domain, _ in self.domain_duplicates.most_common(count)
+        ]
+
+    def record_trapped_url(self, reason: str) -> None:
+        """
+        Counts a URL the trap detector rejected.
+        :param reason: Why it was rejected, see traps.TrapDetector.check.
+        :return: None
+        """
+        self.urls_trapped[reason] += 1
+
+    def record_trap(self, domain: str, pattern: str) -> None:
+        """
+        Records a URL template that tripped the trap detector.
+        :param domain: The template's domain.
+        :param pattern: The template, see traps.url_pattern, or "*" if the domain used up its crawl budget.
+        :return: None
+        """
+        self.trapped_domains.setdefault(domain, []).append(pattern)
+
     def update(self, page: Page, elapsed_time: int) -> None:
         """
         Updates the CrawlerStats object with the new time for the page.
@@ -29,7 +168,14 @@ class CrawlerStats:
         :return: None
         """
         self.pages_crawled += 1
-        okay = page.status_code < 300
+        if page.domain not in self.domain_pages_crawled:
+            self.domains.append(page.domain)
+        self.domain_pages_crawled[page.domain] += 1
+
+        size = len(page.content)
+        self.bytes_downloaded += size
+        self.domain_bytes[page.domain] += size
+        okay = page.status_code < 300 or page.status_code == 304
 
         if okay:
             self.pages_ok += 1
@@ -37,3 +183,139 @@ class CrawlerStats:
             self.pages_failed += 1
 
         self.total_crawl_time += elapsed_time
+        self.observe("step", elapsed_time / 1e9)
+
+    def to_prometheus(self, top_domains: int = 50) -> str:
+        """
+        Renders the stats in the Prometheus text exposition format.
+        :param top_domains: Per domain series are only exported for this many of the most crawled domains to keep
+        the amount of series bounded.
+        :return: The metrics.
+        """
+        lines = []
+
+        def add(name: str, kind: str, description: str, samples: list[str]) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        for name, value, description in (
+            ("pages_crawled", self.pages_crawled, "Pages crawled."),
+            ("pages_ok", self.pages_ok, "Pages that returned a 2xx or 304 status."),
+            (
+                "pages_unchanged",
+                self.pages_unchanged,
+                "Revisited pages that hadn't changed.",
+            ),
+            (
+                "pages_failed",
+                self.pages_failed,
+                "Pages that failed or returned an error status.",
+            ),
+            (
+                "bytes_downloaded",
+                self.bytes_downloaded,
+                "Bytes of page bodies downloaded.",
+            ),
+            (
+                "duplicates",
+                sum(dict(self.domain_duplicates).values()),
+                "Near-duplicate pages.",
+            ),
+            (
+                "trap_patterns",
+                sum(len(patterns) for patterns in list(self.trapped_domains.values())),
+                "URL templates and domain budgets that tripped the trap detector.",
+            ),
+        ):
+            add(
+                f"ows_crawler_{name}_total",
+                "counter",
+                description,
+                [f"ows_crawler_{name}_total {value}"],
+            )
+
+        add(
+            "ows_crawler_urls_trapped_total",
+            "counter",
+            "URLs kept out of the frontier by the trap detector.",
+            [
+                f"ows_crawler_urls_trapped_total{format_labels({'reason': reason})} {count}"
+                for reason, count in sorted(dict(self.urls_trapped).items())
+            ],
+        )
+
+        histogram_samples = []
+        quantile_samples = []
+        for stage, histogram in list(self.stage_times.items()):
+            histogram_samples.extend(
+                format_histogram(
+                    "ows_crawler_stage_seconds", {"stage": stage}, histogram
+                )
+            )
+            for q in (0.5, 0.95, 0.99):
+                labels = format_labels({"stage": stage, "quantile": str(q)})
+                quantile_samples.append(
+                    f"ows_crawler_stage_quantile_seconds{labels} {histogram.quantile(q)}"
+                )
+        add(
+            "ows_crawler_stage_seconds",
+            "histogram",
+            "Time spent in each stage of a crawler step.",
+            histogram_samples,
+        )
+        add(
+            "ows_crawler_stage_quantile_seconds",
+            "gauge",
+            "Estimated p50, p95 and p99 of each stage's time.",
+            quantile_samples,
+        )
+
+        domain_pages = dict(self.domain_pages_crawled)
+        domain_bytes = dict(self.domain_bytes)
+        domain_duplicates = dict(self.domain_duplicates)
+        top = sorted(domain_pages, key=domain_pages.get, reverse=True)[:top_domains]
+        for name, values, description in (
+            ("domain_pages_crawled", domain_pages, "Pages crawled per domain."),
+            ("domain_bytes_downloaded", domain_bytes, "Bytes downloaded per domain."),
+            (
+                "domain_duplicates",
+                domain_duplicates,
+                "Near-duplicate pages per domain.",
+            ),
+        ):
+            add(
+                f"ows_crawler_{name}_total",
+                "counter",
+                description,
+                [
+                    f"ows_crawler_{name}_total{format_labels({'domain': domain})} {values.get(domain, 0)}"
+                    for domain in top
+                ],
+            )
+
+        trapped_domains = dict(self.trapped_domains)
+        add(
+            "ows_crawler_domain_trap_patterns",
+            "gauge",
+            "URL templates that tripped the trap detector per domain, for the domains with the most.",
+            [
+                f"ows_crawler_domain_trap_patterns{format_labels({'domain': domain})} "
+                f"{len(trapped_domains[domain])}"
+                for domain in sorted(
+                    trapped_domains,
+                    key=lambda domain: len(trapped_domains[domain]),
+                    reverse=True,
+                )[:top_domains]
+            ],
+        )
+
+        for name, (value, description) in sorted(dict(self.gauges).items()):
+            add(
+                f"ows_crawler_{name}",
+                "gauge",
+                description,
+                [f"ows_crawler_{name} {value}"],
+            )
+
+        return "\n".join(lines) + "\n"
@@ -10,9 +10,10 @@ class NoUrlException(Exception):
 
 
 class WaitBeforeRetryException(Exception):
-    def __init__(self, msg: str = ""):
+    def __init__(self, msg: str = "", retry_after: float = 0):
         super().__init__()
         self.msg = msg
+        self.retry_after = retry_after
 
     def __str__(self):
         return self.msg or "Cannot crawl page, try again later."
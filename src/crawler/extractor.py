@@ -0,0 +1,108 @@
+from lxml import etree
+
+# How many bytes of the page are fed to the parser at a time, the parser stops being fed once it's done.
+FEED_SIZE = 65536
+
+
+class _ExtractorTarget:
+    """
+    lxml parser target that pulls anchor hrefs, the base href and the title out of a page as it's parsed, without
+    building a tree.
+    """
+
+    def __init__(self, link_limit: int):
+        self.link_limit = link_limit
+
+        self.links: list[str] = []
+        self.base_href: str | None = None
+        self.title: str | None = None
+        self.meta_title: str | None = None
+
+        self._title_parts: list[str] | None = None
+        self._in_body = False
+
+    @property
+    def done(self) -> bool:
+        # The title is in the head, once we're in the body only the links are left to find.
+        return len(self.links) >= self.link_limit and (
+            self.title is not None or self._in_body
+        )
+
+    def start(self, tag, attrib) -> None:
+        if tag == "a":
+            href = attrib.get("href")
+            if href is None or len(self.links) >= self.link_limit:
+                return
+
+            href = href.strip()
+            if not href or href.startswith("#"):
+                return
+
+            # Skip links with a scheme the crawler can't follow, i.e. mailto: or javascript:
+            if ":" in href and href.split(":", 1)[0].lower() not in ("http", "https"):
+                return
+
+            self.links.append(href)
+
+        elif tag == "body":
+            self._in_body = True
+
+        elif tag == "title" and self.title is None:
+            self._title_parts = []
+
+        elif tag == "base" and self.base_href is None:
+            self.base_href = attrib.get("href")
+
+        elif tag == "meta" and self.meta_title is None:
+            if (attrib.get("name") or "").lower() == "title":
+                self.meta_title = attrib.get("content")
+
+    def end(self, tag) -> None:
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts)
+            self._title_parts = None
+
+    def data(self, data) -> None:
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def close(self) -> "_ExtractorTarget":
+        return self
+
+
+class ExtractedPage:
+    """
+    The parts of a page the crawler uses, see extract_page.
+    """
+
+    def __init__(self, links: list[str], title: str, base_href: str | None):
+        self.links = links
+        self.title = title
+        self.base_href = base_href
+
+
+def extract_page(content: bytes, link_limit: int) -> ExtractedPage:
+    """
+    Extracts the anchor hrefs, base href and title from a page in a single streaming pass.
+    Parsing stops as soon as link_limit links and the title have been found.
+    :param content: The page's HTML.
+    :param link_limit: Maximum amount of links to extract.
+    :return: ExtractedPage with the raw (unresolved) links in document order.
+    """
+    target = _ExtractorTarget(link_limit=link_limit)
+    parser = etree.HTMLParser(target=target)
+
+    try:
+        for i in range(0, len(content), FEED_SIZE):
+            parser.feed(content[i : i + FEED_SIZE])
+            if target.done:
+                break
+        parser.close()
+    except etree.LxmlError:
+        # Keep whatever was extracted before the parser gave up.
+        pass
+
+    title = target.title if target.title is not None else target.meta_title
+    return ExtractedPage(
+        links=target.links, title=title or "", base_href=target.base_href
+    )
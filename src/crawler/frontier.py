@@ -0,0 +1,204 @@
+import random
+
+from typing import NamedTuple
+
+# URL scores are quantized into this many priorities, see score_to_priority.
+PRIORITY_LEVELS = 16
+
+# Depths are stored in a byte of the bucket key, deeper URLs are kept as this deep.
+MAX_DEPTH = 255
+
+
+def score_to_priority(score: float) -> int:
+    """
+    Quantizes a URL score between 0 and 1, see scoring.URLScorer, into a priority between 0 and PRIORITY_LEVELS - 1.
+    :param score: The score.
+    :return: The priority, higher is crawled first.
+    """
+    return min(max(int(score * PRIORITY_LEVELS), 0), PRIORITY_LEVELS - 1)
+
+
+class FrontierEntry(NamedTuple):
+    url: str
+    priority: int
+    depth: int  # How many links away from a seed the URL was found.
+
+
+def _bucket_key(priority: int, depth: int) -> int:
+    # Higher priorities sort first, then shallower URLs.
+    return priority << 8 | (MAX_DEPTH - min(depth, MAX_DEPTH))
+
+
+class Frontier:
+    """
+    Priority queue of URLs to crawl grouped by domain.
+
+    Every domain owns a slot holding its URLs bucketed by (priority, depth), the slot remembers its best bucket. URLs
+    are popped from the best bucket by swapping a random one with the last URL in the bucket, and every emptied slot is
+    swap-removed the same way. The buckets of a slot are a dict over the few priorities and depths in use, so pushing
+    and popping stay constant time regardless of how many URLs or domains are queued, and a URL costs no more memory
+    than a reference in a list.
+    """
+
+    def __init__(self):
+        self._domains: list[str] = []
+        self._buckets: list[dict[int, list[str]]] = []  # Bucket key -> URLs
+        self._best: list[int] = []  # Key of the best bucket of every slot
+        self._counts: list[int] = []  # URLs queued in every slot
+        self._slots: dict[str, int] = dict()  # Domain -> index into the lists above
+
+        self.url_count = 0
+
+    @classmethod
+    def from_dict(cls, to_crawl: dict[str, list[str]]) -> "Frontier":
+        """
+        Builds a frontier from the dict format used by to_crawl.json, every URL gets the lowest priority.
+        :param to_crawl: Dict of domain -> list of URLs.
+        :return: The new Frontier.
+        """
+        frontier = cls()
+        for domain, urls in to_crawl.items():
+            for url in urls:
+                frontier.push(domain, url)
+        return frontier
+
+    def to_dict(self) -> dict[str, list[str]]:
+        """
+        Converts the frontier to the dict format used by to_crawl.json.
+        :return: Dict of domain -> list of URLs.
+        """
+        return {domain: self[domain] for domain in self._domains}
+
+    def push(self, domain: str, url: str, priority: int = 0, depth: int = 0) -> None:
+        """
+        Queues a URL.
+        :param domain: The URL's domain.
+        :param url: The URL to queue.
+        :param priority: Between 0 and PRIORITY_LEVELS - 1, higher is popped first.
+        :param depth: How many links away from a seed the URL was found, shallower is popped first among equal
+        priorities.
+        :return: None
+        """
+        key = _bucket_key(priority, depth)
+
+        slot = self._slots.get(domain)
+        if slot is None:
+            self._slots[domain] = len(self._domains)
+            self._domains.append(domain)
+            self._buckets.append({key: [url]})
+            self._best.append(key)
+            self._counts.append(1)
+        else:
+            self._counts[slot] += 1
+            buckets = self._buckets[slot]
+            urls = buckets.get(key)
+            if urls is None:
+                buckets[key] = [url]
+                if key > self._best[slot]:
+                    self._best[slot] = key
+            else:
+                urls.append(url)
+        self.url_count += 1
+
+    def pop(self, domain: str) -> FrontierEntry:
+        """
+        Removes and returns a random URL out of the best ones queued for the domain.
+        :param domain: The domain to pop from.
+        :return: The URL with its priority and depth.
+        """
+        slot = self._slots[domain]
+        buckets = self._buckets[slot]
+        key = self._best[slot]
+        urls = buckets[key]
+
+        index = random.randrange(len(urls))
+        urls[index], urls[-1] = urls[-1], urls[index]
+        url = urls.pop()
+        self.url_count -= 1
+        self._counts[slot] -= 1
+
+        if not urls:
+            del buckets[key]
+            if buckets:
+                self._best[slot] = max(buckets)
+            else:
+                self._remove_slot(slot)
+
+        return FrontierEntry(url, key >> 8, MAX_DEPTH - (key & 0xFF))
+
+    def remove(self, domain: str) -> list[FrontierEntry]:
+        """
+        Removes every URL queued for the domain.
+        :param domain: A domain with queued URLs.
+        :return: The removed URLs with their priorities and depths.
+        """
+        slot = self._slots[domain]
+        entries = [
+            FrontierEntry(url, key >> 8, MAX_DEPTH - (key & 0xFF))
+            for key, urls in self._buckets[slot].items()
+            for url in urls
+        ]
+        self.url_count -= len(entries)
+        self._remove_slot(slot)
+        return entries
+
+    def domain_url_count(self, domain: str) -> int:
+        """
+        Gets how many URLs are queued for the domain.
+        :param domain: The domain.
+        :return: The amount of URLs, 0 if it has none.
+        """
+        slot = self._slots.get(domain)
+        return 0 if slot is None else self._counts[slot]
+
+    def best_key(self, domain: str) -> int:
+        """
+        Gets the sort key of the URL pop would return for the domain, keys of different domains compare the same way
+        their URLs are ordered within a domain.
+        :param domain: A domain with queued URLs.
+        :return: The key, higher is better.
+        """
+        return self._best[self._slots[domain]]
+
+    def _remove_slot(self, slot: int) -> None:
+        """
+        Removes an emptied slot by moving the last slot into its place.
+        :param slot: Index of the slot to remove.
+        :return: None
+        """
+        del self._slots[self._domains[slot]]
+
+        last_domain = self._domains.pop()
+        last_buckets = self._buckets.pop()
+        last_best = self._best.pop()
+        last_count = self._counts.pop()
+
+        if slot < len(self._domains):
+            self._domains[slot] = last_domain
+            self._buckets[slot] = last_buckets
+            self._best[slot] = last_best
+            self._counts[slot] = last_count
+            self._slots[last_domain] = slot
+
+    def random_domain(self) -> str:
+        """
+        Picks a random domain with queued URLs.
+        :return: The domain.
+        """
+        return self._domains[random.randrange(len(self._domains))]
+
+    def keys(self) -> list[str]:
+        return self._domains
+
+    def __getitem__(self, domain: str) -> list[str]:
+        """
+        Gets a copy of the URLs queued for the domain, best first.
+        """
+        buckets = self._buckets[self._slots[domain]]
+        return [url for key in sorted(buckets, reverse=True) for url in buckets[key]]
+
+    def __contains__(self, domain: str) -> bool:
+        return domain in self._slots
+
+    def __len__(self) -> int:
+        return len(self._domains)
@@ -0,0 +1,219 @@
+import bisect
+import http.server
+import logging
+import os
+import threading
+
+from typing import Callable
+
+logger = logging.getLogger("Metrics")
+
+# Upper bounds in seconds, from half a millisecond for cache hits to a minute for slow downloads.
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, observing is a binary search and an increment so it's cheap enough for every step.
+    Quantiles are estimated by interpolating inside the bucket they fall in, like Prometheus' histogram_quantile.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        :param buckets: Sorted upper bounds of the buckets, an overflow bucket is added after the last one.
+        """
+        self.buckets = buckets
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+        # The async crawler observes from its worker threads.
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile of the observed values.
+        :param q: The quantile, between 0 and 1.
+        :return: The estimate, 0 if nothing was observed. Values in the overflow bucket are reported as the last bound.
+        """
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+
+        if count == 0:
+            return 0.0
+
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if index == len(self.buckets):
+                    return float(self.buckets[-1])
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return float(self.buckets[-1])
+
+    def cumulative_counts(self) -> list[int]:
+        """
+        Gets the amount of observations at or under each bound, the last entry is the +Inf bucket.
+        :return: A list of counts.
+        """
+        with self._lock:
+            counts = list(self.counts)
+
+        total = 0
+        cumulative = []
+        for bucket_count in counts:
+            total += bucket_count
+            cumulative.append(total)
+        return cumulative
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(
+            f'{key}="{_escape_label_value(str(value))}"'
+            for key, value in labels.items()
+        )
+        + "}"
+    )
+
+
+def format_histogram(
+    name: str, labels: dict[str, str], histogram: Histogram
+) -> list[str]:
+    """
+    Formats a histogram's samples in the Prometheus text format.
+    :param name: Metric name.
+    :param labels: Labels shared by every sample.
+    :param histogram: The histogram.
+    :return: The sample lines.
+    """
+    lines = []
+    cumulative = histogram.cumulative_counts()
+    bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+    for bound, count in zip(bounds, cumulative):
+        lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {count}")
+    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+    lines.append(f"{name}_count{format_labels(labels)} {cumulative[-1]}")
+    return lines
+
+
+class MetricsServer:
+    """
+    Serves the crawler's metrics at /metrics from a background thread for Prometheus to scrape.
+    """
+
+    def __init__(self, render: Callable[[], str], port: int, host: str = "127.0.0.1"):
+        """
+        :param render: Called on every scrape, returns the metrics in the Prometheus text format.
+        :param port: Port to listen on, 0 for any free port.
+        :param host: Address to listen on.
+        """
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="MetricsServer", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"[Metrics] Serving metrics on http://{host}:{self.port}/metrics")
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsFileDumper:
+    """
+    Writes the crawler's metrics to a file every interval seconds, for node_exporter's textfile collector or a human.
+    """
+
+    def __init__(self, render: Callable[[], str], path: str, interval: float):
+        """
+        :param render: Returns the metrics in the Prometheus text format.
+        :param path: File to write, replaced atomically so readers never see a partial dump.
+        :param interval: Seconds between dumps.
+        """
+        self.render = render
+        self.path = path
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="MetricsFileDumper", daemon=True
+        )
+        self._thread.start()
+
+    def dump(self) -> None:
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(self.render())
+        os.replace(temporary_path, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.error(f"[Metrics] Failed to dump metrics to {self.path}: {e}")
+
+    def close(self) -> None:
+        """
+        Stops the dumper after writing the final metrics.
+        :return: None
+        """
+        self._stop.set()
+        self._thread.join()
+        self.dump()
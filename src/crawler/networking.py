@@ -5,8 +5,13 @@ except ImportError as e:
     from exceptions import CouldntFindNetworkInfoException
     from urls import get_protocol_and_domain_from_url
 
+from concurrent.futures import ThreadPoolExecutor
 from ipaddress import IPv4Network, IPv4Address
+from typing import Iterable
+
 import socket
+import threading
+import time
 import psutil
 
 
@@ -20,7 +25,7 @@ def _get_network_info() -> tuple[str, str]:
     if len(net_if_addrs) == 0:
         raise CouldntFindNetworkInfoException()
 
-    for iface, addrs in psutil.net_if_addrs().items():
+    for iface, addrs in net_if_addrs:
         for addr in addrs:
             if addr.family == socket.AF_INET:
                 network_ip = IPv4Network(
@@ -29,17 +34,24 @@ def _get_network_info() -> tuple[str, str]:
                 yield network_ip, addr.netmask
 
 
-def _is_ip_in_range(ip: IPv4Address, network_ip: str, subnet_mask: str) -> bool:
+# (network address, netmask) pairs as integers for the local networks, see refresh_private_networks.
+_private_networks: list[tuple[int, int]] | None = None
+
+
+def refresh_private_networks() -> list[tuple[int, int]]:
     """
-    Checks if ip address is in an ip range.
-    :param ip: Ip to check
-    :param network_ip: Ip of the network
-    :param subnet_mask: subnet mask of the network
-    :return: True if the ip is in the range.
+    Re-reads the local network adapters into the table used by _is_ip_private.
+    Call this if the machine's networks change while crawling.
+    :return: The new table of (network address, netmask) integer pairs.
     """
-    network = IPv4Network(f"{network_ip}/{subnet_mask}", strict=False)
-    ip_addr = IPv4Address(ip)
-    return ip_addr in network
+    global _private_networks
+
+    networks = set()
+    for network_ip, subnet_mask in _get_network_info():
+        networks.add((int(network_ip), int(IPv4Address(subnet_mask))))
+
+    _private_networks = list(networks)
+    return _private_networks
 
 
 def _is_ip_private(ip: IPv4Address) -> bool:
@@ -48,8 +60,16 @@ def _is_ip_private(ip: IPv4Address) -> bool:
     :param ip: Ip address to check
     :return: True if ip is in the private range
     """
-    for network_ip, subnet_mask in _get_network_info():
-        if _is_ip_in_range(ip, network_ip, subnet_mask) or ip.is_private:
+    if ip.is_private:
+        return True
+
+    networks = _private_networks
+    if networks is None:
+        networks = refresh_private_networks()
+
+    ip_int = int(ip)
+    for network_ip, subnet_mask in networks:
+        if ip_int & subnet_mask == network_ip:
             return True
     return False
 
@@ -64,11 +84,136 @@ def _resolve_domain_to_ip(domain: str) -> IPv4Address:
     return ip_address
 
 
-def is_host_private(host: str) -> bool:
+class DNSCache:
+    """
+    Caches DNS lookups, failed lookups are cached too but for a shorter time.
+
+    The system resolver doesn't expose record TTLs so every answer is kept for a fixed TTL.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        negative_ttl: float = 60,
+        max_size: int = 100000,
+        resolver_threads: int = 16,
+    ):
+        """
+        :param ttl: Seconds to keep a successful lookup.
+        :param negative_ttl: Seconds to keep a failed lookup.
+        :param max_size: Maximum amount of hosts to keep.
+        :param resolver_threads: How many lookups resolve_many runs at once.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.resolver_threads = resolver_threads
+
+        # Host -> (ip or None if the lookup failed, expiry time), written from resolve_many's threads under _lock.
+        self.entries: dict[str, tuple[IPv4Address | None, float]] = dict()
+        self._lock = threading.Lock()
+
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, host: str) -> IPv4Address | None:
+        try:
+            ip = _resolve_domain_to_ip(host)
+            expires = time.monotonic() + self.ttl
+        except (socket.gaierror, UnicodeError, OSError):
+            # UnicodeError is raised for hosts the IDNA codec rejects, i.e. a label over 63 characters.
+            ip = None
+            expires = time.monotonic() + self.negative_ttl
+
+        with self._lock:
+            if len(self.entries) >= self.max_size:
+                self._evict()
+
+            self.entries[host] = (ip, expires)
+        return ip
+
+    def _evict(self) -> None:
+        # Called with _lock held.
+        now = time.monotonic()
+        expired = [
+            host for host, (_, expires) in self.entries.items() if expires <= now
+        ]
+        for host in expired:
+            del self.entries[host]
+
+        # Still full, drop the oldest half.
+        if len(self.entries) >= self.max_size:
+            for host in list(self.entries.keys())[: len(self.entries) // 2]:
+                del self.entries[host]
+
+    def _cached(self, host: str) -> tuple[IPv4Address | None, float] | None:
+        entry = self.entries.get(host)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry
+        return None
+
+    def resolve(self, host: str) -> IPv4Address:
+        """
+        Resolves the host, using the cache if possible.
+        :param host: Host to resolve.
+        :raises socket.gaierror: If the host doesn't resolve.
+        :return: The host's ip address.
+        """
+        entry = self._cached(host)
+        if entry is not None:
+            self.hits += 1
+            ip = entry[0]
+        else:
+            self.misses += 1
+            ip = self._lookup(host)
+
+        if ip is None:
+            raise socket.gaierror(f"Couldn't resolve {host}")
+        return ip
+
+    def resolve_many(self, hosts: Iterable[str]) -> None:
+        """
+        Resolves all the hosts that aren't cached concurrently so later resolve calls are cache hits.
+        :param hosts: Hosts to resolve.
+        :return: None
+        """
+        missing = {host for host in hosts if self._cached(host) is None}
+        if not missing:
+            return
+
+        if len(missing) == 1:
+            self._lookup(missing.pop())
+            return
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.resolver_threads)
+
+        list(self._executor.map(self._lookup, missing))
+
+    def close(self) -> None:
+        """
+        Stops resolve_many's threads, lookups still running finish in the background.
+        :return: None
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+default_dns_cache = DNSCache()
+
+
+def is_host_private(host: str, dns_cache: DNSCache | None = None) -> bool:
     """
     Checks if a host resolves to a private ip address.
     :param host: Host to check
+    :param dns_cache: DNSCache to resolve the host with, defaults to a shared module level cache.
     :return: True if the host resolves to a private ip address.
     """
-    ip = _resolve_domain_to_ip(host)
+    ip = (dns_cache or default_dns_cache).resolve(host)
     return _is_ip_private(ip)
@@ -1,12 +1,85 @@
-from functools import lru_cache
 from datetime import timedelta
 
+import heapq
+import operator
+import sys
+import typing
+
 from lxml.html import document_fromstring
 
 from requests.utils import CaseInsensitiveDict
 
+try:
+    from .exceptions import InvalidURLException
+    from .extractor import ExtractedPage, extract_page
+    from .parsed_url import ParsedURL, parse_url
+except ImportError:
+    from exceptions import InvalidURLException
+    from extractor import ExtractedPage, extract_page
+    from parsed_url import ParsedURL, parse_url
+
+if typing.TYPE_CHECKING:
+    from .scoring import URLScorer
+
+sys.path.insert(0, "..")
+
+from database.text import html_text  # noqa (Ignore import error)
+
+
+def _resolve_link(link: str, base_url: str, path: str, protocol: str) -> str | None:
+    """
+    Turns a link from a page into an absolute URL.
+    :param link: The href.
+    :param base_url: The base URL of the page, see Page.base_url.
+    :param path: The path of the page, see Page.url_path.
+    :param protocol: The protocol of the page, see Page.protocol.
+    :return: The absolute URL or None if the link can't be crawled.
+    """
+    # See if link is absolute using current protocol
+    if link.startswith("//"):
+        return f"{protocol}:{link}"
+
+    # Check if link is relative to current url.
+    elif link.startswith("/"):
+        return base_url + link
+
+    elif link.startswith("#"):
+        return None
+    elif link.startswith("?"):
+        return base_url + path + link
+    elif ":" not in link:
+        # Relative to the page's directory, dot segments are resolved when the link is canonicalized.
+        return base_url + path[: path.rfind("/") + 1] + link
+
+    elif link.split(":")[0].lower() not in ("http", "https"):
+        return None
+
+    # TODO: add other sanitization
+    return link
+
 
 class Page:
+    """
+    A crawled page. Everything derived from the body is cached on the instance, call release once the page has been
+    stored to drop the body and parsed tree while keeping the metadata.
+    """
+
+    __slots__ = (
+        "status_code",
+        "elapsed",
+        "url",
+        "headers",
+        "content",
+        "link_limit",
+        "link_candidate_limit",
+        "stream_parse",
+        "_parsed_url",
+        "_tree",
+        "_title",
+        "_extracted",
+        "_text",
+    )
+
     def __init__(
         self,
         status_code: int,
@@ -14,7 +87,21 @@ class Page:
         content: bytes,
         url: str,
         response_headers: CaseInsensitiveDict[str],
+        link_limit: int = 100,
+        stream_parse: bool = False,
+        link_candidate_limit: int | None = None,
     ):
+        """
+        :param status_code: The response's status code.
+        :param elapsed: How long the request took.
+        :param content: The response's body.
+        :param url: The page's URL.
+        :param response_headers: The response's headers.
+        :param link_limit: Maximum amount of links get_links returns.
+        :param stream_parse: Extract the links and title with a single streaming pass instead of building the tree.
+        :param link_candidate_limit: Maximum amount of hrefs read from the page, get_scored_links keeps the best
+        link_limit of them. Defaults to link_limit.
+        """
         self.status_code: int = status_code
         self.elapsed = elapsed
         self.url = url
@@ -23,58 +110,74 @@ class Page:
 
         self.content: bytes = content
 
+        self.link_limit = link_limit
+        self.link_candidate_limit = max(link_candidate_limit or 0, link_limit)
+        self.stream_parse = stream_parse
+
+        self._parsed_url: ParsedURL | None = None
+        self._tree = None
+        self._title: str | None = None
+        self._extracted: ExtractedPage | None = None
+        self._text: str | None = None
+
+    @property
+    def parsed_url(self) -> ParsedURL:
+        if self._parsed_url is None:
+            self._parsed_url = parse_url(self.url)
+        return self._parsed_url
+
     @property
-    @lru_cache()
     def base_url(self) -> str:
         """
         Gets the base URL for the page.
         i.e.: https://example.com/something/here -> https://example.com
         :return: The base URL for the page.
         """
-
-        protocol, url = self.url.split("//", 1)
-        return f"{protocol}//{url.split('/', 1)[0]}"
+        return self.parsed_url.base_url
 
     @property
-    @lru_cache()
     def url_path(self) -> str:
         """
         Returns the path for the URL.
         i.e.: https://example.com/something/here -> /something/here
         :return: The URLs path
         """
-
-        return self.url.split(self.base_url)[1].split("?", 1)[0]
+        return self.parsed_url.path
 
     @property
-    @lru_cache()
     def protocol(self) -> str:
         """
         Returns the HTTP protocol for the URL.
         i.e.: https://example.com/something/here -> https
         :return: The HTTP protocol.
         """
-
-        return self.base_url.split(":", 1)[0]
+        return self.parsed_url.scheme
 
     @property
-    @lru_cache()
     def domain(self) -> str:
         """
         Returns the domain for the URL.
         i.e.: https://example.com/something/here -> example.com
         :return: The domain for the URL.
         """
-
-        return self.base_url.split("//")[1]
+        return self.parsed_url.domain
 
     @property
-    @lru_cache()
     def html_title(self) -> str:
         """
         Gets the page's title from the HTML from either a title tag or meta tag in that order.
         :return: The page's title.
         """
+        if self._title is None:
+            self._title = self._find_title()
+        return self._title
+
+    def _find_title(self) -> str:
+        if not self.content:
+            return ""
+
+        if self.stream_parse:
+            return self.extracted.title
 
         tree = self.html_tree
         title_element = tree.find(".//title")
@@ -88,52 +191,121 @@ class Page:
         return ""
 
     @property
-    @lru_cache()
     def html_tree(self) -> document_fromstring:
         """
         Gets the LXML html tree.
         :return: LXML html tree.
         """
+        if self._tree is None:
+            self._tree = document_fromstring(self.content)
+        return self._tree
 
-        return document_fromstring(self.content)
+    def release(self) -> None:
+        """
+        Drops the body and everything parsed from it, the URL, status, headers and title (if it was read) are kept.
+        Call once the page's links have been queued and its row handed to the database.
+        :return: None
+        """
+        self.content = b""
+        self._tree = None
+        self._extracted = None
+        self._text = None
 
-    def get_links(self) -> set[str]:
+    @property
+    def text(self) -> str:
+        """
+        Gets the page's visible text, see html_text.
+        :return: The page's text with whitespace collapsed.
+        """
+        if self._text is None:
+            self._text = html_text(self.content)
+        return self._text
+
+    @property
+    def extracted(self) -> ExtractedPage:
         """
-        Gets all the href links from anchor tags from the HTML of the webpage.
-        :return: A set of strings with the URLs.
+        Gets the links and title from a single streaming pass over the HTML, see extractor.extract_page.
+        :return: The extracted parts of the page.
         """
+        if self._extracted is None:
+            self._extracted = extract_page(
+                self.content, link_limit=self.link_candidate_limit
+            )
+        return self._extracted
+
+    def _get_raw_links(self) -> list[str]:
+        """
+        Gets up to link_candidate_limit hrefs from the page's anchor tags, in document order.
+        :return: A list of unresolved hrefs.
+        """
+        if self.stream_parse:
+            return self.extracted.links
 
         tree = self.html_tree
-        results = set()
 
-        hrefs = set(filter(lambda args: args[1] == "href", tree.iterlinks()))
-        links = set(filter(lambda args: args[0].tag == "a", hrefs))
+        links = [
+            link
+            for element, attribute, link, _ in tree.iterlinks()
+            if attribute == "href" and element.tag == "a"
+        ]
+        return links[: self.link_candidate_limit]
+
+    def get_links(self) -> set[str]:
+        """
+        Gets the first link_limit href links from anchor tags from the HTML of the webpage.
+        :return: A set of canonical URLs, see parsed_url.parse_url.
+        """
+        links = self._resolve_links()
+        return set(list(links)[: self.link_limit])
+
+    def get_scored_links(self, scorer: "URLScorer", depth: int) -> dict[str, float]:
+        """
+        Gets the link_limit best href links out of the page's first link_candidate_limit.
+        :param scorer: Scores the links.
+        :param depth: Depth of the links, one more than the page's.
+        :return: Dict of canonical URL -> score.
+        """
+        links = self._resolve_links()
+        scores = dict(zip(links, scorer.score_links(list(links.values()), depth)))
+
+        if len(scores) > self.link_limit:
+            scores = dict(
+                heapq.nlargest(
+                    self.link_limit, scores.items(), key=operator.itemgetter(1)
+                )
+            )
+        return scores
+
+    def _resolve_links(self) -> dict[str, ParsedURL]:
+        """
+        Resolves the page's hrefs.
+        :return: Dict of canonical URL -> parsed URL, in document order.
+        """
+        results = dict()
 
         base_url = self.base_url
         path = self.url_path
         protocol = self.protocol
 
-        for elem, reference_type, link, position in list(links)[:100]:
-            # See if link is absolute using current protocol
-            if link.startswith("//"):
-                final_link = f"{protocol}:{link}"
-
-            # Check if link is relative to current url.
-            elif link.startswith("/"):
-                final_link = base_url + link
+        # Links are relative to the <base href> if the page has an absolute one.
+        if self.stream_parse:
+            base_href = self.extracted.base_href
+            if base_href and base_href.lower().startswith(("http://", "https://")):
+                try:
+                    parsed_base = parse_url(base_href)
+                    protocol = parsed_base.scheme
+                    base_url = parsed_base.base_url
+                    path = parsed_base.path
+                except InvalidURLException:
+                    pass
 
-            elif link.startswith("#"):
+        for link in self._get_raw_links():
+            final_link = _resolve_link(link.strip(), base_url, path, protocol)
+            if final_link is None:
                 continue
-            elif ":" not in link:
-                # TODO: Verify this is correct.
-                final_link = base_url + path + link
-
-            elif link.split(":")[0] not in ("http", "https"):
+            try:
+                parsed = parse_url(final_link)
+            except InvalidURLException:
                 continue
-            else:
-                final_link = link
-
-            # TODO: add other sanitization
-
-            results.add(final_link)
+            results.setdefault(parsed.url, parsed)
         return results
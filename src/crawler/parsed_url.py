@@ -0,0 +1,259 @@
+import re
+import sys
+import threading
+
+from typing import NamedTuple
+
+try:
+    from .exceptions import InvalidURLException
+except ImportError:
+    from exceptions import InvalidURLException
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only track where a visitor came from, URLs differing only in these are the same page.
+TRACKING_PARAMETERS = frozenset(
+    (
+        "fbclid",
+        "gclid",
+        "dclid",
+        "gbraid",
+        "wbraid",
+        "msclkid",
+        "yclid",
+        "mc_cid",
+        "mc_eid",
+        "_ga",
+        "_gl",
+        "igshid",
+        "ref_src",
+    )
+)
+TRACKING_PARAMETER_PREFIXES = ("utm_",)
+
+_UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+_PERCENT_ESCAPE_PATTERN = re.compile(r"%([0-9A-Fa-f]{2})")
+
+# Characters left as they are in paths and queries, anything else is percent-encoded.
+_PATH_UNSAFE_PATTERN = re.compile(r"[^A-Za-z0-9\-._~!$&'()*+,;=:@/%]")
+_QUERY_UNSAFE_PATTERN = re.compile(r"[^A-Za-z0-9\-._~!$'()*+,;:@/?%]")
+
+# URL -> ParsedURL for both the URLs parse_url was called with and their canonical forms, oldest entries go first.
+PARSE_CACHE_SIZE = 65536
+_parse_cache: dict[str, "ParsedURL"] = dict()
+_parse_cache_lock = threading.Lock()
+
+
+class ParsedURL(NamedTuple):
+    """
+    A URL split into its parts, see parse_url. url is the canonical form of the URL.
+    """
+
+    url: str
+    scheme: str
+    domain: str  # host, or host:port when the port isn't the scheme's default.
+    host: str
+    port: int | None
+    path: str
+    query: str
+
+    @property
+    def protocol(self) -> str:
+        """
+        The scheme in the form get_protocol_and_domain_from_url returns it, i.e.: https:
+        """
+        return self.scheme + ":"
+
+    @property
+    def base_url(self) -> str:
+        """
+        i.e.: https://example.com/something/here -> https://example.com
+        """
+        return f"{self.scheme}://{self.domain}"
+
+
+def _unescape_unreserved(match: re.Match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else "%" + match.group(1).upper()
+
+
+def _quote_unsafe(match: re.Match) -> str:
+    return "".join(f"%{byte:02X}" for byte in match.group(0).encode("UTF-8"))
+
+
+def _normalize_percent_encoding(part: str, unsafe_pattern: re.Pattern) -> str:
+    """
+    Decodes escaped unreserved characters, uppercases the remaining escapes and escapes characters that must be.
+    :param part: A path, query key or query value.
+    :param unsafe_pattern: Matches the characters that have to be escaped in the part.
+    :return: The normalized part.
+    """
+    if "%" in part:
+        part = _PERCENT_ESCAPE_PATTERN.sub(_unescape_unreserved, part)
+    return unsafe_pattern.sub(_quote_unsafe, part)
+
+
+def _remove_dot_segments(path: str) -> str:
+    """
+    Resolves "." and ".." segments, see RFC 3986 section 5.2.4.
+    :param path: An absolute path.
+    :return: The path without dot segments.
+    """
+    if "." not in path:
+        return path
+
+    segments = path.split("/")
+    output = []
+    for segment in segments[1:]:
+        if segment == "..":
+            if output:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+
+    # A path ending in a dot segment refers to a directory.
+    if segments[-1] in (".", ".."):
+        output.append("")
+    return "/" + "/".join(output)
+
+
+def _is_tracking_parameter(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMETERS or key.startswith(TRACKING_PARAMETER_PREFIXES)
+
+
+def _canonicalize_query(query: str) -> str:
+    """
+    Drops tracking parameters and sorts the rest by key, keeping the order of repeated keys.
+    :param query: The query without the "?".
+    :return: The canonical query.
+    """
+    pairs = []
+    for pair in query.split("&"):
+        if not pair:
+            continue
+        key, separator, value = pair.partition("=")
+        if _is_tracking_parameter(key):
+            continue
+        pairs.append(
+            (
+                _normalize_percent_encoding(key, _QUERY_UNSAFE_PATTERN),
+                separator,
+                _normalize_percent_encoding(value, _QUERY_UNSAFE_PATTERN),
+            )
+        )
+
+    pairs.sort(key=lambda pair: pair[0])
+    return "&".join(key + separator + value for key, separator, value in pairs)
+
+
+def _split_authority(authority: str, scheme: str, url: str) -> tuple[str, int | None]:
+    """
+    Gets the lowercased host and the port, None when it's the scheme's default.
+    """
+    # Credentials are never crawled with.
+    authority = authority.rpartition("@")[2]
+
+    port = None
+    if authority.startswith("["):
+        # IPv6 literal, i.e.: [::1]:8080
+        host, _, rest = authority.partition("]")
+        host += "]"
+        port_str = rest[1:] if rest.startswith(":") else ""
+    else:
+        host, _, port_str = authority.partition(":")
+
+    if port_str:
+        if not port_str.isdigit():
+            raise InvalidURLException(f'"{url[:60]}" has an invalid port.')
+        port = int(port_str)
+        if port == DEFAULT_PORTS.get(scheme):
+            port = None
+
+    host = host.rstrip(".").lower()
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            raise InvalidURLException(f'"{url[:60]}" has an invalid host.')
+
+    if not host:
+        raise InvalidURLException(f'"{url[:60]}" has no host.')
+    return host, port
+
+
+def parse_url(url: str) -> ParsedURL:
+    """
+    Parses and canonicalizes a URL. Results are cached under the URL and its canonical form, so the crawler can call
+    this wherever it needs a URL's parts and URLs that already are canonical are only parsed once.
+    :param url: The URL to parse.
+    :return: The parsed URL.
+    :raises InvalidURLException: If the URL isn't absolute or has an invalid host or port.
+    """
+    parsed = _parse_cache.get(url)
+    if parsed is not None:
+        return parsed
+
+    parsed = _parse_url(url)
+    with _parse_cache_lock:
+        while len(_parse_cache) >= PARSE_CACHE_SIZE:
+            del _parse_cache[next(iter(_parse_cache))]
+        _parse_cache[url] = parsed
+        _parse_cache[parsed.url] = parsed
+    return parsed
+
+
+def _parse_url(url: str) -> ParsedURL:
+    """
+    Canonicalization lowercases the scheme and host, drops default ports, credentials and fragments, resolves dot
+    segments, normalizes percent-encoding and drops tracking parameters from the sorted query.
+    i.e.: HTTP://Example.com:80/a/./b/../c?utm_source=x&b=2&a=1#top -> http://example.com/a/c?a=1&b=2
+    """
+    stripped = url.strip()
+    scheme, separator, rest = stripped.partition("://")
+    if not separator or not scheme:
+        raise InvalidURLException(
+            f"\"{url[:60]}{'...' if len(url) > 60 else ''}\" is not a supported url."
+        )
+    scheme = scheme.lower()
+
+    rest = rest.split("#", 1)[0]
+
+    authority_end = len(rest)
+    for delimiter in "/?":
+        index = rest.find(delimiter)
+        if index != -1 and index < authority_end:
+            authority_end = index
+    authority, rest = rest[:authority_end], rest[authority_end:]
+
+    path, _, query = rest.partition("?")
+
+    host, port = _split_authority(authority, scheme, url)
+    domain = sys.intern(host if port is None else f"{host}:{port}")
+
+    path = _remove_dot_segments(
+        _normalize_percent_encoding(path or "/", _PATH_UNSAFE_PATTERN)
+    )
+    query = _canonicalize_query(query) if query else ""
+
+    canonical = f"{scheme}://{domain}{path}" + (f"?{query}" if query else "")
+    return ParsedURL(
+        url=canonical,
+        scheme=scheme,
+        domain=domain,
+        host=host,
+        port=port,
+        path=path,
+        query=query,
+    )
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Gets the canonical form of a URL, see parse_url.
+    :param url: The URL.
+    :return: The canonical URL.
+    """
+    return parse_url(url).url
@@ -0,0 +1,199 @@
+import cProfile
+import datetime
+import io
+import logging
+import os
+import pstats
+import signal
+import time
+
+from typing import Callable, TypeVar
+
+logger = logging.getLogger("Profiler")
+
+T = TypeVar("T")
+
+
+class StepProfiler:
+    """
+    Profiles the crawl loop with cProfile for a window of steps or seconds when asked to at runtime, either by a
+    signal or by creating the control file. The profile is dumped with a timestamp in its name and the hottest
+    functions are logged.
+
+    While idle the only cost is a clock read per step, the control file is only checked once per check_interval.
+    cProfile only sees the thread it was started from, for the async crawler that's the event loop: step_async and
+    the scheduling around it, but not the downloads running on the thread pool.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        control_path: str | None,
+        steps: int = 1000,
+        seconds: float | None = None,
+        top_functions: int = 25,
+        check_interval: float = 1,
+    ):
+        """
+        :param directory: Directory profiles are dumped to.
+        :param control_path: File that starts profiling when created, None to only use signals. It can contain
+        "steps=N" and/or "seconds=N" to override the window, and is deleted once read.
+        :param steps: Default amount of steps to profile for.
+        :param seconds: Default amount of seconds to profile for, when set it takes precedence over steps.
+        :param top_functions: How many functions to log once profiling ends.
+        :param check_interval: Seconds between checks of the control file.
+        """
+        self.directory = directory
+        self.control_path = control_path
+        self.steps = steps
+        self.seconds = seconds
+        self.top_functions = top_functions
+        self.check_interval = check_interval
+
+        self.profile: cProfile.Profile | None = None
+        self.steps_left: int | None = None
+        self.deadline: float | None = None
+
+        # Set from signal handlers, so it's only ever assigned.
+        self._requested: tuple[int | None, float | None] | None = None
+        self._next_check = time.monotonic() + check_interval
+
+    @property
+    def active(self) -> bool:
+        return self.profile is not None
+
+    def request(self, steps: int | None = None, seconds: float | None = None) -> None:
+        """
+        Asks for profiling to start at the next poll, safe to call from a signal handler.
+        :param steps: Steps to profile for, defaults to the profiler's.
+        :param seconds: Seconds to profile for, defaults to the profiler's.
+        :return: None
+        """
+        if steps is None and seconds is None:
+            steps, seconds = self.steps, self.seconds
+        self._requested = (steps, seconds)
+
+    def install_signal_handler(self, signum: int | None = None) -> bool:
+        """
+        Starts profiling whenever the process receives the signal, SIGUSR1 by default.
+        :param signum: The signal.
+        :return: False if the platform has no such signal.
+        """
+        if signum is None:
+            signum = getattr(signal, "SIGUSR1", None)
+            if signum is None:
+                return False
+
+        signal.signal(signum, lambda *_: self.request())
+        return True
+
+    def _read_control_file(self) -> None:
+        try:
+            with open(self.control_path, "r") as f:
+                contents = f.read()
+            os.remove(self.control_path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"[Profiler] Couldn't read {self.control_path}: {e}")
+            return
+
+        steps, seconds = None, None
+        for part in contents.replace(",", " ").split():
+            key, _, value = part.partition("=")
+            try:
+                if key == "steps":
+                    steps = int(value)
+                elif key == "seconds":
+                    seconds = float(value)
+            except ValueError:
+                logger.error(f'[Profiler] Ignoring "{part}" in {self.control_path}')
+        self.request(steps, seconds)
+
+    def poll(self) -> None:
+        """
+        Starts profiling if it was asked for and stops it once the time window is over, call from the thread that
+        runs the steps.
+        :return: None
+        """
+        now = time.monotonic()
+
+        if self.active:
+            if self.deadline is not None and now >= self.deadline:
+                self.stop()
+            return
+
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if self.control_path:
+                self._read_control_file()
+
+        if self._requested is not None:
+            steps, seconds = self._requested
+            self._requested = None
+            self.start(steps, seconds)
+
+    def start(self, steps: int | None, seconds: float | None) -> None:
+        self.steps_left = steps if seconds is None else None
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+
+        window = f"{seconds} seconds" if seconds is not None else f"{steps} steps"
+        logger.info(f"[Profiler] Profiling the next {window}.")
+
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def step_done(self) -> None:
+        """
+        Counts a finished step, stopping once the window's steps are done.
+        :return: None
+        """
+        if self.steps_left is None:
+            return
+
+        self.steps_left -= 1
+        if self.steps_left <= 0:
+            self.stop()
+
+    def run_step(self, step: Callable[[], T]) -> T:
+        """
+        Runs one step of a synchronous crawl loop, profiling it if profiling is active.
+        :param step: The step, e.g. Crawler.step.
+        :return: What the step returned.
+        """
+        self.poll()
+        if not self.active:
+            return step()
+
+        try:
+            return step()
+        finally:
+            self.step_done()
+
+    def stop(self) -> str | None:
+        """
+        Stops profiling, dumps the profile and logs the hottest functions.
+        :return: Path to the dump, None if profiling wasn't active.
+        """
+        if self.profile is None:
+            return None
+
+        profile = self.profile
+        profile.disable()
+        self.profile = None
+        self.steps_left = None
+        self.deadline = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"crawl-{timestamp}-{os.getpid()}.prof")
+        profile.dump_stats(path)
+
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats(
+            pstats.SortKey.CUMULATIVE
+        ).print_stats(self.top_functions)
+        logger.info(
+            f"[Profiler] Wrote {path}, hottest functions:\n{summary.getvalue()}"
+        )
+        return path
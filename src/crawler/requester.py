@@ -3,14 +3,156 @@ try:
 except ImportError:
     from crawleroptions import BaseCrawlerOptions
 
+from urllib.parse import urlsplit
+
+import http.cookiejar
+import threading
+import time
+
 import requests
+import requests.adapters
+import urllib3.exceptions
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _counting_pool_classes(requester: "Requester") -> dict[str, type]:
+    """
+    Builds connection pool classes whose connections count every new TCP connection on the requester.
+    :param requester: The Requester to count connections on.
+    :return: Dict of scheme -> pool class, the format urllib3's PoolManager uses.
+    """
+
+    def counting(connection_cls: type) -> type:
+        class CountingConnection(connection_cls):
+            def connect(self):
+                with requester._lock:
+                    requester.connections_opened += 1
+                super().connect()
+
+        return CountingConnection
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = counting(HTTPConnection)
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = counting(HTTPSConnection)
+
+    return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+
+class _NoCookiesPolicy(http.cookiejar.DefaultCookiePolicy):
+    """
+    Cookie policy that neither stores nor sends cookies.
+    """
+
+    def set_ok(self, cookie, request) -> bool:
+        return False
+
+    def return_ok(self, cookie, request) -> bool:
+        return False
 
 
 class Requester:
+    """
+    Makes the crawler's HTTP requests over one shared requests.Session.
+
+    The session is shared by the async crawler's worker threads. That is safe because it never stores cookies and its
+    headers and adapters aren't changed after __init__, so the only state requests touch is urllib3's PoolManager and
+    connection pools, which are thread safe. The counters and the last use of every host are updated under a lock.
+    """
+
     def __init__(self, crawler_options: BaseCrawlerOptions):
         self.options: BaseCrawlerOptions = crawler_options
         self.base_headers = {"User-Agent": crawler_options.ua}
 
+        # One session holding a keep-alive connection pool per host, shared by every request.
+        self.session = requests.Session()
+
+        # A crawler has no use for cookies, and a jar shared by every host would grow for the whole crawl.
+        self.session.cookies.set_policy(_NoCookiesPolicy())
+
+        self.adapter = requests.adapters.HTTPAdapter(
+            pool_connections=crawler_options.connection_pools,
+            pool_maxsize=crawler_options.connections_per_host,
+        )
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+        self.adapter.poolmanager.pool_classes_by_scheme = _counting_pool_classes(self)
+
+        self.idle_timeout = crawler_options.connection_idle_timeout
+        self.last_used: dict[tuple[str, str, int], float] = dict()
+        self.last_eviction = time.monotonic()
+        self._eviction_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        self.requests_made = 0
+        self.connections_opened = 0
+        self.pools_evicted = 0
+
+    @property
+    def connections_reused(self) -> int:
+        """
+        How many requests went over an already open connection.
+        """
+        return max(0, self.requests_made - self.connections_opened)
+
+    def _mark_used(self, *urls: str) -> None:
+        """
+        Records that the hosts of the URLs were just requested, so evict_idle_pools keeps their pools.
+        :param urls: The requested URLs.
+        :return: None
+        """
+        now = time.monotonic()
+        with self._lock:
+            for url in urls:
+                parts = urlsplit(url)
+                scheme = parts.scheme.lower()
+                host = (parts.hostname or "").lower()
+                try:
+                    port = parts.port or DEFAULT_PORTS.get(scheme, 80)
+                except ValueError:
+                    continue
+                self.last_used[(scheme, host, port)] = now
+
+    def evict_idle_pools(self) -> None:
+        """
+        Closes the connection pools of hosts that haven't been requested for longer than the idle timeout.
+        :return: None
+        """
+        now = time.monotonic()
+        if not self._eviction_lock.acquire(blocking=False):
+            return
+
+        try:
+            self.last_eviction = now
+            with self._lock:
+                idle = {
+                    host_key
+                    for host_key, last_used in self.last_used.items()
+                    if now - last_used > self.idle_timeout
+                }
+                for host_key in idle:
+                    del self.last_used[host_key]
+            if not idle:
+                return
+
+            pools = self.adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                host_key = (pool_key.key_scheme, pool_key.key_host, pool_key.key_port)
+                if host_key in idle:
+                    try:
+                        del pools[pool_key]  # Closes the pool.
+                    except KeyError:
+                        continue
+                    self.pools_evicted += 1
+        finally:
+            self._eviction_lock.release()
+
     def get(
         self,
         url: str,
@@ -22,24 +164,104 @@ class Requester:
         """
         Makes a GET request to the given URL but passes the base headers into the request.
         :param url: URL to make the request to.
-        :param args: args for requests.get(*args)
+        :param args: args for requests.Session.get(*args)
         :param headers: Headers to append to the base headers.
         :param is_robots: Is the request to a robots.txt file.
-        :param kwargs: kwargs for requests.get(*args, **kwargs)
+        :param kwargs: kwargs for requests.Session.get(*args, **kwargs)
         :return: requests.Response object.
         """
+        if time.monotonic() - self.last_eviction > self.idle_timeout:
+            self.evict_idle_pools()
+
+        # Mark the host before the request too, so a slow request's pool isn't evicted while it's in use.
+        self._mark_used(url)
+
         # Build the headers used in the request.
         local_headers = self.base_headers.copy()
         headers = headers or dict()
         local_headers.update(headers)
         if is_robots:
-            request = requests.get(
+            request = self.session.get(
                 url,
-                headers=headers,
+                headers=local_headers,
                 timeout=self.options.robots_timeout,
                 *args,
                 **kwargs
             )
         else:
-            request = requests.get(url, headers=headers, *args, **kwargs)
+            request = self.session.get(url, headers=local_headers, *args, **kwargs)
+
+        # Redirects go through the pools of the hosts they lead to, mark those as well.
+        self._mark_used(
+            url, request.url, *(response.url for response in request.history)
+        )
+        with self._lock:
+            self.requests_made += 1
         return request
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def read_response_body(
+    response: requests.Response,
+    max_bytes: int,
+    initial_chunk_size: int,
+    max_chunk_size: int,
+) -> bytes:
+    """
+    Reads a streamed response's body into a single buffer.
+
+    The buffer is preallocated from Content-Length when the body isn't compressed and grown in place otherwise. The
+    chunk size starts at initial_chunk_size and doubles every read up to max_chunk_size, so small pages stay cheap
+    while large ones take few reads.
+    :param response: Response made with stream=True.
+    :param max_bytes: Maximum amount of bytes to read, the rest of the body is discarded.
+    :param initial_chunk_size: Size of the first read.
+    :param max_chunk_size: Largest read size.
+    :return: The body.
+    """
+    expected = 0
+    content_length = response.headers.get("content-length")
+    if (
+        content_length
+        and content_length.isdigit()
+        and "content-encoding" not in response.headers
+    ):
+        expected = min(int(content_length), max_bytes)
+
+    buffer = bytearray(expected)
+    filled = 0
+    chunk_size = initial_chunk_size
+
+    try:
+        while filled < max_bytes:
+            chunk = response.raw.read(
+                min(chunk_size, max_bytes - filled), decode_content=True
+            )
+            if not chunk:
+                break
+
+            end = filled + len(chunk)
+            if end <= len(buffer):
+                buffer[filled:end] = chunk
+            else:
+                del buffer[filled:]
+                buffer += chunk
+            filled = end
+
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+    # Raise the same exceptions requests.Response.iter_content would.
+    except urllib3.exceptions.ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except urllib3.exceptions.DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except urllib3.exceptions.ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+    except urllib3.exceptions.SSLError as e:
+        raise requests.exceptions.SSLError(e)
+    finally:
+        response.close()
+
+    del buffer[filled:]
+    return bytes(buffer)
@@ -0,0 +1,190 @@
+import datetime
+
+from typing import Iterable, NamedTuple
+
+
+class Revisit(NamedTuple):
+    """
+    What's known about a crawled page that is being revisited, loaded from its RevisitModel row.
+    """
+
+    url: str
+    domain: str
+    interval: float
+    content_hash: str | None
+    etag: str | None
+    last_modified: str | None
+    checks: int
+    changes: int
+    last_changed: datetime.datetime | None
+
+
+class RevisitScheduler:
+    """
+    Decides when crawled pages are crawled again.
+
+    Every stored page gets a revisit interval. Revisits are sent with the page's validators so an unchanged page costs
+    a 304 instead of a full download, and the interval shrinks when the page turns out to have changed and grows when
+    it hasn't, within [min_interval, max_interval]. Pages that change often end up revisited often, pages that never
+    change settle at max_interval.
+
+    The scheduler doesn't touch the database, the crawler loads due revisits with database.revisits.due_revisits and
+    writes the rows built by revisit_row.
+    """
+
+    def __init__(
+        self,
+        initial_interval: float,
+        min_interval: float,
+        max_interval: float,
+        changed_factor: float = 0.5,
+        unchanged_factor: float = 1.5,
+        max_pending: int = 1000,
+    ):
+        """
+        :param initial_interval: Seconds until a newly crawled page is revisited.
+        :param min_interval: Shortest interval in seconds.
+        :param max_interval: Longest interval in seconds.
+        :param changed_factor: What the interval is multiplied by when a revisit finds the page changed.
+        :param unchanged_factor: What the interval is multiplied by when a revisit finds the page unchanged.
+        :param max_pending: Maximum amount of revisits queued in the frontier at once.
+        """
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.changed_factor = changed_factor
+        self.unchanged_factor = unchanged_factor
+        self.max_pending = max_pending
+
+        # URL -> revisits queued in the frontier but not crawled yet.
+        self.pending: dict[str, Revisit] = dict()
+
+        # (next_visit, id) of the last due revisit loaded, None to start from the soonest.
+        self.cursor: tuple[datetime.datetime, int] | None = None
+
+    @property
+    def capacity(self) -> int:
+        """
+        How many more revisits can be queued.
+        """
+        return max(0, self.max_pending - len(self.pending))
+
+    def add_due(self, rows: Iterable, limit: int) -> list[str]:
+        """
+        Takes due revisits loaded from the database.
+        :param rows: RevisitModels ordered by (next_visit, id), see database.revisits.due_revisits.
+        :param limit: The limit they were loaded with, fewer rows means every due revisit has been seen.
+        :return: URLs to queue, those already queued are left out.
+        """
+        rows = list(rows)
+        if len(rows) < limit:
+            # Start over from the soonest next time, revisits that are still due then were never crawled.
+            self.cursor = None
+        else:
+            self.cursor = (rows[-1].next_visit, rows[-1].id)
+
+        urls = []
+        for row in rows:
+            if row.url in self.pending:
+                continue
+
+            self.pending[row.url] = Revisit(
+                url=row.url,
+                domain=row.domain,
+                interval=row.interval,
+                content_hash=row.content_hash,
+                etag=row.etag,
+                last_modified=row.last_modified,
+                checks=row.checks or 0,
+                changes=row.changes or 0,
+                last_changed=row.last_changed,
+            )
+            urls.append(row.url)
+        return urls
+
+    def pop(self, url: str) -> Revisit | None:
+        """
+        Takes a URL's revisit as it's about to be crawled. If the crawl fails the revisit stays due in the database
+        and is loaded again once the cursor wraps around.
+        :param url: The URL.
+        :return: The revisit or None if the URL wasn't a revisit.
+        """
+        return self.pending.pop(url, None)
+
+    @staticmethod
+    def conditional_headers(revisit: Revisit | None) -> dict[str, str]:
+        """
+        Gets the validators to send with a revisit's request.
+        :param revisit: The revisit, see pop.
+        :return: If-None-Match and/or If-Modified-Since, empty if the URL isn't a revisit.
+        """
+        if revisit is None:
+            return dict()
+
+        headers = dict()
+        if revisit.etag:
+            headers["If-None-Match"] = revisit.etag
+        if revisit.last_modified:
+            headers["If-Modified-Since"] = revisit.last_modified
+        return headers
+
+    def next_interval(self, interval: float, changed: bool) -> float:
+        """
+        Adapts a revisit interval to whether the page changed.
+        :param interval: The current interval in seconds.
+        :param changed: Whether the page changed since the last visit.
+        :return: The next interval in seconds.
+        """
+        factor = self.changed_factor if changed else self.unchanged_factor
+        return min(self.max_interval, max(self.min_interval, interval * factor))
+
+    def revisit_row(
+        self,
+        url: str,
+        domain: str,
+        previous: Revisit | None,
+        changed: bool,
+        content_hash: str | None,
+        etag: str | None,
+        last_modified: str | None,
+        now: datetime.datetime,
+    ) -> dict:
+        """
+        Builds the RevisitModel row for a page that was just crawled.
+        :param url: The page's URL.
+        :param domain: The page's normalized domain.
+        :param previous: The page's revisit, None if it was crawled for the first time.
+        :param changed: Whether the page changed since the last visit, ignored for new pages.
+        :param content_hash: sha256 of the body, None for an unchanged page keeps the previous one.
+        :param etag: The response's ETag, None for an unchanged page keeps the previous one.
+        :param last_modified: The response's Last-Modified, None for an unchanged page keeps the previous one.
+        :param now: When the page was crawled, naive UTC like PageModel.crawled_at.
+        :return: Column values for database.revisits.upsert_revisits.
+        """
+        if previous is None:
+            interval = self.initial_interval
+            checks, changes, last_changed = 0, 0, now
+        else:
+            interval = self.next_interval(previous.interval, changed)
+            checks = previous.checks + 1
+            changes = previous.changes + changed
+            last_changed = now if changed else previous.last_changed
+
+            if not changed:
+                # A 304 doesn't have to repeat the validators, and has no body to hash.
+                content_hash = content_hash or previous.content_hash
+                etag = etag or previous.etag
+                last_modified = last_modified or previous.last_modified
+
+        return dict(
+            url=url,
+            domain=domain,
+            interval=interval,
+            next_visit=now + datetime.timedelta(seconds=interval),
+            content_hash=content_hash,
+            etag=etag,
+            last_modified=last_modified,
+            checks=checks,
+            changes=changes,
+            last_changed=last_changed,
+        )
@@ -1,48 +1,145 @@
-import datetime
+import threading
+import time
 import typing
-import sys
 
+from collections import OrderedDict
 from urllib import robotparser
 
-sys.path.insert(0, "..")
-
-if typing.TYPE_CHECKING:
-    # Allow IDE to find correct import.
-    from ..database import db
-
 try:
     from .crawleroptions import BaseCrawlerOptions, DefaultCrawlerOptions
-    from .exceptions import WaitBeforeRetryException
 except ImportError as e:
     from crawleroptions import BaseCrawlerOptions, DefaultCrawlerOptions
-    from exceptions import WaitBeforeRetryException
 
 
-def does_page_follow_robots_rules(
-    crawler_options: BaseCrawlerOptions, url: str, robots: str, domain: "db.DomainModel"
-) -> bool:
+def parse_robots(robots: str) -> robotparser.RobotFileParser:
+    """
+    Parses a robots.txt.
+    :param robots: The robots.txt.
+    :return: The parsed rules.
+    """
     parser = robotparser.RobotFileParser()
     parser.parse(robots.splitlines())
+    return parser
+
+
+class RobotsCache:
+    """
+    LRU cache of parsed robots.txt rules per domain.
+    Entries older than the TTL are re-parsed from the loader, which reads DomainModel.robots.
+    Safe to share between threads, loaders run and rules are parsed outside the lock.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: Maximum amount of domains to keep parsed rules for.
+        :param ttl: Seconds before a domain's rules are re-parsed.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.entries: OrderedDict[str, tuple[robotparser.RobotFileParser, float]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(
+        self, domain: str, loader: typing.Callable[[], str]
+    ) -> robotparser.RobotFileParser:
+        """
+        Gets the parsed rules for the domain.
+        :param domain: The domain to get the rules for.
+        :param loader: Called to get the domain's robots.txt when it isn't cached or has expired.
+        :return: The parsed rules.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(domain)
+
+            if entry is not None:
+                parser, loaded_at = entry
+                if now - loaded_at < self.ttl:
+                    self.hits += 1
+                    self.entries.move_to_end(domain)
+                    return parser
+                self.expirations += 1
+            else:
+                self.misses += 1
+
+        parser = parse_robots(loader() or "")
+
+        with self._lock:
+            self.entries[domain] = (parser, now)
+            self.entries.move_to_end(domain)
+
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+        return parser
+
+    def invalidate(self, domain: str) -> None:
+        with self._lock:
+            self.entries.pop(domain, None)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.expirations
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def does_page_follow_robots_rules(
+    crawler_options: BaseCrawlerOptions,
+    url: str,
+    robots: str | robotparser.RobotFileParser,
+) -> bool:
+    """
+    Checks the URL against the robots.txt rules.
+    Crawl-delay and Request-rate aren't checked here, the URLManager spaces fetches to a domain by
+    get_robots_crawl_delay.
+    :param crawler_options: Options for the crawler.
+    :param url: URL to check.
+    :param robots: The robots.txt, or its already parsed rules.
+    :return: False if the URL is disallowed.
+    """
+    parser = parse_robots(robots) if isinstance(robots, str) else robots
 
     if not parser.can_fetch(useragent=crawler_options.ua, url=url):
         return False
 
+    # TODO: add more checks for things such as if the page is crawled too often.
+    return True
+
+
+def get_robots_crawl_delay(
+    crawler_options: BaseCrawlerOptions, robots: str | robotparser.RobotFileParser
+) -> float:
+    """
+    Gets the minimum amount of seconds between requests to a domain from its robots.txt.
+    :param crawler_options: Options for the crawler.
+    :param robots: The domain's robots.txt, or its already parsed rules.
+    :return: The delay in seconds, 0 if there isn't one.
+    """
+    parser = parse_robots(robots) if isinstance(robots, str) else robots
+
+    delay = 0.0
     try:
         crawl_delay = parser.crawl_delay(crawler_options.ua)
-        request_delay = parser.request_rate(crawler_options.ua)
-
-        now = datetime.datetime.now()
-        if crawl_delay and (now - domain.last_crawled).total_seconds() < int(
-            crawl_delay
-        ):
-            raise WaitBeforeRetryException()
-
-        if request_delay and (now - domain.last_crawled).total_seconds() < int(
-            request_delay.seconds
-        ):
-            raise WaitBeforeRetryException()
+        request_rate = parser.request_rate(crawler_options.ua)
+
+        if crawl_delay:
+            delay = float(crawl_delay)
+
+        if request_rate and request_rate.requests:
+            delay = max(delay, request_rate.seconds / request_rate.requests)
     except ValueError:
         pass
 
-    # TODO: add more checks for things such as if the page is crawled too often.
-    return True
+    return delay
@@ -0,0 +1,146 @@
+import math
+import re
+
+from typing import Callable
+
+try:
+    from .parsed_url import ParsedURL
+except ImportError:
+    from parsed_url import ParsedURL
+
+# Path and query patterns of pages that are rarely worth crawling early, checked against the lowercased URL.
+_PAGINATION_PATTERN = re.compile(
+    r"[/?&;_-](page|p|pg|paged|offset|start)[=/_-]?\d+(?=$|[/?&;#.])"
+)
+_SESSION_OR_FACET_PATTERN = re.compile(
+    r"[?&;](sid|sessionid|phpsessid|jsessionid|sort|order|orderby|filter|view|replytocom|share|print|lang)="
+)
+_UTILITY_PATH_PATTERN = re.compile(
+    r"/(login|logout|signin|signup|register|account|cart|checkout|search|tag|tags|calendar|feed|print|share)"
+    r"(?=$|[/?.])"
+)
+_NON_HTML_EXTENSION_PATTERN = re.compile(
+    r"\.(pdf|jpe?g|png|gif|svg|webp|zip|gz|tar|mp3|mp4|avi|mov|exe|dmg|xml|json|css|js)$"
+)
+
+
+class URLScorer:
+    """
+    Scores URLs for the frontier, higher scores are crawled first.
+
+    A score is a weighted average of a depth score (how many links away from a seed the URL was found), a URL pattern
+    score (pagination, session and facet parameters, deep paths...), a domain score and, when in_link_counts is given,
+    an in-link score. Each part is between 0 and 1 and so is the score. Subclass and override the parts, or score_links
+    to score a whole page's links at once, to plug in other signals.
+    """
+
+    def __init__(
+        self,
+        depth_weight: float = 0.3,
+        pattern_weight: float = 0.4,
+        domain_weight: float = 0.15,
+        in_link_weight: float = 0.15,
+        depth_decay: float = 0.5,
+        domain_scores: dict[str, float] | None = None,
+        default_domain_score: float = 0.5,
+        in_link_counts: Callable[[list[str]], dict[str, int]] | None = None,
+        in_link_saturation: int = 100,
+    ):
+        """
+        :param depth_weight: Weight of the depth score, 1 / (1 + depth_decay * depth).
+        :param pattern_weight: Weight of the URL pattern score, see pattern_score.
+        :param domain_weight: Weight of the domain score.
+        :param in_link_weight: Weight of the in-link score, ignored without in_link_counts.
+        :param depth_decay: How fast the depth score falls off with depth.
+        :param domain_scores: Domain -> score between 0 and 1, i.e. for hand-picked or previously ranked domains.
+        :param default_domain_score: Score of the domains missing from domain_scores.
+        :param in_link_counts: Called with a page's links, returns how many known pages link to each of them, i.e.
+        database.links.InDegreeReader. URLs it leaves out have no known in-links.
+        :param in_link_saturation: In-link count that gets the full in-link score, the score grows logarithmically.
+        """
+        self.depth_weight = depth_weight
+        self.pattern_weight = pattern_weight
+        self.domain_weight = domain_weight
+        self.in_link_weight = in_link_weight if in_link_counts is not None else 0
+        self.depth_decay = depth_decay
+        self.domain_scores = domain_scores or dict()
+        self.default_domain_score = default_domain_score
+        self.in_link_counts = in_link_counts
+        self.in_link_saturation = in_link_saturation
+
+        self._total_weight = (
+            self.depth_weight
+            + self.pattern_weight
+            + self.domain_weight
+            + self.in_link_weight
+        ) or 1
+
+    def depth_score(self, depth: int) -> float:
+        return 1 / (1 + self.depth_decay * depth)
+
+    def pattern_score(self, url: ParsedURL) -> float:
+        """
+        Scores what the URL looks like, 1 for a short path without a query and less for anything that tends to be
+        pagination, a faceted or session variant of another page, a utility page or a deep path.
+        :param url: The URL.
+        :return: Score between 0 and 1.
+        """
+        path = url.path.lower()
+        query = url.query.lower()
+        score = 1.0
+
+        if query:
+            score -= min(0.1 * (query.count("&") + 1), 0.4)
+            if _SESSION_OR_FACET_PATTERN.search("?" + query):
+                score -= 0.3
+
+        if _PAGINATION_PATTERN.search(path + ("?" + query if query else "")):
+            score -= 0.3
+        if _UTILITY_PATH_PATTERN.search(path):
+            score -= 0.3
+        if _NON_HTML_EXTENSION_PATTERN.search(path):
+            score -= 0.5
+
+        segments = path.count("/")
+        if segments > 3:
+            score -= min(0.05 * (segments - 3), 0.3)
+        if len(url.url) > 120:
+            score -= 0.1
+
+        return max(score, 0.0)
+
+    def domain_score(self, domain: str) -> float:
+        return self.domain_scores.get(domain, self.default_domain_score)
+
+    def in_link_score(self, count: int) -> float:
+        return min(math.log1p(count) / math.log1p(self.in_link_saturation), 1.0)
+
+    def score(self, url: ParsedURL, depth: int, in_links: int = 0) -> float:
+        """
+        Scores a URL.
+        :param url: The URL.
+        :param depth: How many links away from a seed it was found.
+        :param in_links: How many known pages link to it.
+        :return: Score between 0 and 1.
+        """
+        score = (
+            self.depth_weight * self.depth_score(depth)
+            + self.pattern_weight * self.pattern_score(url)
+            + self.domain_weight * self.domain_score(url.domain)
+        )
+        if self.in_link_weight:
+            score += self.in_link_weight * self.in_link_score(in_links)
+        return score / self._total_weight
+
+    def score_links(self, urls: list[ParsedURL], depth: int) -> list[float]:
+        """
+        Scores the links found on a page, looking their in-link counts up in one go.
+        :param urls: The links.
+        :param depth: Depth of the links, one more than the page's.
+        :return: The scores, in the same order as urls.
+        """
+        in_links = dict()
+        if self.in_link_counts is not None and urls:
+            in_links = self.in_link_counts([url.url for url in urls])
+
+        return [self.score(url, depth, in_links.get(url.url, 0)) for url in urls]
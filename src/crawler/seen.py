@@ -0,0 +1,183 @@
+import hashlib
+import math
+import os
+import sqlite3
+
+from typing import Iterable
+
+# SQLite's default limit on the amount of parameters in a single statement is 999.
+SQLITE_BATCH_SIZE = 900
+
+
+class BloomFilter:
+    """
+    Fixed size probabilistic set, membership tests can return false positives but never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: Amount of items the filter is sized for.
+        :param error_rate: False positive rate at capacity.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        self.bit_count = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+
+        self.count = 0
+
+    def _positions(self, item: str) -> list[int]:
+        # Double hashing, derive every position from two 64-bit halves of a single digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        for position in self._positions(item):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class SeenURLFilter:
+    """
+    Drop in replacement for the URLManager.enqueued set whose memory use doesn't grow with the crawl.
+
+    URLs are tracked in a BloomFilter. If a store path is given every URL is also written to a SQLite file, which is
+    used to confirm the filter's positives so no URL is ever wrongly skipped.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        store_path: str | None = None,
+        write_batch_size: int = 10000,
+    ):
+        """
+        :param capacity: Amount of URLs the filter is sized for.
+        :param error_rate: False positive rate at capacity.
+        :param store_path: Path to the SQLite file for exact checks, None to only use the filter.
+        :param write_batch_size: How many new URLs to buffer before writing them to the store.
+        """
+        self.filter = BloomFilter(capacity=capacity, error_rate=error_rate)
+
+        self.store: sqlite3.Connection | None = None
+        self.pending: set[str] = set()
+        self.write_batch_size = write_batch_size
+
+        if store_path is not None:
+            store_dir = os.path.dirname(store_path)
+            if store_dir and not os.path.isdir(store_dir):
+                os.makedirs(store_dir)
+
+            self.store = sqlite3.connect(store_path)
+            self.store.execute("PRAGMA journal_mode=WAL")
+            self.store.execute("PRAGMA synchronous=NORMAL")
+            self.store.execute(
+                "CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY) WITHOUT ROWID"
+            )
+            self._load_store()
+
+    def _load_store(self) -> None:
+        """
+        Fills the filter from URLs seen by a previous run.
+        :return: None
+        """
+        for (url,) in self.store.execute("SELECT url FROM seen"):
+            self.filter.add(url)
+
+    def flush(self) -> None:
+        """
+        Writes the buffered URLs to the store.
+        :return: None
+        """
+        if self.store is None or not self.pending:
+            return
+
+        with self.store:
+            self.store.executemany(
+                "INSERT OR IGNORE INTO seen (url) VALUES (?)",
+                ((url,) for url in self.pending),
+            )
+        self.pending.clear()
+
+    def _stored(self, urls: list[str]) -> set[str]:
+        """
+        Checks which of the URLs are in the store.
+        :param urls: URLs to look up.
+        :return: The URLs that are in the store.
+        """
+        found = set()
+        for i in range(0, len(urls), SQLITE_BATCH_SIZE):
+            batch = urls[i : i + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.store.execute(
+                f"SELECT url FROM seen WHERE url IN ({placeholders})", batch
+            )
+            found.update(url for (url,) in rows)
+        return found
+
+    def unseen(self, urls: Iterable[str]) -> set[str]:
+        """
+        Batched membership test, the equivalent of `urls - enqueued` for a set.
+        :param urls: URLs to check.
+        :return: The URLs that haven't been seen.
+        """
+        new_urls = set()
+        maybe_seen = []
+
+        for url in urls:
+            if url not in self.filter:
+                new_urls.add(url)
+            elif self.store is None or url in self.pending:
+                continue
+            else:
+                maybe_seen.append(url)
+
+        if maybe_seen:
+            new_urls.update(set(maybe_seen) - self._stored(maybe_seen))
+
+        return new_urls
+
+    def add(self, url: str) -> None:
+        if url in self.filter:
+            # Could be a false positive, when there is a store make sure it holds the URL.
+            if self.store is None:
+                return
+        else:
+            self.filter.add(url)
+
+        if self.store is not None:
+            self.pending.add(url)
+            if len(self.pending) >= self.write_batch_size:
+                self.flush()
+
+    def update(self, urls: Iterable[str]) -> None:
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url: str) -> bool:
+        return not self.unseen((url,))
+
+    def __len__(self) -> int:
+        return len(self.filter)
+
+    def close(self) -> None:
+        self.flush()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
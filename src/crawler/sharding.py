@@ -0,0 +1,372 @@
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from .crawler import Crawler
+from .crawleroptions import BaseCrawlerOptions, DefaultCrawlerOptions
+from .exceptions import NoUrlException
+from .page import Page
+from .urls import get_protocol_and_domain_from_url
+
+sys.path.insert(0, "..")
+
+from database.shards import (  # noqa (Ignore import error)
+    SHARDS_DIRECTORY,
+    shard_db_path,
+    shard_directory,
+    shard_for_domain,
+    write_shard_count,
+)
+
+logger = logging.getLogger("ShardCrawler")
+
+
+class ShardCoordinator:
+    """
+    State shared by the shards of a crawl so they stop together, once every shard is idle and every batch of links
+    sent to a shard has been received by it.
+
+    A shard is idle while its frontier is empty and its outboxes are flushed. Receiving a batch marks it busy again,
+    under the same lock that counts the batch, so the crawl can't look finished while a batch is being queued.
+    Shards that stopped early are finished, links are no longer sent to them and they count as idle.
+    """
+
+    def __init__(self, context, shard_count: int):
+        """
+        :param context: The multiprocessing context the shards are started with.
+        :param shard_count: Amount of shards.
+        """
+        self.lock = context.Lock()
+        self.idle = context.Array("b", shard_count, lock=False)
+        self.finished = context.Array("b", shard_count, lock=False)
+        self.sent = context.Array("q", shard_count, lock=False)  # Batches per shard
+        self.received = context.Array("q", shard_count, lock=False)
+        self.done = context.Event()
+
+    def send(self, shard: int) -> bool:
+        """
+        Counts a batch about to be sent to a shard.
+        :param shard: The receiving shard.
+        :return: False if the shard has finished, the batch shouldn't be sent.
+        """
+        with self.lock:
+            if self.finished[shard]:
+                return False
+            self.sent[shard] += 1
+            return True
+
+    def receive(self, shard: int) -> None:
+        with self.lock:
+            self.idle[shard] = 0
+            self.received[shard] += 1
+
+    def set_idle(self, shard: int) -> None:
+        with self.lock:
+            self.idle[shard] = 1
+
+    def is_done(self) -> bool:
+        """
+        Checks whether every shard is idle with no links in flight, the crawl is then over.
+        :return: True once the crawl is over.
+        """
+        if self.done.is_set():
+            return True
+
+        with self.lock:
+            done = all(
+                (self.idle[shard] or self.finished[shard])
+                and self.sent[shard] == self.received[shard]
+                for shard in range(len(self.idle))
+            )
+        if done:
+            self.done.set()
+        return done
+
+    def finish(self, shard: int) -> int:
+        """
+        Stops links from being sent to a shard.
+        :param shard: The shard.
+        :return: How many batches were sent to it but not received yet.
+        """
+        with self.lock:
+            self.finished[shard] = 1
+            return self.sent[shard] - self.received[shard]
+
+
+class ShardCrawler(Crawler):
+    """
+    Crawler that owns the domains hashing to its shard, see database.shards.shard_for_domain.
+
+    Every domain is crawled by exactly one process so crawl delays and robots.txt keep working per process. Links to
+    domains owned by other shards are batched per step and sent to their inboxes. Once the frontier is empty the
+    shard waits for links until every shard is idle, see ShardCoordinator.
+    """
+
+    def __init__(
+        self,
+        shard: int,
+        inboxes: list,
+        coordinator: ShardCoordinator,
+        *args,
+        idle_timeout: float | None = None,
+        **kwargs,
+    ):
+        """
+        :param shard: Index of this crawler's shard.
+        :param inboxes: One multiprocessing queue per shard, this crawler reads from inboxes[shard].
+        :param coordinator: State shared with the other shards.
+        :param idle_timeout: Seconds to wait without receiving any links once the frontier is empty before stopping
+        even though other shards are still busy, None to wait for the whole crawl to finish. Links sent to the shard
+        after it stopped are dropped by their senders.
+        """
+        super().__init__(*args, **kwargs)
+
+        self.shard = shard
+        self.inboxes = inboxes
+        self.coordinator = coordinator
+        self.shard_count = len(inboxes)
+        self.idle_timeout = idle_timeout
+
+        self.outboxes: dict[int, dict[str, tuple]] = (
+            dict()
+        )  # Shard -> URL -> (score, depth, referrer)
+        self.links_sent = 0
+        self.links_received = 0
+        self.links_dropped = 0
+
+    def owns(self, url: str) -> bool:
+        _, domain = get_protocol_and_domain_from_url(url)
+        return shard_for_domain(domain, self.shard_count) == self.shard
+
+    def enqueue_links(
+        self, links: dict[str, float | None], depth: int, referrer: str | None = None
+    ) -> None:
+        own_links = dict()
+        for link, score in links.items():
+            _, domain = get_protocol_and_domain_from_url(link)
+            shard = shard_for_domain(domain, self.shard_count)
+            if shard == self.shard:
+                own_links[link] = score
+            else:
+                self.outboxes.setdefault(shard, dict()).setdefault(
+                    link, (score, depth, referrer)
+                )
+
+        super().enqueue_links(own_links, depth, referrer)
+
+    def flush_outboxes(self) -> None:
+        """
+        Sends the links buffered for other shards, one message per shard.
+        :return: None
+        """
+        for shard, links in self.outboxes.items():
+            if not self.coordinator.send(shard):
+                self.links_dropped += len(links)
+                continue
+            self.inboxes[shard].put([(link, *values) for link, values in links.items()])
+            self.links_sent += len(links)
+        self.outboxes.clear()
+
+    def drain_inbox(self, timeout: float | None = 0) -> int:
+        """
+        Queues the links other shards sent to this one.
+        :param timeout: Seconds to wait for the first batch, 0 to only take what's already there.
+        :return: How many links were received.
+        """
+        inbox = self.inboxes[self.shard]
+        batches = []
+        try:
+            batches.append(
+                inbox.get(timeout=timeout) if timeout else inbox.get_nowait()
+            )
+            self.coordinator.receive(self.shard)
+            while True:
+                batches.append(inbox.get_nowait())
+                self.coordinator.receive(self.shard)
+        except queue.Empty:
+            pass
+
+        # (depth, referrer) -> URL -> score, links are queued a page at a time.
+        by_page: dict[tuple[int, str | None], dict[str, float | None]] = dict()
+        for batch in batches:
+            for link, score, depth, referrer in batch:
+                by_page.setdefault((depth, referrer), dict())[link] = score
+
+        received = 0
+        for (depth, referrer), links in by_page.items():
+            received += len(links)
+            # The seen URL set of this shard drops anything it already crawled or queued.
+            self.url_manager.add_many_to_to_crawl_queue(
+                links, depth=depth, scores=links, referrer=referrer
+            )
+        self.links_received += received
+        return received
+
+    def step(self) -> Page | None:
+        self.drain_inbox()
+
+        if len(self.url_manager.to_crawl) == 0:
+            self.flush_outboxes()
+            waited = time.time()
+            # Links received can all have been seen already, keep waiting until one is actually queued.
+            while len(self.url_manager.to_crawl) == 0:
+                self.coordinator.set_idle(self.shard)
+                if self.coordinator.is_done():
+                    raise NoUrlException()
+                if (
+                    self.idle_timeout is not None
+                    and time.time() - waited > self.idle_timeout
+                ):
+                    raise NoUrlException()
+                if self.drain_inbox(timeout=1):
+                    waited = time.time()
+
+        try:
+            return super().step()
+        finally:
+            self.flush_outboxes()
+
+    def close(self) -> None:
+        self.flush_outboxes()
+
+        # Take the batches already sent to this shard off its inbox, so their senders' queues don't block on exit.
+        inbox = self.inboxes[self.shard]
+        pending = self.coordinator.finish(self.shard)
+        for _ in range(pending):
+            try:
+                batch = inbox.get(timeout=5)
+            except queue.Empty:
+                break
+            self.coordinator.receive(self.shard)
+            self.links_dropped += len(batch)
+
+        logger.info(
+            f"[Shard] Shard {self.shard}: sent {self.links_sent} links, received {self.links_received} links, "
+            f"dropped {self.links_dropped} links."
+        )
+        super().close()
+
+
+def shard_options(
+    shard: int, options: BaseCrawlerOptions, directory: str = SHARDS_DIRECTORY
+) -> BaseCrawlerOptions:
+    """
+    Points the options' per crawl files at the shard's directory.
+    :param shard: The shard's index.
+    :param options: Options shared by every shard, modified in place.
+    :param directory: Directory holding every shard.
+    :return: The options.
+    """
+    path = shard_directory(shard, directory)
+    if options.frontier_checkpoint_path:
+        options.frontier_checkpoint_path = os.path.join(path, "frontier.db")
+    if options.seen_url_store_path:
+        options.seen_url_store_path = os.path.join(path, "seen.db")
+    return options
+
+
+def run_shard(
+    shard: int,
+    inboxes: list,
+    coordinator: ShardCoordinator,
+    seeds: list[str],
+    options: BaseCrawlerOptions | None = None,
+    directory: str = SHARDS_DIRECTORY,
+    idle_timeout: float | None = None,
+) -> None:
+    """
+    Entry point of a shard's process, crawls until interrupted or every shard is idle.
+    :param shard: The shard's index.
+    :param inboxes: One multiprocessing queue per shard.
+    :param coordinator: State shared by every shard.
+    :param seeds: Seed URLs of every shard, only the ones this shard owns are used.
+    :param options: Options shared by every shard.
+    :param directory: Directory holding every shard.
+    :param idle_timeout: See ShardCrawler.
+    :return: None
+    """
+    logging.basicConfig(
+        stream=sys.stdout,
+        level=logging.INFO,
+        format=f"[shard-{shard}] %(levelname)s:%(name)s:%(message)s",
+    )
+
+    options = shard_options(shard, options or DefaultCrawlerOptions(), directory)
+    crawler = ShardCrawler(
+        shard,
+        inboxes,
+        coordinator,
+        seed_url=None,
+        crawler_options=options,
+        idle_timeout=idle_timeout,
+    )
+
+    # Seeds are only needed for a fresh crawl, a resumed one picks up its checkpointed frontier.
+    if len(crawler.url_manager.to_crawl) == 0:
+        crawler.url_manager.add_many_to_to_crawl_queue(
+            {seed for seed in seeds if crawler.owns(seed)}
+        )
+
+    crawler.profiler.install_signal_handler()
+    try:
+        while True:
+            crawler.profiler.run_step(crawler.step)
+    except (KeyboardInterrupt, NoUrlException):
+        pass
+    finally:
+        # Flushes the outboxes, the writer's queue and the frontier checkpoint, see Crawler.close.
+        crawler.close()
+
+
+def run_sharded(
+    shard_count: int,
+    seeds: list[str],
+    options: BaseCrawlerOptions | None = None,
+    directory: str = SHARDS_DIRECTORY,
+    idle_timeout: float | None = None,
+) -> None:
+    """
+    Crawls with one process per shard, each writing to its own database under directory.
+    Returns once every shard is idle with no links in flight, i.e. the crawl ran out of URLs.
+    Use database.shards.ShardedDatabase to query the results.
+    :param shard_count: How many processes to crawl with.
+    :param seeds: Seed URLs, split between shards by domain.
+    :param options: Options shared by every shard.
+    :param directory: Directory holding every shard.
+    :param idle_timeout: See ShardCrawler.
+    :return: None
+    """
+    write_shard_count(shard_count, directory)
+
+    # Spawned processes import the database module fresh, so each one connects to the path set for it below.
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(shard_count)]
+    coordinator = ShardCoordinator(context, shard_count)
+
+    processes = []
+    db_path = os.environ.get("OWS_DB_PATH")
+    for shard in range(shard_count):
+        os.environ["OWS_DB_PATH"] = shard_db_path(shard, directory)
+        process = context.Process(
+            target=run_shard,
+            args=(shard, inboxes, coordinator, seeds, options, directory, idle_timeout),
+            name=f"shard-{shard}",
+        )
+        process.start()
+        processes.append(process)
+
+    if db_path is None:
+        os.environ.pop("OWS_DB_PATH")
+    else:
+        os.environ["OWS_DB_PATH"] = db_path
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # The shards got the interrupt as well, wait for them to close.
+        for process in processes:
+            process.join()
@@ -0,0 +1,121 @@
+import hashlib
+import re
+
+from collections import deque
+
+FINGERPRINT_BITS = 64
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little"
+    )
+
+
+def simhash(
+    text: str, shingle_size: int = 3, max_features: int = 2048, min_features: int = 8
+) -> int | None:
+    """
+    Computes a 64-bit SimHash fingerprint of the text, similar texts get fingerprints a small Hamming distance apart.
+    :param text: The text to fingerprint.
+    :param shingle_size: How many words make up each feature.
+    :param max_features: Only the first max_features distinct features are used, bounding the cost on huge pages.
+    :param min_features: Texts with fewer distinct features get no fingerprint, short texts would all look alike.
+    :return: The fingerprint, None if the text is too short.
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = {" ".join(words)} if words else set()
+    else:
+        shingles = set()
+        for i in range(len(words) - shingle_size + 1):
+            shingles.add(" ".join(words[i : i + shingle_size]))
+            if len(shingles) >= max_features:
+                break
+
+    if not shingles or len(shingles) < min_features:
+        return None
+
+    threshold = len(shingles) / 2
+
+    # Write every hash as a row of bits and count the set bits down each column, zip does the transposing in C.
+    rows = [format(_feature_hash(shingle), "064b") for shingle in shingles]
+    bits = ["1" if column.count("1") > threshold else "0" for column in zip(*rows)]
+    return int("".join(bits), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    """
+    Finds stored fingerprints within a Hamming distance of a query.
+
+    Fingerprints are split into threshold + 1 bands, two fingerprints at most threshold bits apart must match exactly
+    on at least one band, so only fingerprints sharing a band are compared. The oldest fingerprints are dropped once
+    max_size is reached.
+    """
+
+    def __init__(self, threshold: int = 3, max_size: int = 1000000):
+        """
+        :param threshold: Maximum Hamming distance for two fingerprints to count as near-duplicates.
+        :param max_size: Maximum amount of fingerprints to keep.
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+
+        self.band_count = threshold + 1
+        self.band_bits = -(-FINGERPRINT_BITS // self.band_count)
+        self.band_mask = (1 << self.band_bits) - 1
+
+        # One dict per band of band value -> [(fingerprint, key)]
+        self.bands: list[dict[int, list[tuple[int, str]]]] = [
+            dict() for _ in range(self.band_count)
+        ]
+        self.order: deque[tuple[int, str]] = deque()
+
+    def _band_values(self, fingerprint: int) -> list[int]:
+        return [
+            (fingerprint >> (band * self.band_bits)) & self.band_mask
+            for band in range(self.band_count)
+        ]
+
+    def find(self, fingerprint: int) -> str | None:
+        """
+        Finds a stored near-duplicate of the fingerprint.
+        :param fingerprint: Fingerprint to look up.
+        :return: The key the near-duplicate was added with, or None.
+        """
+        for band, value in zip(self.bands, self._band_values(fingerprint)):
+            for candidate, key in band.get(value, ()):
+                if hamming_distance(candidate, fingerprint) <= self.threshold:
+                    return key
+        return None
+
+    def add(self, fingerprint: int, key: str) -> None:
+        """
+        Stores a fingerprint.
+        :param fingerprint: The fingerprint.
+        :param key: Returned by find for near-duplicates of this fingerprint, i.e. the page's URL.
+        :return: None
+        """
+        entry = (fingerprint, key)
+        for band, value in zip(self.bands, self._band_values(fingerprint)):
+            band.setdefault(value, []).append(entry)
+        self.order.append(entry)
+
+        if len(self.order) > self.max_size:
+            self._remove(self.order.popleft())
+
+    def _remove(self, entry: tuple[int, str]) -> None:
+        for band, value in zip(self.bands, self._band_values(entry[0])):
+            entries = band[value]
+            entries.remove(entry)
+            if not entries:
+                del band[value]
+
+    def __len__(self) -> int:
+        return len(self.order)
@@ -0,0 +1,210 @@
+import re
+
+from collections import Counter
+from typing import Callable
+
+try:
+    from .parsed_url import ParsedURL
+except ImportError:
+    from parsed_url import ParsedURL
+
+_NUMBER_PATTERN = re.compile(r"\d+")
+
+# Reasons a URL is rejected for, see TrapDetector.check.
+DOMAIN_QUEUE_BUDGET = "domain_queue_budget"
+DOMAIN_CRAWL_BUDGET = "domain_crawl_budget"
+PATH_DEPTH = "path_depth"
+REPEATED_SEGMENTS = "repeated_segments"
+QUERY_PARAMETERS = "query_parameters"
+PATTERN = "pattern"
+
+# Pattern reported for a domain that used up its crawl budget.
+DOMAIN_BUDGET_PATTERN = "*"
+
+
+def url_pattern(url: ParsedURL) -> tuple[str, tuple[int, ...]]:
+    """
+    Splits a URL's path and query into a template and the numbers filling it in, i.e.:
+    /events/2024/05?month=5&view=list -> /events/{n}/{n}?month={n}&view=*, (2024, 5, 5)
+    Query parameters are sorted and non-numeric values dropped, so facet combinations share a template.
+    :param url: The URL.
+    :return: The template and its numbers.
+    """
+    numbers = [int(number) for number in _NUMBER_PATTERN.findall(url.path)]
+    template = _NUMBER_PATTERN.sub("{n}", url.path)
+
+    if url.query:
+        parameters = []
+        for parameter in sorted(url.query.split("&")):
+            name, _, value = parameter.partition("=")
+            if value.isdigit():
+                numbers.append(int(value))
+                parameters.append(f"{name}={{n}}")
+            else:
+                parameters.append(f"{name}=*")
+        template += "?" + "&".join(parameters)
+
+    return template, tuple(numbers)
+
+
+def _steps(numbers: tuple[int, ...], previous: tuple[int, ...], max_step: int) -> bool:
+    # Whether numbers follow previous by a small step either way, in the first number they differ in.
+    for new, old in zip(numbers, previous):
+        if new != old:
+            return abs(new - old) <= max_step
+    return False
+
+
+class TrapDetector:
+    """
+    Keeps crawl traps, i.e. calendars, faceted search or relative links looping into ever deeper paths, from filling
+    the frontier.
+
+    New URLs are rejected when their domain is over its queue or crawl budget, their path is too deep, a path segment
+    repeats too often or they have too many query parameters. URLs are also matched against their domain's URL
+    templates, see url_pattern, and no more URLs matching a template are queued once it trips:
+    - A link to a URL sharing its referring page's template whose numbers moved by a small step (the next month, page
+    or offset) continues the referring page's chain, a template trips once such a chain gets too long. Sites with
+    numeric IDs aren't affected, their pages aren't found one step at a time.
+    - A template with non-numeric query values, i.e. a combination of search facets, trips once it queued too many
+    URLs.
+    """
+
+    def __init__(
+        self,
+        max_queued_per_domain: int | None = 10_000,
+        max_crawled_per_domain: int | None = 50_000,
+        max_path_depth: int = 12,
+        max_repeated_segments: int = 3,
+        max_query_parameters: int = 8,
+        max_urls_per_pattern: int = 5000,
+        max_chain_length: int = 200,
+        max_step: int = 100,
+        max_tracked: int = 100_000,
+        trap_observer: Callable[[str, str], None] | None = None,
+        rejection_observer: Callable[[str], None] | None = None,
+    ):
+        """
+        :param max_queued_per_domain: Maximum amount of URLs queued for a domain at once, None for no limit.
+        :param max_crawled_per_domain: Maximum amount of URLs popped for a domain, None for no limit.
+        :param max_path_depth: Maximum amount of path segments.
+        :param max_repeated_segments: Maximum amount of times a path segment can appear in a path.
+        :param max_query_parameters: Maximum amount of query parameters.
+        :param max_urls_per_pattern: URLs queued for a template with non-numeric query values before it trips.
+        :param max_chain_length: Links in a row, each found on the previous one, that moved a number of the same
+        template by at most max_step before the template trips.
+        :param max_step: Largest change of a number that continues a chain.
+        :param max_tracked: How many faceted templates, and how many chain URLs, are tracked, the oldest are
+        forgotten first. Tripped templates are always kept.
+        :param trap_observer: Called with (domain, template) when a template trips, and with (domain,
+        DOMAIN_BUDGET_PATTERN) when a domain uses up its crawl budget.
+        :param rejection_observer: Called with the reason of every rejected URL.
+        """
+        self.max_queued_per_domain = max_queued_per_domain
+        self.max_crawled_per_domain = max_crawled_per_domain
+        self.max_path_depth = max_path_depth
+        self.max_repeated_segments = max_repeated_segments
+        self.max_query_parameters = max_query_parameters
+        self.max_urls_per_pattern = max_urls_per_pattern
+        self.max_chain_length = max_chain_length
+        self.max_step = max_step
+        self.max_tracked = max_tracked
+        self.trap_observer = trap_observer
+        self.rejection_observer = rejection_observer
+
+        self.patterns: dict[tuple[str, str], int] = dict()  # Faceted template -> URLs
+        self.chains: dict[str, int] = (
+            dict()
+        )  # URL -> length of the chain that led to it
+        self.trapped_patterns: set[tuple[str, str]] = set()
+        self.crawled: Counter[str] = Counter()  # Domain -> URLs popped
+
+    def check(
+        self, url: ParsedURL, queued: int, referrer: ParsedURL | None = None
+    ) -> str | None:
+        """
+        Checks a URL that's about to be queued for the first time, counting it against its template if it passes.
+        :param url: The URL.
+        :param queued: How many URLs are queued for its domain.
+        :param referrer: The page the URL was found on, None for seeds.
+        :return: Why the URL was rejected, see the constants above, None if it can be queued.
+        """
+        reason = self._check(url, queued, referrer)
+        if reason is not None and self.rejection_observer is not None:
+            self.rejection_observer(reason)
+        return reason
+
+    def _check(
+        self, url: ParsedURL, queued: int, referrer: ParsedURL | None
+    ) -> str | None:
+        domain = url.domain
+        if self.is_over_crawl_budget(domain):
+            return DOMAIN_CRAWL_BUDGET
+        if self.max_queued_per_domain is not None and (
+            queued >= self.max_queued_per_domain
+        ):
+            return DOMAIN_QUEUE_BUDGET
+
+        segments = [segment for segment in url.path.split("/") if segment]
+        if len(segments) > self.max_path_depth:
+            return PATH_DEPTH
+        if segments and (
+            Counter(segments).most_common(1)[0][1] > self.max_repeated_segments
+        ):
+            return REPEATED_SEGMENTS
+        if url.query and url.query.count("&") >= self.max_query_parameters:
+            return QUERY_PARAMETERS
+
+        template, numbers = url_pattern(url)
+        key = (domain, template)
+        if key in self.trapped_patterns:
+            return PATTERN
+
+        tripped = False
+        if numbers and referrer is not None and referrer.domain == domain:
+            referrer_template, referrer_numbers = url_pattern(referrer)
+            if referrer_template == template and _steps(
+                numbers, referrer_numbers, self.max_step
+            ):
+                chain = self.chains.get(referrer.url, 0) + 1
+                self._track(self.chains, url.url, chain)
+                tripped = chain >= self.max_chain_length
+
+        if "=*" in template:
+            urls = self.patterns.get(key, 0) + 1
+            self._track(self.patterns, key, urls)
+            tripped = tripped or urls >= self.max_urls_per_pattern
+
+        if tripped:
+            # This URL still gets queued, only the ones after it are dropped.
+            self.patterns.pop(key, None)
+            self.trapped_patterns.add(key)
+            if self.trap_observer is not None:
+                self.trap_observer(domain, template)
+        return None
+
+    def _track(self, tracked: dict, key, value: int) -> None:
+        # Sets a tracked value, forgetting the oldest one when there are too many.
+        if key not in tracked and len(tracked) >= self.max_tracked:
+            del tracked[next(iter(tracked))]
+        tracked[key] = value
+
+    def is_over_crawl_budget(self, domain: str) -> bool:
+        return (
+            self.max_crawled_per_domain is not None
+            and self.crawled[domain] >= self.max_crawled_per_domain
+        )
+
+    def crawled_url(self, domain: str) -> bool:
+        """
+        Counts a URL popped for crawling against its domain's crawl budget.
+        :param domain: The URL's domain.
+        :return: True if the domain just used up its budget, its queued URLs should then be dropped.
+        """
+        self.crawled[domain] += 1
+        if self.crawled[domain] != self.max_crawled_per_domain:
+            return False
+
+        if self.trap_observer is not None:
+            self.trap_observer(domain, DOMAIN_BUDGET_PATTERN)
+        return True
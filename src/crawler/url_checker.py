@@ -3,18 +3,21 @@ import socket
 try:
     from .crawleroptions import BaseCrawlerOptions
     from .urls import get_protocol_and_domain_from_url
-    from .networking import is_host_private
+    from .networking import DNSCache, is_host_private
 except ImportError as e:
     from crawleroptions import BaseCrawlerOptions, DefaultCrawlerOptions
     from urls import get_protocol_and_domain_from_url
-    from networking import is_host_private
+    from networking import DNSCache, is_host_private
 
 
-def check_url_compliance(crawler_options: BaseCrawlerOptions, url: str) -> bool:
+def check_url_compliance(
+    crawler_options: BaseCrawlerOptions, url: str, dns_cache: DNSCache | None = None
+) -> bool:
     """
     Checks if the URL given complies with all rules.
     :param crawler_options: Options for the crawler.
     :param url: URL to check.
+    :param dns_cache: DNSCache to resolve the URL's host with.
     :return: True if the URL complies with rules, otherwise False.
     """
 
@@ -31,9 +34,12 @@ def check_url_compliance(crawler_options: BaseCrawlerOptions, url: str) -> bool:
     if path_ending in crawler_options.ignored_url_endings:
         return False
 
+    if crawler_options.allow_private_hosts:
+        return True
+
     try:
         _, domain = get_protocol_and_domain_from_url(url)
-        if is_host_private(host=domain):
+        if is_host_private(host=domain, dns_cache=dns_cache):
             return False
     except socket.gaierror:
         return False
@@ -4,90 +4,459 @@ try:
         WaitBeforeRetryException,
         InvalidURLException,
     )
+    from .checkpoint import FrontierCheckpoint
+    from .frontier import Frontier, FrontierEntry, score_to_priority
+    from .parsed_url import ParsedURL, canonicalize_url, parse_url
+    from .scoring import URLScorer
+    from .seen import SeenURLFilter
+    from .traps import DOMAIN_QUEUE_BUDGET, TrapDetector
 except ImportError as _:
     from exceptions import NoUrlException, WaitBeforeRetryException, InvalidURLException
+    from checkpoint import FrontierCheckpoint
+    from frontier import Frontier, FrontierEntry, score_to_priority
+    from parsed_url import ParsedURL, canonicalize_url, parse_url
+    from scoring import URLScorer
+    from seen import SeenURLFilter
+    from traps import DOMAIN_QUEUE_BUDGET, TrapDetector
 
-import random
+import heapq
+import itertools
+import time
 
+from typing import Iterable
 
-def get_protocol_and_domain_from_url(url: str):
-    logger_url_str = f"\"{url[:60]}{'...' if len(url) > 60 else ''}\""
-    if "//" not in url:
-        raise InvalidURLException(f"{logger_url_str} is not a supported url.")
 
-    protocol, _url = url.split("//", 1)  # https:, example.com/test
-
-    if "?" in _url and "/" in _url and _url.index("?") < _url.index("/"):
-        domain = _url.split("?", 1)[0]
-    elif "?" in url and "/" not in url:
-        domain = _url.split("?", 1)[0]
-    elif "/" in _url:
-        domain = _url.split("/", 1)[0]
-    else:
-        domain = _url
-    return protocol, domain
+def get_protocol_and_domain_from_url(url: str) -> tuple[str, str]:
+    """
+    Gets the protocol and domain of a URL, i.e.: https://Example.com:8080/a -> https:, example.com:8080
+    :param url: The URL.
+    :return: The protocol and the canonical domain, see parsed_url.parse_url.
+    :raises InvalidURLException: If the URL can't be parsed.
+    """
+    parsed = parse_url(url)
+    return parsed.protocol, parsed.domain
 
 
 class URLManager:
     def __init__(
         self,
-        seed_url: str,
-        crawled: set[str] | None = None,
+        seed_url: str | None,
+        crawled: set[str] | SeenURLFilter | None = None,
         to_crawl: dict[str, list[str]] | None = None,
+        checkpoint: FrontierCheckpoint | None = None,
+        scorer: URLScorer | None = None,
+        traps: TrapDetector | None = None,
     ):
+        """
+        :param seed_url: The URL to seed from, None to start with an empty frontier.
+        :param crawled: URLs to ignore as they've been crawled already, either a set or a SeenURLFilter.
+        :param to_crawl: Dict of domain -> URLs to crawl.
+        :param checkpoint: Where to save frontier changes, when to_crawl isn't given the crawl resumes from it.
+        :param scorer: Scores URLs queued without a score, None to only order the frontier by depth.
+        :param traps: Filters new URLs and enforces per domain budgets, None to queue every URL.
+        """
+        self.checkpoint = checkpoint
+        self.scorer = scorer
+        self.traps = traps
         self.seed_url: str | None = seed_url or None
-        self.enqueued: set[str] = (
-            crawled or set()
+        self.enqueued: set[str] | SeenURLFilter = (
+            crawled if crawled is not None else set()
         )  # For all URLs that have been crawled or are already queued to crawl
-        self.to_crawl: dict[str, list[str]] = dict()
+        self.to_crawl: Frontier = Frontier()
 
         self.url_count = 0
 
-        if to_crawl:
-            self.to_crawl = to_crawl
-        else:
-            _, domain = get_protocol_and_domain_from_url(seed_url)
-            self.to_crawl[domain] = [seed_url]
+        # Revisits that are queued, they're exempt from the trap filters and budgets.
+        self.requeued: set[str] = set()
+
+        # Politeness scheduling, domains with queued URLs are kept in a heap ordered by when they may next be fetched.
+        self.ready_heap: list[tuple[float, int, str]] = []
+        self.scheduled: dict[str, int] = dict()  # Domain -> id of its live heap entry
+        self.next_allowed: dict[str, float] = dict()  # Domain -> unix time
+        self.crawl_delays: dict[str, float] = dict()  # Domain -> seconds
+        self._heap_counter = itertools.count()
+
+        # Domains that may be fetched now are moved to a second heap ordered by their best queued URL, see
+        # Frontier.best_key, so the best URL out of every ready domain is crawled first.
+        self.ready_domains: list[tuple[int, int, str]] = []
+        self.ready: dict[str, tuple[int, int]] = (
+            dict()
+        )  # Domain -> (id, key) of its live entry
+
+        # URLs seen by an earlier run are never queued again, even if that run drained its frontier.
+        if checkpoint is not None:
+            self.enqueued.update(checkpoint.iter_crawled())
+
+        if not to_crawl and checkpoint is not None and not checkpoint.is_empty():
+            # Resume from the checkpoint, its contents don't need to be written back. This includes the URLs that
+            # were popped but not crawled yet.
+            unscored: dict[int, list[tuple[str, str]]] = (
+                dict()
+            )  # Depth -> (domain, URL)
+            for domain, url, priority, depth in checkpoint.iter_frontier():
+                depth = depth or 0
+                if priority is None:
+                    unscored.setdefault(depth, []).append((domain, url))
+                else:
+                    self.to_crawl.push(domain, url, priority, depth)
+
+            # URLs saved before priorities were kept are scored in bulk, so their in-links are looked up in one go.
+            for depth, entries in unscored.items():
+                priorities = self.priorities([url for _, url in entries], depth)
+                for (domain, url), priority in zip(entries, priorities):
+                    self.to_crawl.push(domain, url, priority, depth)
+            for domain in self.to_crawl.keys():
+                self._schedule_domain(domain)
+        elif to_crawl:
+            for domain, urls in to_crawl.items():
+                self.enqueued.update(urls)
+                self._checkpoint_seen(urls)
+                for url in urls:
+                    self.add_to_to_crawl_queue(url, domain)
+        elif seed_url:
+            self.add_many_to_to_crawl_queue({seed_url})
+
+    def _schedule_domain(self, domain: str, ready_at: float | None = None) -> None:
+        """
+        Pushes the domain onto the ready heap, replacing any previous entry for it.
+        :param domain: The domain to schedule.
+        :param ready_at: When the domain may next be fetched, defaults to its next allowed time.
+        :return: None
+        """
+        if ready_at is None:
+            ready_at = self.next_allowed.get(domain, 0)
+
+        self.ready.pop(domain, None)
+        entry_id = next(self._heap_counter)
+        self.scheduled[domain] = entry_id
+        heapq.heappush(self.ready_heap, (ready_at, entry_id, domain))
+
+    def _mark_ready(self, domain: str) -> None:
+        """
+        Pushes a domain that may be fetched now onto the ready domains heap, replacing any previous entry for it.
+        :param domain: A domain with queued URLs.
+        :return: None
+        """
+        key = self.to_crawl.best_key(domain)
+        entry_id = next(self._heap_counter)
+        self.ready[domain] = (entry_id, key)
+        heapq.heappush(self.ready_domains, (-key, entry_id, domain))
+
+    def _pop_ready_domain(self, now: float) -> str:
+        """
+        Pops the domain with the best queued URL out of the ones that may be fetched now.
+        :param now: The current unix time.
+        :return: A domain that may be fetched now.
+        """
+        while self.ready_heap:
+            ready_at, entry_id, domain = self.ready_heap[0]
+
+            # Lazily drop entries that have been replaced or whose domain has been emptied.
+            if self.scheduled.get(domain) != entry_id or domain not in self.to_crawl:
+                heapq.heappop(self.ready_heap)
+                continue
+
+            if ready_at > now:
+                break
+
+            heapq.heappop(self.ready_heap)
+            del self.scheduled[domain]
+            self._mark_ready(domain)
+
+        while self.ready_domains:
+            _, entry_id, domain = heapq.heappop(self.ready_domains)
+
+            live = self.ready.get(domain)
+            if live is None or live[0] != entry_id:
+                continue
+            del self.ready[domain]
+            if domain in self.to_crawl:
+                return domain
+
+        if self.ready_heap:
+            retry_after = self.ready_heap[0][0] - now
+            raise WaitBeforeRetryException(
+                f"No domain can be crawled for {retry_after:.2f}s.",
+                retry_after=retry_after,
+            )
+
+        raise NoUrlException()
+
+    def set_crawl_delay(
+        self, domain: str, delay: float, last_crawled: float | None = None
+    ) -> None:
+        """
+        Sets the minimum delay between requests to a domain.
+        :param domain: The domain to set the delay for.
+        :param delay: Delay in seconds.
+        :param last_crawled: Unix time the domain was last crawled at, if known.
+        :return: None
+        """
+        self.crawl_delays[domain] = delay
+
+        if last_crawled is not None:
+            self.mark_domain_crawled(domain, last_crawled)
+
+    def has_crawl_delay(self, domain: str) -> bool:
+        return domain in self.crawl_delays
+
+    def mark_domain_crawled(self, domain: str, crawled_at: float) -> None:
+        """
+        Pushes back the next time the domain may be fetched after it has been crawled.
+        :param domain: The domain that was crawled.
+        :param crawled_at: Unix time the domain was crawled at.
+        :return: None
+        """
+        next_allowed = crawled_at + self.crawl_delays.get(domain, 0)
+
+        if next_allowed <= self.next_allowed.get(domain, 0):
+            return
+
+        self.next_allowed[domain] = next_allowed
+        if domain in self.scheduled or domain in self.ready:
+            self._schedule_domain(domain)
 
     def get_next_url(self) -> str:
         """
-        Gets the next URL to crawl and updates Crawler.enqueued.
+        Gets the next URL to crawl, see get_next_entry.
         :return: Next URL to crawl.
         """
+        return self.get_next_entry().url
+
+    def get_next_entry(self) -> FrontierEntry:
+        """
+        Gets the next URL to crawl and updates Crawler.enqueued.
+        Only URLs whose domain may be fetched now are returned, the best one out of every such domain. The URL stays in
+        the frontier checkpoint until it's passed to crawled.
+        :raises WaitBeforeRetryException: When every queued domain is waiting on its crawl delay, see retry_after.
+        :return: Next URL to crawl, with its priority and depth.
+        """
         # Check that we haven't crawled everything.
         if len(self.to_crawl) == 0:
             raise NoUrlException()
-        domain_choice = random.choice(list(self.to_crawl.keys()))
-        current_url = random.choice(self.to_crawl[domain_choice])
 
-        self.to_crawl[domain_choice].remove(current_url)
+        now = time.time()
+        domain_choice = self._pop_ready_domain(now)
+        entry = self.to_crawl.pop(domain_choice)
+        current_url = entry.url
+
+        if current_url in self.requeued:
+            self.requeued.discard(current_url)
+        elif self.traps is not None and self.traps.crawled_url(domain_choice):
+            self._drop_domain(domain_choice)
 
-        if len(self.to_crawl[domain_choice]) == 0:
-            del self.to_crawl[domain_choice]
+        # Reserve the domain so no other worker fetches from it before its delay is up.
+        self.mark_domain_crawled(domain_choice, now)
+
+        if domain_choice in self.to_crawl:
+            self._schedule_domain(domain_choice)
 
         if current_url is None:
             raise NoUrlException()
 
         self.enqueued.add(current_url)
+        self._checkpoint_seen((current_url,))
 
-        return current_url
+        return entry
 
-    def add_to_to_crawl_queue(self, url: str, domain: str | None = None):
-        if not url.lower().startswith("http://") and not url.lower().startswith(
-            "https://"
-        ):
+    def _drop_domain(self, domain: str) -> None:
+        """
+        Drops the URLs queued for a domain that used up its crawl budget, except for revisits.
+        :param domain: The domain.
+        :return: None
+        """
+        if domain not in self.to_crawl:
+            return
+
+        for url, priority, depth in self.to_crawl.remove(domain):
+            if url in self.requeued:
+                self.to_crawl.push(domain, url, priority, depth)
+            elif self.checkpoint is not None:
+                self.checkpoint.remove(url)
+
+    def priority(self, url: str | ParsedURL, depth: int) -> int:
+        """
+        Scores a URL with the scorer and turns the score into a frontier priority.
+        :param url: The URL.
+        :param depth: How many links away from a seed it was found.
+        :return: The priority, 0 without a scorer or if the URL can't be parsed.
+        """
+        return self.priorities([url], depth)[0]
+
+    def priorities(self, urls: list[str | ParsedURL], depth: int) -> list[int]:
+        """
+        Scores URLs the same way links found on a page are scored, see URLScorer.score_links, and turns the scores
+        into frontier priorities.
+        :param urls: The URLs.
+        :param depth: How many links away from a seed they were found.
+        :return: The priorities in the same order as urls, 0 without a scorer or for URLs that can't be parsed.
+        """
+        priorities = [0] * len(urls)
+        if self.scorer is None:
+            return priorities
+
+        indices = []
+        parsed_urls = []
+        for i, url in enumerate(urls):
+            try:
+                parsed_urls.append(
+                    url if isinstance(url, ParsedURL) else parse_url(url)
+                )
+            except InvalidURLException:
+                continue
+            indices.append(i)
+
+        for i, score in zip(indices, self.scorer.score_links(parsed_urls, depth)):
+            priorities[i] = score_to_priority(score)
+        return priorities
+
+    def add_to_to_crawl_queue(
+        self,
+        url: str,
+        domain: str | None = None,
+        depth: int = 0,
+        score: float | None = None,
+        check_traps: bool = True,
+        referrer: ParsedURL | None = None,
+    ) -> str | None:
+        """
+        Queues a URL without checking whether it has been seen.
+        :param url: The URL.
+        :param domain: The URL's domain if it's already known.
+        :param depth: How many links away from a seed it was found.
+        :param score: The URL's score, see scoring.URLScorer, None to score it with the scorer.
+        :param check_traps: Drop the URL if the trap detector rejects it.
+        :param referrer: The page the URL was found on, see TrapDetector.check.
+        :return: Why the trap detector rejected the URL, None if it wasn't rejected.
+        """
+        try:
+            parsed = parse_url(url)
+        except InvalidURLException:
+            return
+
+        if parsed.scheme not in ("http", "https"):
             return
 
+        url = parsed.url
         if domain is None:
-            _, domain = get_protocol_and_domain_from_url(url)
+            domain = parsed.domain
+
+        if check_traps and self.traps is not None:
+            reason = self.traps.check(
+                parsed, self.to_crawl.domain_url_count(domain), referrer
+            )
+            if reason is not None:
+                return reason
+
+        if score is None:
+            priority = self.priority(parsed, depth)
+        else:
+            priority = score_to_priority(score)
+
+        if domain not in self.to_crawl:
+            self._schedule_domain(domain)
+        self.to_crawl.push(domain, url, priority, depth)
+
+        # A ready domain whose best URL just got better moves up the ready domains heap.
+        live = self.ready.get(domain)
+        if live is not None and self.to_crawl.best_key(domain) > live[1]:
+            self._mark_ready(domain)
 
-        if domain in self.to_crawl.keys():
-            self.to_crawl[domain].append(url)
+        if self.checkpoint is not None:
+            self.checkpoint.queued(url, domain, priority, depth)
+        return None
+
+    def add_many_to_to_crawl_queue(
+        self,
+        urls: set[str],
+        depth: int = 0,
+        scores: dict[str, float] | None = None,
+        referrer: str | None = None,
+    ):
+        """
+        Queues the URLs that haven't been seen yet.
+        :param urls: The URLs.
+        :param depth: How many links away from a seed they were found.
+        :param scores: URL -> score for URLs that have been scored already, see Page.get_scored_links. The rest are
+        scored with the scorer.
+        :param referrer: The page the URLs were found on, None for seeds.
+        """
+        scores = scores or dict()
+
+        # Compare canonical URLs so the same page under another spelling isn't queued twice.
+        canonical_urls = dict()
+        for url in urls:
+            try:
+                canonical_urls[canonicalize_url(url)] = scores.get(url)
+            except InvalidURLException:
+                continue
+        scores = canonical_urls
+        urls = set(canonical_urls)
+
+        if isinstance(self.enqueued, SeenURLFilter):
+            urls_to_add = self.enqueued.unseen(urls)
         else:
-            self.to_crawl[domain] = [url]
+            urls_to_add = urls - self.enqueued
 
-    def add_many_to_to_crawl_queue(self, urls: set[str]):
-        urls_to_add = urls - self.enqueued
+        parsed_referrer = None
+        if referrer is not None and self.traps is not None:
+            try:
+                parsed_referrer = parse_url(referrer)
+            except InvalidURLException:
+                pass
 
+        # URLs rejected because their domain's queue is full aren't marked as seen, they can be queued once it drains.
+        seen_urls = []
         for url in urls_to_add:
-            self.add_to_to_crawl_queue(url)
+            reason = self.add_to_to_crawl_queue(
+                url, depth=depth, score=scores[url], referrer=parsed_referrer
+            )
+            if reason != DOMAIN_QUEUE_BUDGET:
+                seen_urls.append(url)
+
+        self.enqueued.update(seen_urls)
+        self._checkpoint_seen(seen_urls)
+
+    def requeue_urls(self, urls: list[str]) -> None:
+        """
+        Queues URLs that may have been crawled before, i.e. revisits, and marks them as seen so links to them found
+        while they're queued don't queue them twice.
+        :param urls: Canonical URLs to queue.
+        :return: None
+        """
+        self.enqueued.update(urls)
+        self._checkpoint_seen(urls)
+
+        for url in urls:
+            self.requeued.add(url)
+            self.add_to_to_crawl_queue(url, check_traps=False)
+
+    def crawled(self, urls: Iterable[str]) -> None:
+        """
+        Removes URLs whose pages have been stored from the frontier checkpoint, see get_next_entry.
+        :param urls: URLs returned by get_next_entry.
+        :return: None
+        """
+        if self.checkpoint is None:
+            return
+
+        for url in urls:
+            # Queued again while it was crawled, i.e. as a revisit.
+            if url in self.requeued:
+                continue
+            self.checkpoint.remove(url)
+
+    def _checkpoint_seen(self, urls) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.seen(urls)
+
+    def close(self) -> None:
+        """
+        Flushes any buffered state to disk.
+        :return: None
+        """
+        if isinstance(self.enqueued, SeenURLFilter):
+            self.enqueued.close()
+
+        if self.checkpoint is not None:
+            self.checkpoint.close()
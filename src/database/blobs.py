@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import sys
+import zlib
+
+from sqlalchemy import insert, select, update
+
+try:
+    from . import db
+except ImportError:
+    import db
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("Blobs")
+
+# SQLite's default limit on the amount of parameters in a single statement is 999.
+SQLITE_BATCH_SIZE = 900
+
+
+def compress(codec: str, data: bytes, level: int | None = None) -> bytes:
+    """
+    Compresses a page body.
+    :param codec: "zlib", "zstd" (needs the zstandard package) or "none".
+    :param data: The body.
+    :param level: Compression level, None for the codec's default.
+    :return: The compressed body.
+    """
+    if codec == "zlib":
+        return zlib.compress(data, -1 if level is None else level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package.")
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress(
+            data
+        )
+    if codec == "none":
+        return data
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """
+    Decompresses a page body compressed with compress.
+    :param codec: The codec it was compressed with.
+    :param data: The compressed body.
+    :return: The body.
+    """
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "none":
+        return data
+    raise ValueError(f"Unknown codec {codec}")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def store_blobs(
+    session, bodies: list[bytes], codec: str = "zlib", level: int | None = None
+) -> list[int]:
+    """
+    Stores page bodies in the blobs table, bodies that are already stored are reused.
+    :param session: Session to write with, the caller commits.
+    :param bodies: The bodies to store.
+    :param codec: Codec for new blobs, see compress.
+    :param level: Compression level for new blobs.
+    :return: The blob id of every body, in the same order.
+    """
+    hashes = [content_hash(body) for body in bodies]
+
+    ids: dict[str, int] = dict()
+    unique_hashes = list(set(hashes))
+    for i in range(0, len(unique_hashes), SQLITE_BATCH_SIZE):
+        batch = unique_hashes[i : i + SQLITE_BATCH_SIZE]
+        rows = session.execute(
+            select(db.BlobModel.hash, db.BlobModel.id).where(
+                db.BlobModel.hash.in_(batch)
+            )
+        )
+        ids.update({blob_hash: blob_id for blob_hash, blob_id in rows})
+
+    for blob_hash, body in zip(hashes, bodies):
+        if blob_hash in ids:
+            continue
+
+        result = session.execute(
+            insert(db.BlobModel).values(
+                hash=blob_hash,
+                codec=codec,
+                size=len(body),
+                data=compress(codec, body, level),
+            )
+        )
+        ids[blob_hash] = result.inserted_primary_key[0]
+
+    return [ids[blob_hash] for blob_hash in hashes]
+
+
+def _to_bytes(content: bytes | str) -> bytes:
+    return content.encode("UTF-8") if isinstance(content, str) else content
+
+
+def store_page_rows(
+    session, rows: list[dict], codec: str = "zlib", level: int | None = None
+) -> None:
+    """
+    Inserts page rows, moving each row's "content" into the blobs table.
+    :param session: Session to write with, the caller commits.
+    :param rows: Column values for PageModels, with the body under "content".
+    :param codec: Codec for new blobs, see compress.
+    :param level: Compression level for new blobs.
+    :return: None
+    """
+    if not rows:
+        return
+
+    bodies = [_to_bytes(row.get("content") or b"") for row in rows]
+    blob_ids = store_blobs(session, bodies, codec=codec, level=level)
+
+    page_rows = []
+    for row, blob_id in zip(rows, blob_ids):
+        page_row = {key: value for key, value in row.items() if key != "content"}
+        page_row["blob_id"] = blob_id
+        page_rows.append(page_row)
+
+    session.execute(insert(db.PageModel), page_rows)
+
+
+def compress_pages(
+    codec: str = "zlib", level: int | None = None, batch_size: int = 1000
+) -> int:
+    """
+    One-shot migration moving bodies still stored in pages.content into the blobs table.
+    Every batch is committed on its own so the migration can be stopped and resumed.
+    :param codec: Codec for new blobs, see compress.
+    :param level: Compression level for new blobs.
+    :param batch_size: How many pages to migrate per transaction.
+    :return: The amount of pages migrated.
+    """
+    session = db.Session()
+    migrated = 0
+
+    while True:
+        rows = session.execute(
+            select(db.PageModel.id, db.PageModel.raw_content)
+            .where(db.PageModel.blob_id.is_(None))
+            .where(db.PageModel.raw_content.is_not(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        blob_ids = store_blobs(
+            session, [_to_bytes(content) for _, content in rows], codec, level
+        )
+        session.execute(
+            update(db.PageModel),
+            [
+                {"id": page_id, "blob_id": blob_id, "raw_content": None}
+                for (page_id, _), blob_id in zip(rows, blob_ids)
+            ],
+        )
+        session.commit()
+
+        migrated += len(rows)
+        logger.info(f"[Blobs] Migrated {migrated} pages")
+
+    session.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    # Run from the src directory: python -m database.blobs [codec]
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    total = compress_pages(codec=sys.argv[1] if len(sys.argv) > 1 else "zlib")
+
+    # Give the space freed by the old bodies back to the filesystem.
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
+
+    logger.info(f"[Blobs] Done, migrated {total} pages.")
@@ -1,19 +1,69 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import (
+    create_engine,
+    event,
+    Column,
+    Integer,
+    String,
+    Text,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    LargeBinary,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 
 from datetime import datetime
 
 import os
 
+# Sharded crawls point every worker process at its own database, see shards.py.
+DB_PATH = os.environ.get("OWS_DB_PATH", "./dbs/pages.db")
 
-if not os.path.isdir("./dbs/"):
-    os.mkdir("./dbs/")
+if not os.path.isdir(os.path.dirname(DB_PATH) or "."):
+    os.makedirs(os.path.dirname(DB_PATH))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets the crawler read while the writer commits, and with it synchronous=NORMAL only fsyncs at checkpoints.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")  # 64 MiB
+    cursor.close()
+
+
+def create_db_engine(path: str) -> Engine:
+    """
+    Creates an engine for a pages database.
+    :param path: Path to the SQLite file.
+    :return: The engine.
+    """
+    # The write-behind writer and the crawler use the database from different threads, wait on locks instead of
+    # failing.
+    new_engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+    event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+engine = create_db_engine(DB_PATH)
 
-engine = create_engine("sqlite:///dbs/pages.db")
 
 Base = declarative_base()
 
 
+def normalize_domain(domain: str) -> str:
+    """
+    Normalizes a domain the way it's stored in the domains and pages tables.
+    i.e.: WWW.Example.com. -> www.example.com
+    :param domain: The domain, optionally with a port.
+    :return: The normalized domain.
+    """
+    return domain.strip().lower().rstrip(".")
+
+
 class PageModel(Base):
     __tablename__ = "pages"
 
@@ -23,23 +73,143 @@ class PageModel(Base):
     elapsed = Column(Float)
     crawled_at = Column(DateTime, default=datetime.utcnow)
 
-    url = Column(String)
-    domain = Column(String)
+    url = Column(String, index=True)
+    domain = Column(String)  # Normalized, see normalize_domain.
     title = Column(String)
 
-    content = Column(Text)
+    # The response's validators, sent back when the page is revisited so an unchanged page costs a 304.
+    etag = Column(String)
+    last_modified = Column(String)
+
+    # Pages written before bodies were moved to the blobs table keep their body here, see blobs.compress_pages.
+    raw_content = Column("content", Text)
+
+    blob_id = Column(Integer, ForeignKey("blobs.id"))
+    blob = relationship("BlobModel")
+
+    __table_args__ = (Index("ix_pages_domain_crawled_at", "domain", "crawled_at"),)
+
+    @property
+    def content(self) -> bytes | str | None:
+        """
+        Gets the page's body, decompressing it if it's stored as a blob.
+        :return: The page's body.
+        """
+        if self.blob is not None:
+            return self.blob.content
+        return self.raw_content
+
+
+class BlobModel(Base):
+    """
+    Compressed page body, stored once no matter how many pages share it.
+    """
+
+    __tablename__ = "blobs"
+
+    id = Column(Integer, primary_key=True)
+
+    # sha256 of the uncompressed body.
+    hash = Column(String, unique=True, nullable=False)
+    codec = Column(String, nullable=False)
+    size = Column(Integer)
+
+    data = Column(LargeBinary)
+
+    @property
+    def content(self) -> bytes:
+        # Imported here as blobs imports this module.
+        try:
+            from .blobs import decompress
+        except ImportError:
+            from blobs import decompress
+
+        return decompress(self.codec, self.data)
+
+
+class RevisitModel(Base):
+    """
+    When a crawled page is due to be crawled again, see crawler.revisits.RevisitScheduler.
+    """
+
+    __tablename__ = "revisits"
+
+    id = Column(Integer, primary_key=True)
+
+    url = Column(String, unique=True, nullable=False)
+    domain = Column(String)  # Normalized, see normalize_domain.
+
+    # Seconds between visits, adapted to how often the page changes.
+    interval = Column(Float, nullable=False)
+    next_visit = Column(DateTime, index=True, nullable=False)
+
+    # sha256 of the last body seen and its validators.
+    content_hash = Column(String)
+    etag = Column(String)
+    last_modified = Column(String)
+
+    checks = Column(Integer, default=0)
+    changes = Column(Integer, default=0)
+    last_changed = Column(DateTime)
+
+
+class URLModel(Base):
+    """
+    Integer id of every URL in the link graph, and the scores computed from the graph, see pagerank.py.
+    """
+
+    __tablename__ = "urls"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, unique=True, nullable=False)
+
+    # Share of the graph's PageRank, None until pagerank.py has run over the URL.
+    pagerank = Column(Float)
+    in_degree = Column(Integer)
+
+
+class LinkModel(Base):
+    """
+    A link from a crawled page to a URL, both by URLModel id.
+    """
+
+    __tablename__ = "links"
+
+    source_id = Column(Integer, primary_key=True)
+    target_id = Column(Integer, primary_key=True)
+
+    # Without a rowid the primary key is the table, an edge costs two varints.
+    __table_args__ = {"sqlite_with_rowid": False}
 
 
 class DomainModel(Base):
     __tablename__ = "domains"
 
     id = Column(Integer, primary_key=True)
-    domain = Column(String)
+    domain = Column(
+        String, unique=True, index=True
+    )  # Normalized, see normalize_domain.
     robots = Column(String)
 
-    last_crawled = Column(DateTime)
+    last_crawled = Column(DateTime, index=True)
+
+
+try:
+    from .migrations import upgrade_schema
+except ImportError:
+    from migrations import upgrade_schema
+
+
+def create_schema(db_engine: Engine) -> None:
+    """
+    Creates the tables of a new database and upgrades the schema of an existing one.
+    :param db_engine: Engine for the database.
+    :return: None
+    """
+    Base.metadata.create_all(db_engine)
+    upgrade_schema(db_engine)
 
 
-Base.metadata.create_all(engine)
+create_schema(engine)
 
 Session = sessionmaker(bind=engine)
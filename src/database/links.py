@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+
+from typing import Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+try:
+    from . import db
+    from .blobs import SQLITE_BATCH_SIZE
+except ImportError:
+    import db
+    from blobs import SQLITE_BATCH_SIZE
+
+
+def _select_url_ids(session, urls: list[str]) -> dict[str, int]:
+    ids = dict()
+    for i in range(0, len(urls), SQLITE_BATCH_SIZE):
+        batch = urls[i : i + SQLITE_BATCH_SIZE]
+        rows = session.execute(
+            select(db.URLModel.url, db.URLModel.id).where(db.URLModel.url.in_(batch))
+        )
+        ids.update({url: url_id for url, url_id in rows})
+    return ids
+
+
+def url_ids(session, urls: Iterable[str]) -> dict[str, int]:
+    """
+    Gets the link graph ids of URLs, giving the URLs that don't have one yet a new id.
+    :param session: Session to write with, the caller commits.
+    :param urls: The URLs.
+    :return: URL -> id.
+    """
+    urls = list(set(urls))
+    ids = _select_url_ids(session, urls)
+
+    missing = [url for url in urls if url not in ids]
+    if missing:
+        session.execute(
+            sqlite_insert(db.URLModel).on_conflict_do_nothing(),
+            [{"url": url} for url in missing],
+        )
+        ids.update(_select_url_ids(session, missing))
+    return ids
+
+
+def store_links(session, links: dict[str, Iterable[str]]) -> int:
+    """
+    Stores the links found on crawled pages, replacing the links previously stored for those pages.
+    :param session: Session to write with, the caller commits.
+    :param links: Page URL -> URLs it links to.
+    :return: The amount of edges stored.
+    """
+    if not links:
+        return 0
+
+    links = {source: set(targets) for source, targets in links.items()}
+    ids = url_ids(session, set(links).union(*links.values()))
+
+    source_ids = [ids[source] for source in links]
+    for i in range(0, len(source_ids), SQLITE_BATCH_SIZE):
+        session.execute(
+            delete(db.LinkModel).where(
+                db.LinkModel.source_id.in_(source_ids[i : i + SQLITE_BATCH_SIZE])
+            )
+        )
+
+    edges = [
+        {"source_id": ids[source], "target_id": ids[target]}
+        for source, targets in links.items()
+        for target in targets
+        if target != source
+    ]
+    if edges:
+        session.execute(sqlite_insert(db.LinkModel).on_conflict_do_nothing(), edges)
+    return len(edges)
+
+
+class InDegreeReader:
+    """
+    Looks up how many pages link to URLs, as last computed by database.pagerank, for crawler.scoring.URLScorer.
+
+    It has its own connection so pages' links can be scored from worker threads while the crawler's session is busy.
+    """
+
+    def __init__(self, path: str = db.DB_PATH):
+        """
+        :param path: Path to the pages database.
+        """
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def __call__(self, urls: list[str]) -> dict[str, int]:
+        """
+        :param urls: The URLs.
+        :return: URL -> in-degree, for the URLs that have one.
+        """
+        counts = dict()
+        with self.lock:
+            for i in range(0, len(urls), SQLITE_BATCH_SIZE):
+                batch = urls[i : i + SQLITE_BATCH_SIZE]
+                rows = self.connection.execute(
+                    "SELECT url, in_degree FROM urls WHERE in_degree > 0 AND url IN "
+                    f"({', '.join('?' * len(batch))})",
+                    batch,
+                )
+                counts.update(rows)
+        return counts
+
+    def close(self) -> None:
+        self.connection.close()
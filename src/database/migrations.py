@@ -0,0 +1,85 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("Migrations")
+
+
+def _add_page_blob_id(connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("pages")}
+    if "blob_id" not in columns:
+        connection.execute(
+            text("ALTER TABLE pages ADD COLUMN blob_id INTEGER REFERENCES blobs(id)")
+        )
+
+
+def _normalize_and_index_domains(connection) -> None:
+    # Lowercase the stored domains, merging domains that only differed in case into the oldest row.
+    connection.execute(
+        text(
+            "UPDATE domains SET last_crawled = ("
+            "SELECT MAX(other.last_crawled) FROM domains AS other "
+            "WHERE RTRIM(LOWER(TRIM(other.domain)), '.') = RTRIM(LOWER(TRIM(domains.domain)), '.'))"
+        )
+    )
+    connection.execute(
+        text(
+            "DELETE FROM domains WHERE id NOT IN ("
+            "SELECT MIN(id) FROM domains GROUP BY RTRIM(LOWER(TRIM(domain)), '.'))"
+        )
+    )
+    connection.execute(
+        text("UPDATE domains SET domain = RTRIM(LOWER(TRIM(domain)), '.')")
+    )
+    connection.execute(
+        text("UPDATE pages SET domain = RTRIM(LOWER(TRIM(domain)), '.')")
+    )
+
+    # Same names as the indexes create_all makes for the models.
+    connection.execute(
+        text("CREATE UNIQUE INDEX IF NOT EXISTS ix_domains_domain ON domains (domain)")
+    )
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_domains_last_crawled ON domains (last_crawled)"
+        )
+    )
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_pages_url ON pages (url)"))
+    connection.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_pages_domain_crawled_at ON pages (domain, crawled_at)"
+        )
+    )
+    connection.execute(text("ANALYZE"))
+
+
+def _add_page_validators(connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("pages")}
+    for column in ("etag", "last_modified"):
+        if column not in columns:
+            connection.execute(text(f"ALTER TABLE pages ADD COLUMN {column} VARCHAR"))
+
+
+# Schema upgrades in order, the database's user_version is the amount that have been applied.
+# Every upgrade has to be safe to run on a database create_all just made, which already has the new schema.
+MIGRATIONS = [
+    _add_page_blob_id,
+    _normalize_and_index_domains,
+    _add_page_validators,
+]
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Applies the schema upgrades the database hasn't had yet.
+    :param engine: Engine for the database.
+    :return: None
+    """
+    with engine.begin() as connection:
+        version = connection.execute(text("PRAGMA user_version")).scalar()
+
+        for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"[DB] Upgrading schema to version {i} ({migration.__name__})")
+            migration(connection)
+            connection.execute(text(f"PRAGMA user_version={i}"))
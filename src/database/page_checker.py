@@ -12,13 +12,25 @@ from crawler.page import Page
 from crawler.crawleroptions import BaseCrawlerOptions
 
 
-def page_follows_db_rules(crawler_options: BaseCrawlerOptions, page: Page):
+def headers_follow_db_rules(crawler_options: BaseCrawlerOptions, headers) -> bool:
+    """
+    Checks the response headers against the database rules, usable before the body has been downloaded.
+    :param crawler_options: Options for the crawler.
+    :param headers: The response headers.
+    :return: True if a page with these headers could be stored.
+    """
     # Check content-type
     # TODO: Improve content-type check as this will disregard many good pages.
-    headers = page.headers
-
     if crawler_options.check_content_type:
         content_type = headers.get("content-type")
         if content_type and "text/html" not in content_type:
             return False
-        return True
+    return True
+
+
+def page_follows_db_rules(crawler_options: BaseCrawlerOptions, page: Page):
+    # Pages whose body was never downloaded, i.e. error responses, have nothing worth storing.
+    if not page.content:
+        return False
+
+    return headers_follow_db_rules(crawler_options, page.headers)
@@ -0,0 +1,342 @@
+"""
+Computes PageRank and in-degree over the link graph and writes them to the urls table, and as a ranking boost to the
+search index.
+
+Run from the src directory: python -m database.pagerank [--damping 0.85] [--iterations 50]
+"""
+
+import argparse
+import array
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from typing import Iterator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from . import db
+    from .search import SearchIndex
+except ImportError:
+    import db
+    from search import SearchIndex
+
+logger = logging.getLogger("PageRank")
+
+
+class LinkGraph:
+    """
+    The link graph as parallel arrays of source and target ids, read from the links table in one snapshot.
+
+    With numpy the arrays are memory-mapped files in a temporary directory, so tens of millions of edges don't have to
+    fit in memory, and every pass over them goes chunk by chunk. Without numpy they're in memory arrays.
+    """
+
+    def __init__(self, connection, chunk_size: int = 250_000):
+        """
+        :param connection: Connection to the pages database in autocommit mode.
+        :param chunk_size: How many edges are read and processed at once.
+        """
+        self.chunk_size = chunk_size
+        self.directory: str | None = None
+
+        cursor = connection.cursor()
+        # Read the counts and the edges from the same snapshot while the crawler keeps writing.
+        cursor.execute("BEGIN")
+        try:
+            (self.edge_count,) = cursor.execute("SELECT COUNT(*) FROM links").fetchone()
+            (max_id,) = cursor.execute("SELECT MAX(id) FROM urls").fetchone()
+            self.node_count = (max_id or 0) + 1
+
+            # Ids are indices into the score arrays, ids that were never assigned get no score.
+            cursor.execute("SELECT id FROM urls")
+            if numpy is not None:
+                self.nodes = numpy.zeros(self.node_count, dtype=bool)
+                for rows in iter(lambda: cursor.fetchmany(self.chunk_size), []):
+                    self.nodes[
+                        numpy.fromiter((row[0] for row in rows), numpy.int64)
+                    ] = True
+            else:
+                self.nodes = bytearray(self.node_count)
+                for (url_id,) in cursor:
+                    self.nodes[url_id] = 1
+
+            cursor.execute("SELECT source_id, target_id FROM links")
+            if numpy is not None:
+                self._read_mapped(cursor)
+            else:
+                self.sources = array.array("l")
+                self.targets = array.array("l")
+                for source_id, target_id in cursor:
+                    self.sources.append(source_id)
+                    self.targets.append(target_id)
+        finally:
+            cursor.execute("COMMIT")
+            cursor.close()
+
+    def _read_mapped(self, cursor) -> None:
+        self.directory = tempfile.mkdtemp(prefix="ows-link-graph-")
+        shape = (max(self.edge_count, 1),)
+        self.sources = numpy.memmap(
+            os.path.join(self.directory, "sources"), numpy.int32, "w+", shape=shape
+        )
+        self.targets = numpy.memmap(
+            os.path.join(self.directory, "targets"), numpy.int32, "w+", shape=shape
+        )
+
+        filled = 0
+        for rows in iter(lambda: cursor.fetchmany(self.chunk_size), []):
+            edges = numpy.array(rows, dtype=numpy.int32)
+            self.sources[filled : filled + len(edges)] = edges[:, 0]
+            self.targets[filled : filled + len(edges)] = edges[:, 1]
+            filled += len(edges)
+
+    def chunks(self) -> Iterator[tuple]:
+        """
+        Iterates over the edges a chunk of sources and targets at a time.
+        """
+        for start in range(0, self.edge_count, self.chunk_size):
+            end = min(start + self.chunk_size, self.edge_count)
+            yield self.sources[start:end], self.targets[start:end]
+
+    def close(self) -> None:
+        """
+        Deletes the memory-mapped files.
+        :return: None
+        """
+        self.sources = self.targets = None
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+
+def _pagerank_numpy(
+    graph: LinkGraph, damping: float, iterations: int, tolerance: float
+) -> tuple:
+    n = graph.node_count
+    out_degree = numpy.zeros(n)
+    in_degree = numpy.zeros(n)
+    for sources, targets in graph.chunks():
+        out_degree += numpy.bincount(sources, minlength=n)
+        in_degree += numpy.bincount(targets, minlength=n)
+
+    teleport = graph.nodes / max(graph.nodes.sum(), 1)
+    dangling = graph.nodes & (out_degree == 0)
+    has_links = out_degree > 0
+
+    rank = teleport.copy()
+    for iteration in range(iterations):
+        share = numpy.zeros(n)
+        numpy.divide(rank, out_degree, out=share, where=has_links)
+
+        received = numpy.zeros(n)
+        for sources, targets in graph.chunks():
+            received += numpy.bincount(targets, weights=share[sources], minlength=n)
+
+        # Pages without links spread their rank over every page, like the random jumps do.
+        new_rank = (
+            damping * (received + rank[dangling].sum() * teleport)
+            + (1 - damping) * teleport
+        )
+        delta = numpy.abs(new_rank - rank).sum()
+        rank = new_rank
+
+        logger.info(f"[PageRank] Iteration {iteration + 1}: delta {delta:.3g}")
+        if delta < tolerance:
+            break
+
+    return rank, in_degree.astype(numpy.int64)
+
+
+def _pagerank_python(
+    graph: LinkGraph, damping: float, iterations: int, tolerance: float
+) -> tuple:
+    n = graph.node_count
+    out_degree = [0] * n
+    in_degree = [0] * n
+    for source_id, target_id in zip(graph.sources, graph.targets):
+        out_degree[source_id] += 1
+        in_degree[target_id] += 1
+
+    node_ids = [node_id for node_id in range(n) if graph.nodes[node_id]]
+    dangling = [node_id for node_id in node_ids if not out_degree[node_id]]
+    jump = 1 / max(len(node_ids), 1)
+
+    rank = [jump if graph.nodes[node_id] else 0.0 for node_id in range(n)]
+    for iteration in range(iterations):
+        share = [
+            rank[node_id] / out_degree[node_id] if out_degree[node_id] else 0.0
+            for node_id in range(n)
+        ]
+        received = [0.0] * n
+        for source_id, target_id in zip(graph.sources, graph.targets):
+            received[target_id] += share[source_id]
+
+        base = (
+            damping * sum(rank[node_id] for node_id in dangling) + (1 - damping)
+        ) * jump
+        new_rank = [0.0] * n
+        for node_id in node_ids:
+            new_rank[node_id] = damping * received[node_id] + base
+
+        delta = sum(abs(new - old) for new, old in zip(new_rank, rank))
+        rank = new_rank
+
+        logger.info(f"[PageRank] Iteration {iteration + 1}: delta {delta:.3g}")
+        if delta < tolerance:
+            break
+
+    return rank, in_degree
+
+
+def pagerank(
+    graph: LinkGraph,
+    damping: float = 0.85,
+    iterations: int = 50,
+    tolerance: float = 1e-6,
+) -> tuple:
+    """
+    Computes PageRank by power iteration, vectorized over chunks of edges when numpy is installed.
+    :param graph: The link graph.
+    :param damping: Probability of following a link rather than jumping to a random page.
+    :param iterations: Maximum amount of iterations.
+    :param tolerance: Stop once the scores change by less than this in total (L1).
+    :return: (PageRank, in-degree), both indexed by URL id. The PageRank of every URL sums to 1.
+    """
+    if numpy is not None:
+        return _pagerank_numpy(graph, damping, iterations, tolerance)
+
+    logger.warning(
+        "[PageRank] numpy isn't installed, falling back to pure Python which is only fit for small graphs."
+    )
+    return _pagerank_python(graph, damping, iterations, tolerance)
+
+
+def write_scores(
+    connection, graph: LinkGraph, rank, in_degree, batch_size: int = 100_000
+) -> None:
+    """
+    Writes the scores to the urls table, a batch per transaction so the crawler's writer isn't locked out for long.
+    :param connection: Connection to the pages database in autocommit mode.
+    :param graph: The graph the scores were computed over.
+    :param rank: PageRank by URL id.
+    :param in_degree: In-degree by URL id.
+    :param batch_size: How many URLs are updated per transaction.
+    :return: None
+    """
+    node_ids = (node_id for node_id in range(graph.node_count) if graph.nodes[node_id])
+    while True:
+        batch = [
+            (float(rank[node_id]), int(in_degree[node_id]), node_id)
+            for node_id in _take(node_ids, batch_size)
+        ]
+        if not batch:
+            return
+
+        connection.execute("BEGIN")
+        connection.executemany(
+            "UPDATE urls SET pagerank = ?, in_degree = ? WHERE id = ?", batch
+        )
+        connection.execute("COMMIT")
+
+
+def _take(iterator: Iterator, count: int) -> Iterator:
+    for _, item in zip(range(count), iterator):
+        yield item
+
+
+def write_search_boosts(
+    connection, search_index_path: str, batch_size: int = 100_000
+) -> None:
+    """
+    Copies the PageRank of every indexed page into the search index as a ranking boost, see SearchIndex.set_boosts.
+    :param connection: Connection to the pages database, with the scores written.
+    :param search_index_path: Path to the search index.
+    :param batch_size: How many URLs are updated per transaction.
+    :return: None
+    """
+    (node_count,) = connection.execute(
+        "SELECT COUNT(*) FROM urls WHERE pagerank IS NOT NULL"
+    ).fetchone()
+
+    index = SearchIndex(search_index_path)
+    cursor = connection.execute(
+        "SELECT url, pagerank FROM urls WHERE pagerank IS NOT NULL"
+    )
+    for rows in iter(lambda: cursor.fetchmany(batch_size), []):
+        # An average page gets log(2), the boost grows slowly with the page's share of the rank.
+        index.set_boosts((url, math.log1p(score * node_count)) for url, score in rows)
+    index.close()
+
+
+def run(
+    damping: float = 0.85,
+    iterations: int = 50,
+    tolerance: float = 1e-6,
+    chunk_size: int = 250_000,
+    search_index_path: str | None = None,
+) -> None:
+    """
+    Computes the scores of the pages database's link graph and writes them back.
+    :param damping: See pagerank.
+    :param iterations: See pagerank.
+    :param tolerance: See pagerank.
+    :param chunk_size: See LinkGraph.
+    :param search_index_path: Search index to write ranking boosts to, None to skip it.
+    :return: None
+    """
+    # Autocommit, transactions are managed explicitly, see LinkGraph and write_scores.
+    connection = sqlite3.connect(db.DB_PATH, isolation_level=None)
+
+    start = time.perf_counter()
+    graph = LinkGraph(connection, chunk_size=chunk_size)
+    logger.info(
+        f"[PageRank] Loaded {graph.edge_count} links between {graph.node_count - 1} URLs "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+    try:
+        start = time.perf_counter()
+        rank, in_degree = pagerank(graph, damping, iterations, tolerance)
+        logger.info(f"[PageRank] Computed in {time.perf_counter() - start:.1f}s")
+        write_scores(connection, graph, rank, in_degree)
+    finally:
+        graph.close()
+
+    if search_index_path and os.path.isfile(search_index_path):
+        write_search_boosts(connection, search_index_path)
+    connection.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--damping", type=float, default=0.85)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=1e-6)
+    parser.add_argument("--chunk-size", type=int, default=250_000)
+    parser.add_argument(
+        "--search-index",
+        default=os.path.join(os.path.dirname(db.DB_PATH) or ".", "search.db"),
+        help="Search index to write ranking boosts to.",
+    )
+    parser.add_argument("--no-search", action="store_true")
+    args = parser.parse_args()
+
+    run(
+        damping=args.damping,
+        iterations=args.iterations,
+        tolerance=args.tolerance,
+        chunk_size=args.chunk_size,
+        search_index_path=None if args.no_search else args.search_index,
+    )
@@ -0,0 +1,93 @@
+import datetime
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+try:
+    from . import db
+except ImportError:
+    import db
+
+# Columns a revisit upsert overwrites, everything but the url it's keyed on.
+REVISIT_COLUMNS = (
+    "domain",
+    "interval",
+    "next_visit",
+    "content_hash",
+    "etag",
+    "last_modified",
+    "checks",
+    "changes",
+    "last_changed",
+)
+
+
+def upsert_revisits(session, rows: list[dict]) -> None:
+    """
+    Inserts revisit rows, replacing the rows of URLs that are already scheduled.
+    :param session: Session to write with, the caller commits.
+    :param rows: Column values for RevisitModels, every row needs all of REVISIT_COLUMNS and the url.
+    :return: None
+    """
+    if not rows:
+        return
+
+    statement = sqlite_insert(db.RevisitModel)
+    statement = statement.on_conflict_do_update(
+        index_elements=[db.RevisitModel.url],
+        set_={column: statement.excluded[column] for column in REVISIT_COLUMNS},
+    )
+    session.execute(statement, rows)
+
+
+def touch_pages(session, crawled_at: dict[str, datetime.datetime]) -> None:
+    """
+    Bumps crawled_at of the latest row of pages that were revisited and found unchanged.
+    :param session: Session to write with, the caller commits.
+    :param crawled_at: URL -> when it was revisited.
+    :return: None
+    """
+    for url, timestamp in crawled_at.items():
+        latest = (
+            select(db.PageModel.id)
+            .where(db.PageModel.url == url)
+            .order_by(db.PageModel.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        session.execute(
+            update(db.PageModel)
+            .where(db.PageModel.id == latest)
+            .values(crawled_at=timestamp)
+        )
+
+
+def due_revisits(
+    session,
+    now: datetime.datetime,
+    after: tuple[datetime.datetime, int] | None = None,
+    limit: int = 1000,
+) -> list[db.RevisitModel]:
+    """
+    Gets revisits that are due, soonest first.
+    :param session: Session to read with.
+    :param now: Revisits with a next_visit up to this time are due.
+    :param after: (next_visit, id) of the last revisit of the previous batch, to page through the due revisits.
+    :param limit: Maximum amount of revisits to return.
+    :return: The due revisits.
+    """
+    query = select(db.RevisitModel).where(db.RevisitModel.next_visit <= now)
+    if after is not None:
+        next_visit, revisit_id = after
+        query = query.where(
+            or_(
+                db.RevisitModel.next_visit > next_visit,
+                and_(
+                    db.RevisitModel.next_visit == next_visit,
+                    db.RevisitModel.id > revisit_id,
+                ),
+            )
+        )
+
+    query = query.order_by(db.RevisitModel.next_visit, db.RevisitModel.id).limit(limit)
+    return list(session.scalars(query))
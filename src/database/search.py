@@ -0,0 +1,442 @@
+import argparse
+import logging
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, sessionmaker
+
+try:
+    from . import db
+    from .text import html_text
+except ImportError:
+    import db
+    from text import html_text
+
+logger = logging.getLogger("Search")
+
+# The index lives next to the pages database, so every shard of a sharded crawl gets its own.
+SEARCH_DB_PATH = os.path.join(os.path.dirname(db.DB_PATH) or ".", "search.db")
+
+# bm25 weights of the title and body columns.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+_QUERY_TERM_PATTERN = re.compile(r"\w+")
+
+
+class SearchDocument(NamedTuple):
+    url: str
+    domain: str
+    crawled_at: str | None
+    title: str
+    text: str
+
+
+class SearchResult(NamedTuple):
+    url: str
+    title: str
+    snippet: str
+    score: float  # Higher is more relevant.
+
+
+class SearchResults(NamedTuple):
+    results: list[SearchResult]
+    total: int
+    page: int
+    per_page: int
+
+    @property
+    def pages(self) -> int:
+        return math.ceil(self.total / self.per_page)
+
+
+def to_match_query(query: str) -> str:
+    """
+    Turns free text into an FTS5 query for documents containing every word, so user input is never a syntax error.
+    i.e.: open "source -> "open" AND "source"
+    :param query: The text.
+    :return: The FTS5 query, empty if the text has no words.
+    """
+    return " AND ".join(f'"{term}"' for term in _QUERY_TERM_PATTERN.findall(query))
+
+
+class SearchIndex:
+    """
+    Full-text index of crawled pages' titles and text, in a SQLite FTS5 file of its own so indexing never holds the
+    pages database's write lock.
+
+    Documents are keyed by URL, indexing a URL again replaces its document. last_page_id records how far into the
+    pages table the index is, see SearchIndexer.
+    """
+
+    def __init__(self, path: str = SEARCH_DB_PATH, max_text_chars: int = 100_000):
+        """
+        :param path: Path to the SQLite file.
+        :param max_text_chars: How much of a page's text is indexed.
+        """
+        self.path = path
+        self.max_text_chars = max_text_chars
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, domain TEXT, crawled_at TEXT, "
+            "boost REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {
+            row[1] for row in self.connection.execute("PRAGMA table_info(documents)")
+        }
+        if "boost" not in columns:
+            self.connection.execute(
+                "ALTER TABLE documents ADD COLUMN boost REAL NOT NULL DEFAULT 0"
+            )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value) WITHOUT ROWID"
+        )
+
+        exists = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'pages_fts'"
+        ).fetchone()
+        if not exists:
+            self.connection.execute(
+                "CREATE VIRTUAL TABLE pages_fts USING fts5"
+                "(title, body, tokenize='porter unicode61 remove_diacritics 2')"
+            )
+            # Makes ORDER BY rank use the weighted bm25 without computing it in the query.
+            self.connection.execute(
+                "INSERT INTO pages_fts (pages_fts, rank) VALUES ('rank', ?)",
+                (f"bm25({TITLE_WEIGHT}, {BODY_WEIGHT})",),
+            )
+        self.connection.commit()
+
+    @property
+    def last_page_id(self) -> int:
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'last_page_id'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add_documents(
+        self, documents: Iterable[SearchDocument], last_page_id: int | None = None
+    ) -> int:
+        """
+        Indexes documents in a single transaction, replacing the documents of URLs that are already indexed.
+        :param documents: The documents.
+        :param last_page_id: Id of the last page the documents were read from, stored in the same transaction.
+        :return: The amount of documents indexed.
+        """
+        count = 0
+        with self.connection:
+            for document in documents:
+                (document_id,) = self.connection.execute(
+                    "INSERT INTO documents (url, domain, crawled_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (url) DO UPDATE SET domain = excluded.domain, crawled_at = excluded.crawled_at "
+                    "RETURNING id",
+                    (document.url, document.domain, document.crawled_at),
+                ).fetchone()
+                self.connection.execute(
+                    "DELETE FROM pages_fts WHERE rowid = ?", (document_id,)
+                )
+                self.connection.execute(
+                    "INSERT INTO pages_fts (rowid, title, body) VALUES (?, ?, ?)",
+                    (
+                        document_id,
+                        document.title or "",
+                        document.text[: self.max_text_chars],
+                    ),
+                )
+                count += 1
+
+            if last_page_id is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_page_id', ?)",
+                    (last_page_id,),
+                )
+        return count
+
+    def search(
+        self,
+        query: str,
+        page: int = 1,
+        per_page: int = 10,
+        snippet_tokens: int = 16,
+        highlight: tuple[str, str] = ("<b>", "</b>"),
+        raw: bool = False,
+        boost_weight: float = 0.2,
+    ) -> SearchResults:
+        """
+        Finds the documents matching a query, most relevant first.
+        :param query: Words that all have to appear, or an FTS5 query if raw is set.
+        :param page: The page of results, starting at 1.
+        :param per_page: Results per page.
+        :param snippet_tokens: Maximum amount of tokens in a snippet.
+        :param highlight: Text put around matched terms in the snippets.
+        :param raw: Pass the query to FTS5 as is, i.e. for phrase, prefix or NEAR queries.
+        :param boost_weight: How much a document's boost (see set_boosts) scales its bm25 score, 0 to ignore it.
+        :return: The page of results and the total amount of matching documents.
+        :raises ValueError: If per_page is below 1.
+        """
+        if per_page < 1:
+            raise ValueError("per_page must be at least 1.")
+
+        match = query if raw else to_match_query(query)
+        if not match:
+            return SearchResults(results=[], total=0, page=page, per_page=per_page)
+
+        (total,) = self.connection.execute(
+            "SELECT COUNT(*) FROM pages_fts WHERE pages_fts MATCH ?", (match,)
+        ).fetchone()
+
+        rows = self.connection.execute(
+            "SELECT documents.url, pages_fts.title, snippet(pages_fts, -1, ?, ?, '...', ?), "
+            "rank * (1 + ? * documents.boost) AS score "
+            "FROM pages_fts JOIN documents ON documents.id = pages_fts.rowid "
+            "WHERE pages_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?",
+            (
+                highlight[0],
+                highlight[1],
+                snippet_tokens,
+                boost_weight,
+                match,
+                per_page,
+                (max(page, 1) - 1) * per_page,
+            ),
+        )
+        results = [
+            SearchResult(url=url, title=title, snippet=snippet, score=-score)
+            for url, title, snippet, score in rows
+        ]
+        return SearchResults(results=results, total=total, page=page, per_page=per_page)
+
+    def set_boosts(self, boosts: Iterable[tuple[str, float]]) -> None:
+        """
+        Sets the ranking boost of indexed documents, i.e. from their PageRank, see pagerank.write_search_boosts.
+        URLs that aren't indexed are ignored.
+        :param boosts: (URL, boost) pairs, a boost of 0 leaves the bm25 score as is.
+        :return: None
+        """
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE documents SET boost = ? WHERE url = ?",
+                ((boost, url) for url, boost in boosts),
+            )
+
+    def optimize(self) -> None:
+        """
+        Merges the index's segments, worth doing once a large backfill is done.
+        :return: None
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO pages_fts (pages_fts) VALUES ('optimize')"
+            )
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def index_new_pages(index: SearchIndex, session, batch_size: int = 500) -> int:
+    """
+    Indexes the next batch of pages stored after the index's last_page_id.
+    :param index: The index.
+    :param session: Session on the pages database.
+    :param batch_size: Maximum amount of pages to index.
+    :return: The amount of pages indexed, 0 once the index has caught up.
+    """
+    pages = session.scalars(
+        select(db.PageModel)
+        .options(joinedload(db.PageModel.blob))
+        .where(db.PageModel.id > index.last_page_id)
+        .order_by(db.PageModel.id)
+        .limit(batch_size)
+    ).all()
+
+    documents = []
+    for page in pages:
+        content = page.content or b""
+        if isinstance(content, str):
+            content = content.encode("UTF-8")
+
+        documents.append(
+            SearchDocument(
+                url=page.url,
+                domain=page.domain,
+                crawled_at=page.crawled_at.isoformat() if page.crawled_at else None,
+                title=page.title or "",
+                text=html_text(content),
+            )
+        )
+
+    # End the read transaction so it doesn't pin the WAL.
+    session.commit()
+
+    if not pages:
+        return 0
+    return index.add_documents(documents, last_page_id=pages[-1].id)
+
+
+class SearchIndexer:
+    """
+    Keeps a SearchIndex up to date with the pages database from a background thread.
+
+    Pages are read back from the database once they're written, so the crawl loop never waits on indexing and
+    anything the crawler stored before the index existed gets indexed too. The thread still shares the GIL with the
+    crawler, for large crawls run python -m database.search index --follow in its own process instead.
+    """
+
+    def __init__(
+        self,
+        path: str = SEARCH_DB_PATH,
+        batch_size: int = 500,
+        interval: float = 10,
+        session_factory: sessionmaker | None = None,
+    ):
+        """
+        :param path: Path to the index's SQLite file.
+        :param batch_size: How many pages are indexed per transaction.
+        :param interval: Seconds between looking for new pages once the index has caught up.
+        :param session_factory: Sessions on the pages database, db.Session by default.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self.session_factory = session_factory or db.Session
+
+        self.documents_indexed = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="SearchIndexer", daemon=True
+        )
+        self._thread.start()
+
+    def _catch_up(self, index: SearchIndex, session) -> None:
+        while True:
+            try:
+                indexed = index_new_pages(index, session, self.batch_size)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"[Search] Failed to index pages: {e}")
+                return
+
+            if not indexed:
+                return
+            self.documents_indexed += indexed
+            logger.info(f"[Search] Indexed {indexed} pages")
+
+    def _run(self) -> None:
+        index = SearchIndex(self.path)
+        session = self.session_factory()
+
+        while True:
+            self._catch_up(index, session)
+            if self._stop.wait(self.interval):
+                break
+
+        # Index whatever was written before the crawler closed.
+        self._catch_up(index, session)
+
+        session.close()
+        index.close()
+
+    def close(self) -> None:
+        """
+        Indexes the pages written so far and stops the indexer thread, close the DBWriter first.
+        :return: None
+        """
+        if self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not at least 1")
+    return number
+
+
+def _print_results(results: SearchResults) -> None:
+    print(f"{results.total} results, page {results.page} of {max(results.pages, 1)}")
+    for i, result in enumerate(results.results):
+        print(
+            f"{(results.page - 1) * results.per_page + i + 1:>4}. {result.title} ({result.score:.2f})"
+        )
+        print(f"      {result.url}")
+        print(f"      {result.snippet}")
+
+
+if __name__ == "__main__":
+    # Run from the src directory:
+    # python -m database.search index [--follow]
+    # python -m database.search query "words to find" [--page 2]
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default=SEARCH_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="Index pages not indexed yet.")
+    index_parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep indexing new pages as they're written until interrupted.",
+    )
+    index_parser.add_argument("--batch-size", type=int, default=500)
+    index_parser.add_argument("--interval", type=float, default=10)
+
+    query_parser = commands.add_parser("query", help="Search the index.")
+    query_parser.add_argument("query")
+    query_parser.add_argument("--page", type=int, default=1)
+    query_parser.add_argument("--per-page", type=_positive_int, default=10)
+    query_parser.add_argument(
+        "--raw", action="store_true", help="Pass the query to FTS5 as is."
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "query":
+        search_index = SearchIndex(args.path)
+        _print_results(
+            search_index.search(
+                args.query, page=args.page, per_page=args.per_page, raw=args.raw
+            )
+        )
+        search_index.close()
+    elif args.follow:
+        indexer = SearchIndexer(
+            args.path, batch_size=args.batch_size, interval=args.interval
+        )
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            indexer.close()
+    else:
+        search_index = SearchIndex(args.path)
+        search_session = db.Session()
+        total = 0
+        while indexed := index_new_pages(search_index, search_session, args.batch_size):
+            total += indexed
+            logger.info(f"[Search] Indexed {total} pages")
+        search_index.optimize()
+        search_session.close()
+        search_index.close()
+        logger.info(f"[Search] Done, {total} pages indexed.")
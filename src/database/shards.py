@@ -0,0 +1,142 @@
+import json
+import os
+import zlib
+
+from typing import Callable, Iterable, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from . import db
+except ImportError:
+    import db
+
+T = TypeVar("T")
+
+SHARDS_DIRECTORY = "./dbs/shards"
+
+# File in the shards directory recording how many shards the crawl was split into.
+SHARDS_METADATA_FILE = "shards.json"
+
+
+def shard_for_domain(domain: str, shard_count: int) -> int:
+    """
+    Gets the shard that owns a domain, stable across processes and runs unlike hash().
+    :param domain: The domain.
+    :param shard_count: Amount of shards.
+    :return: The shard's index.
+    """
+    return zlib.crc32(db.normalize_domain(domain).encode()) % shard_count
+
+
+def shard_directory(shard: int, directory: str = SHARDS_DIRECTORY) -> str:
+    """
+    Gets the directory holding a shard's databases.
+    :param shard: The shard's index.
+    :param directory: Directory holding every shard.
+    :return: The shard's directory.
+    """
+    return os.path.join(directory, f"shard-{shard}")
+
+
+def shard_db_path(shard: int, directory: str = SHARDS_DIRECTORY) -> str:
+    return os.path.join(shard_directory(shard, directory), "pages.db")
+
+
+def write_shard_count(shard_count: int, directory: str = SHARDS_DIRECTORY) -> None:
+    """
+    Records how many shards a crawl is split into, see read_shard_count.
+    :param shard_count: Amount of shards.
+    :param directory: Directory holding every shard.
+    :return: None
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SHARDS_METADATA_FILE), "w") as f:
+        json.dump({"shard_count": shard_count}, f)
+
+
+def read_shard_count(directory: str = SHARDS_DIRECTORY) -> int:
+    """
+    Gets how many shards a crawl is split into. Shard directories left over from a crawl with more shards don't count.
+    :param directory: Directory holding every shard.
+    :raises FileNotFoundError: When the directory doesn't hold a sharded crawl.
+    :return: Amount of shards.
+    """
+    with open(os.path.join(directory, SHARDS_METADATA_FILE), "r") as f:
+        return json.load(f)["shard_count"]
+
+
+class ShardedDatabase:
+    """
+    Presents the pages databases of a sharded crawl as one.
+    Lookups by domain go straight to the owning shard, everything else runs on every shard and the results are merged.
+    """
+
+    def __init__(self, directory: str = SHARDS_DIRECTORY):
+        """
+        :param directory: Directory holding every shard, see shard_directory.
+        """
+        self.shard_count = read_shard_count(directory)
+
+        self.sessions: list[sessionmaker] = []
+        for shard in range(self.shard_count):
+            engine = db.create_db_engine(shard_db_path(shard, directory))
+            db.create_schema(engine)
+            self.sessions.append(sessionmaker(bind=engine))
+
+    def session_for_domain(self, domain: str):
+        """
+        Opens a session on the shard that owns the domain.
+        :param domain: The domain.
+        :return: A new session, the caller closes it.
+        """
+        return self.sessions[shard_for_domain(domain, self.shard_count)]()
+
+    def query_all(self, query: Callable[..., Iterable[T]]) -> list[T]:
+        """
+        Runs a query on every shard and concatenates the results.
+        :param query: Called with a session for each shard, returns that shard's results.
+        :return: The results of every shard.
+        """
+        results = []
+        for make_session in self.sessions:
+            with make_session() as session:
+                results.extend(query(session))
+        return results
+
+    def execute(self, sql: str, params: dict | None = None) -> list:
+        """
+        Runs raw SQL on every shard and concatenates the rows.
+        :param sql: The SQL.
+        :param params: Bound parameters.
+        :return: The rows of every shard.
+        """
+        return self.query_all(
+            lambda session: session.execute(text(sql), params or {}).all()
+        )
+
+    def count_pages(self) -> int:
+        return sum(
+            self.query_all(lambda session: [session.query(db.PageModel).count()])
+        )
+
+    def pages_for_url(self, url: str, domain: str) -> list[db.PageModel]:
+        """
+        Gets every crawl of a URL.
+        :param url: The URL.
+        :param domain: The URL's domain, picks the shard.
+        :return: The PageModels, detached from their session.
+        """
+        with self.session_for_domain(domain) as session:
+            pages = (
+                session.query(db.PageModel)
+                .filter(db.PageModel.url == url)
+                .order_by(db.PageModel.crawled_at)
+                .all()
+            )
+            for page in pages:
+                # Load the body while the session is open.
+                _ = page.blob
+            session.expunge_all()
+        return pages
@@ -0,0 +1,20 @@
+import html
+import re
+
+_SCRIPT_OR_STYLE_PATTERN = re.compile(
+    rb"<(script|style)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE
+)
+_TAG_PATTERN = re.compile(rb"<[^>]*>")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def html_text(content: bytes) -> str:
+    """
+    Gets the visible text of an HTML body, scripts, styles and tags are stripped without parsing the HTML.
+    :param content: The body.
+    :return: The text with whitespace collapsed.
+    """
+    content = _SCRIPT_OR_STYLE_PATTERN.sub(b" ", content)
+    content = _TAG_PATTERN.sub(b" ", content)
+    text = html.unescape(content.decode("UTF-8", errors="replace"))
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
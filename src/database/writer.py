@@ -0,0 +1,273 @@
+import collections
+import datetime
+import logging
+import queue
+import threading
+import time
+import typing
+
+from sqlalchemy import update
+
+try:
+    from . import db
+    from .blobs import store_page_rows
+    from .links import store_links
+    from .revisits import touch_pages, upsert_revisits
+except ImportError:
+    import db
+    from blobs import store_page_rows
+    from links import store_links
+    from revisits import touch_pages, upsert_revisits
+
+logger = logging.getLogger("DBWriter")
+
+# Queue marker asking the writer thread to flush and exit.
+_STOP = object()
+
+
+class DBWriter:
+    """
+    Write-behind writer for page rows, domain updates, revisit bookkeeping and the link graph.
+
+    Writes are queued and a background thread commits them in bulk, once batch_size writes have piled up or
+    flush_interval seconds have passed. The queue is bounded so a crawler outpacing the database blocks instead of
+    buffering without limit.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 2,
+        max_queue_size: int = 10000,
+        codec: str = "zlib",
+        compression_level: int | None = None,
+        flush_observer: typing.Callable[[float], None] | None = None,
+        max_retries: int = 3,
+        retry_delay: float = 0.5,
+    ):
+        """
+        :param batch_size: How many queued writes trigger a flush.
+        :param flush_interval: Maximum amount of seconds a write stays queued.
+        :param max_queue_size: How many writes can be queued before add_page/update_domain block.
+        :param codec: Codec page bodies are compressed with, see blobs.compress.
+        :param compression_level: Compression level for page bodies.
+        :param flush_observer: Called with the seconds every successful flush took.
+        :param max_retries: How many times a batch whose commit failed, i.e. on a locked database, is retried before
+        it's dropped.
+        :param retry_delay: Seconds before the first retry, doubled for every retry after it.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.codec = codec
+        self.compression_level = compression_level
+        self.flush_observer = flush_observer
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+
+        self.pages_written = 0
+        self.pages_dropped = 0
+        self.flushes = 0
+
+        # URLs whose writes have all been committed, see mark_crawled.
+        self.crawled_urls: collections.deque[str] = collections.deque()
+
+        self._thread = threading.Thread(target=self._run, name="DBWriter", daemon=True)
+        self._thread.start()
+
+    def add_page(self, row: dict) -> None:
+        """
+        Queues a page row.
+        :param row: Column values for a PageModel with the body under "content", see blobs.store_page_rows.
+        :return: None
+        """
+        self.queue.put(("page", row))
+
+    def update_domain(self, domain: str, last_crawled: datetime.datetime) -> None:
+        """
+        Queues a domain's last_crawled update.
+        :param domain: The domain.
+        :param last_crawled: When it was crawled.
+        :return: None
+        """
+        self.queue.put(("domain", (domain, last_crawled)))
+
+    def update_revisit(self, row: dict) -> None:
+        """
+        Queues a revisit upsert.
+        :param row: Column values for a RevisitModel, see revisits.upsert_revisits.
+        :return: None
+        """
+        self.queue.put(("revisit", row))
+
+    def touch_page(self, url: str, crawled_at: datetime.datetime) -> None:
+        """
+        Queues bumping crawled_at of a page that was revisited and found unchanged.
+        :param url: The page's URL.
+        :param crawled_at: When it was revisited.
+        :return: None
+        """
+        self.queue.put(("touch", (url, crawled_at)))
+
+    def add_links(self, url: str, links: set[str]) -> None:
+        """
+        Queues the links found on a crawled page for the link graph.
+        :param url: The page's URL.
+        :param links: URLs it links to.
+        :return: None
+        """
+        self.queue.put(("links", (url, links)))
+
+    def mark_crawled(self, url: str) -> None:
+        """
+        Queues a marker after the writes of a crawled URL, the URL is handed back by pop_crawled once they're
+        committed.
+        :param url: The URL.
+        :return: None
+        """
+        self.queue.put(("crawled", url))
+
+    def pop_crawled(self) -> list[str]:
+        """
+        Takes the URLs marked with mark_crawled whose writes have been committed, safe to call from any thread.
+        :return: The URLs.
+        """
+        urls = []
+        while self.crawled_urls:
+            urls.append(self.crawled_urls.popleft())
+        return urls
+
+    def _run(self) -> None:
+        session = db.Session()
+        pages: list[dict] = []
+        domains: dict[str, datetime.datetime] = dict()
+        revisits: dict[str, dict] = dict()
+        touched: dict[str, datetime.datetime] = dict()
+        links: dict[str, set[str]] = dict()
+        crawled: list[str] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            stopping = item is _STOP
+            if item is not None and not stopping:
+                kind, value = item
+                if kind == "page":
+                    pages.append(value)
+                elif kind == "revisit":
+                    revisits[value["url"]] = value
+                elif kind == "touch":
+                    url, crawled_at = value
+                    touched[url] = crawled_at
+                elif kind == "links":
+                    url, page_links = value
+                    links[url] = page_links
+                elif kind == "crawled":
+                    crawled.append(value)
+                else:
+                    domain, last_crawled = value
+                    domains[domain] = last_crawled
+
+            pending = (
+                len(pages) + len(domains) + len(revisits) + len(touched) + len(links)
+            )
+            if stopping or pending >= self.batch_size or time.monotonic() >= deadline:
+                # URLs whose writes failed aren't handed back, so a resumed crawl fetches them again.
+                if not pending or self._flush(
+                    session, pages, domains, revisits, touched, links
+                ):
+                    self.crawled_urls.extend(crawled)
+                crawled = []
+                pages = []
+                domains = dict()
+                revisits = dict()
+                touched = dict()
+                links = dict()
+                deadline = time.monotonic() + self.flush_interval
+
+            if stopping:
+                session.close()
+                return
+
+    def _flush(
+        self,
+        session,
+        pages: list[dict],
+        domains: dict[str, datetime.datetime],
+        revisits: dict[str, dict] | None = None,
+        touched: dict[str, datetime.datetime] | None = None,
+        links: dict[str, set[str]] | None = None,
+    ) -> bool:
+        """
+        Commits a batch of writes in a single transaction, retrying it if the commit fails.
+        :param session: The writer thread's session.
+        :param pages: Page rows to insert.
+        :param domains: Domain -> last_crawled updates.
+        :param revisits: URL -> revisit row to upsert.
+        :param touched: URL -> crawled_at of unchanged pages.
+        :param links: Page URL -> URLs it links to.
+        :return: True if the batch was committed, False if it was dropped.
+        """
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                store_page_rows(
+                    session, pages, codec=self.codec, level=self.compression_level
+                )
+
+                for domain, last_crawled in domains.items():
+                    session.execute(
+                        update(db.DomainModel)
+                        .where(db.DomainModel.domain == domain)
+                        .values(last_crawled=last_crawled)
+                    )
+
+                upsert_revisits(session, list((revisits or dict()).values()))
+                touch_pages(session, touched or dict())
+                store_links(session, links or dict())
+
+                session.commit()
+                break
+            except Exception as e:
+                session.rollback()
+                if attempt < self.max_retries:
+                    delay = self.retry_delay * 2**attempt
+                    logger.warning(
+                        f"[DB] Failed to write {len(pages)} pages and {len(domains)} domains, retrying in "
+                        f"{delay:.1f}s: {e}"
+                    )
+                    time.sleep(delay)
+                    continue
+
+                self.pages_dropped += len(pages)
+                logger.error(
+                    f"[DB] Dropping {len(pages)} pages and {len(domains)} domain updates after "
+                    f"{attempt + 1} attempts: {e}"
+                )
+                for row in pages:
+                    logger.error(f"[DB] Dropped page {row['url']}")
+                return False
+
+        if self.flush_observer is not None:
+            self.flush_observer(time.perf_counter() - start)
+
+        self.pages_written += len(pages)
+        self.flushes += 1
+        logger.info(
+            f"[DB] Wrote {len(pages)} pages, {len(domains)} domain updates and {len(revisits or ())} revisits"
+        )
+        return True
+
+    def close(self) -> None:
+        """
+        Flushes everything that's queued and stops the writer thread.
+        :return: None
+        """
+        if self._thread.is_alive():
+            self.queue.put(_STOP)
+            self._thread.join()
@@ -1,9 +1,11 @@
+import argparse
 import json
 import os.path
 import random
 import shutil
 
-from crawler import Crawler
+from crawler import Crawler, AsyncCrawler, run_sharded
+from crawler.exceptions import NoUrlException
 
 import logging
 import sys
@@ -11,26 +13,58 @@ import sys
 if __name__ == "__main__":
     logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Use the asyncio crawler which keeps many requests in flight at once.",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="Crawl with this many processes, each owning the domains that hash to it. Databases go to ./dbs/shards/.",
+    )
+    parser.add_argument(
+        "--shard-idle-timeout",
+        type=float,
+        default=None,
+        help="Seconds a shard that ran out of URLs waits for links from busy shards before stopping on its own. By "
+        "default every shard stops once the whole crawl is done.",
+    )
+    args = parser.parse_args()
+
+    crawler_class = AsyncCrawler if args.use_async else Crawler
+
     with open("./seeds.txt", "r") as f:
         seeds = [i.strip() for i in f.readlines()]
 
+    if args.shards:
+        run_sharded(args.shards, seeds, idle_timeout=args.shard_idle_timeout)
+        sys.exit(0)
+
     seed_url = random.choice(seeds)
 
+    # The frontier is checkpointed to ./dbs/frontier.db while crawling, the crawler resumes from it on its own.
+    # A to_crawl.json from older versions is imported once.
     if os.path.isfile("./to_crawl.json"):
         with open("./to_crawl.json", "r") as f:
             to_crawl = json.load(f)
-            crawler = Crawler(seed_url=seed_url, to_crawl=to_crawl)
+            crawler = crawler_class(seed_url=seed_url, to_crawl=to_crawl)
+        shutil.move("./to_crawl.json", "./to_crawl.json.old")
     else:
-        crawler = Crawler(seed_url=seed_url)
+        crawler = crawler_class(seed_url=seed_url)
+    # kill -USR1 <pid> or creating ./profile.request profiles the crawl loop, see StepProfiler.
+    crawler.profiler.install_signal_handler()
     try:
-        while True:
-            crawler.step()
-    except KeyboardInterrupt as e:
+        if args.use_async:
+            crawler.run()
+        else:
+            while True:
+                crawler.profiler.run_step(crawler.step)
+    except (KeyboardInterrupt, NoUrlException):
         pass
-
-    to_crawl = crawler.url_manager.to_crawl
-
-    if os.path.isfile("./to_crawl.json"):
-        shutil.move("./to_crawl.json", "./to_crawl.json.old")
-    with open("./to_crawl.json", "w") as f:
-        json.dump(to_crawl, f)
+    finally:
+        # Flushes the writer's queue, the frontier checkpoint, the seen URL store and the search index.
+        crawler.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Run from the src directory: python -m pytest tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.db creates its database on import, keep the tests' one out of ./dbs.
+os.environ["OWS_DB_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="ows-tests-"), "pages.db"
+)
@@ -0,0 +1,128 @@
+import pytest
+
+from crawler.exceptions import NoUrlException, WaitBeforeRetryException
+from crawler.frontier import (
+    PRIORITY_LEVELS,
+    Frontier,
+    FrontierEntry,
+    score_to_priority,
+)
+from crawler.urls import URLManager
+
+
+def test_score_to_priority():
+    assert score_to_priority(0) == 0
+    assert score_to_priority(0.5) == PRIORITY_LEVELS // 2
+    assert score_to_priority(1) == PRIORITY_LEVELS - 1
+    assert score_to_priority(-1) == 0
+    assert score_to_priority(2) == PRIORITY_LEVELS - 1
+
+
+def test_pop_order_is_priority_then_depth():
+    frontier = Frontier()
+    frontier.push("example.com", "https://example.com/deep-low", priority=1, depth=3)
+    frontier.push("example.com", "https://example.com/shallow-low", priority=1, depth=1)
+    frontier.push("example.com", "https://example.com/deep-high", priority=9, depth=5)
+    frontier.push("example.com", "https://example.com/seed", priority=0, depth=0)
+
+    popped = [frontier.pop("example.com") for _ in range(4)]
+
+    assert popped == [
+        FrontierEntry("https://example.com/deep-high", 9, 5),
+        FrontierEntry("https://example.com/shallow-low", 1, 1),
+        FrontierEntry("https://example.com/deep-low", 1, 3),
+        FrontierEntry("https://example.com/seed", 0, 0),
+    ]
+    assert "example.com" not in frontier
+    assert len(frontier) == 0
+    assert frontier.url_count == 0
+
+
+def test_pop_takes_every_url_of_the_best_bucket_first():
+    frontier = Frontier()
+    best = {f"https://example.com/{i}" for i in range(10)}
+    for url in best:
+        frontier.push("example.com", url, priority=5, depth=1)
+    frontier.push("example.com", "https://example.com/worse", priority=4, depth=1)
+
+    assert {frontier.pop("example.com").url for _ in range(10)} == best
+    assert frontier.pop("example.com").url == "https://example.com/worse"
+
+
+def test_domains_are_counted_and_removed_separately():
+    frontier = Frontier()
+    frontier.push("a.com", "https://a.com/1", priority=2)
+    frontier.push("a.com", "https://a.com/2", priority=7, depth=2)
+    frontier.push("b.com", "https://b.com/1")
+    frontier.push("c.com", "https://c.com/1", priority=3)
+
+    assert frontier.url_count == 4
+    assert frontier.domain_url_count("a.com") == 2
+    assert frontier.domain_url_count("missing.com") == 0
+    assert frontier["a.com"] == ["https://a.com/2", "https://a.com/1"]
+    assert frontier.best_key("a.com") > frontier.best_key("c.com")
+
+    removed = frontier.remove("a.com")
+
+    assert sorted(removed) == [
+        FrontierEntry("https://a.com/1", 2, 0),
+        FrontierEntry("https://a.com/2", 7, 2),
+    ]
+    assert "a.com" not in frontier
+    assert sorted(frontier.keys()) == ["b.com", "c.com"]
+    assert frontier.url_count == 2
+
+    # The slot moved into the removed one's place still pops its own URLs.
+    assert frontier.pop("c.com") == FrontierEntry("https://c.com/1", 3, 0)
+    assert frontier.pop("b.com") == FrontierEntry("https://b.com/1", 0, 0)
+    assert len(frontier) == 0
+
+
+def test_dict_round_trip():
+    to_crawl = {
+        "a.com": ["https://a.com/1", "https://a.com/2"],
+        "b.com": ["https://b.com/1"],
+    }
+    frontier = Frontier.from_dict(to_crawl)
+
+    assert frontier.url_count == 3
+    to_dict = frontier.to_dict()
+    assert {domain: sorted(urls) for domain, urls in to_dict.items()} == to_crawl
+
+
+def test_url_manager_pops_the_best_url_of_any_domain():
+    url_manager = URLManager(None)
+    url_manager.add_many_to_to_crawl_queue(
+        ["https://a.com/low", "https://b.com/high", "https://c.com/middle"],
+        depth=1,
+        scores={
+            "https://a.com/low": 0.1,
+            "https://b.com/high": 0.9,
+            "https://c.com/middle": 0.5,
+        },
+    )
+
+    popped = [url_manager.get_next_entry().url for _ in range(3)]
+
+    assert popped == [
+        "https://b.com/high",
+        "https://c.com/middle",
+        "https://a.com/low",
+    ]
+    with pytest.raises(NoUrlException):
+        url_manager.get_next_entry()
+
+
+def test_url_manager_waits_on_crawl_delays():
+    url_manager = URLManager(None)
+    url_manager.set_crawl_delay("a.com", 60)
+    url_manager.add_many_to_to_crawl_queue(
+        ["https://a.com/1", "https://a.com/2"], depth=1
+    )
+
+    url_manager.get_next_entry()
+    with pytest.raises(WaitBeforeRetryException) as error:
+        url_manager.get_next_entry()
+
+    assert 0 < error.value.retry_after <= 60
+    assert url_manager.to_crawl.domain_url_count("a.com") == 1
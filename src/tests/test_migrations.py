@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session
+
+from database.db import DomainModel, PageModel, create_db_engine, create_schema
+from database.migrations import MIGRATIONS, upgrade_schema
+
+# The schema databases were created with before there were migrations.
+ORIGINAL_SCHEMA = [
+    "CREATE TABLE pages (id INTEGER NOT NULL, status_code INTEGER, elapsed FLOAT, crawled_at DATETIME, "
+    "url VARCHAR, domain VARCHAR, title VARCHAR, content TEXT, PRIMARY KEY (id))",
+    "CREATE TABLE domains (id INTEGER NOT NULL, domain VARCHAR, robots VARCHAR, last_crawled DATETIME, "
+    "PRIMARY KEY (id))",
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db_engine(os.path.join(tmp_path, "pages.db"))
+    yield engine
+    engine.dispose()
+
+
+def user_version(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def test_upgrades_the_original_schema(engine):
+    with engine.begin() as connection:
+        for statement in ORIGINAL_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(
+            text(
+                "INSERT INTO domains (id, domain, robots, last_crawled) VALUES "
+                "(1, 'Example.com', '', '2024-01-01 00:00:00.000000'), "
+                "(2, 'example.com.', '', '2024-03-01 00:00:00.000000'), "
+                "(3, 'other.org', '', NULL)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO pages (status_code, url, domain, title, content) VALUES "
+                "(200, 'https://Example.com/', 'Example.com', 'Example', '<html></html>')"
+            )
+        )
+
+    create_schema(engine)
+
+    assert user_version(engine) == len(MIGRATIONS)
+
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns("pages")}
+    assert {"blob_id", "etag", "last_modified"} <= columns
+    assert {"ix_pages_url", "ix_pages_domain_crawled_at"} <= {
+        index["name"] for index in inspector.get_indexes("pages")
+    }
+    assert {"ix_domains_domain", "ix_domains_last_crawled"} <= {
+        index["name"] for index in inspector.get_indexes("domains")
+    }
+
+    with Session(engine) as session:
+        domains = session.execute(
+            select(
+                DomainModel.id, DomainModel.domain, DomainModel.last_crawled
+            ).order_by(DomainModel.id)
+        ).all()
+        assert [(id_, domain) for id_, domain, _ in domains] == [
+            (1, "example.com"),
+            (3, "other.org"),
+        ]
+        # Merged domains keep the latest crawl time.
+        assert domains[0].last_crawled.month == 3
+
+        page = session.execute(select(PageModel)).scalar_one()
+        assert page.domain == "example.com"
+        assert page.blob_id is None
+        assert page.content == "<html></html>"
+
+
+def test_new_database_starts_at_the_latest_version(engine):
+    create_schema(engine)
+    assert user_version(engine) == len(MIGRATIONS)
+
+    # Nothing's left to apply.
+    upgrade_schema(engine)
+    assert user_version(engine) == len(MIGRATIONS)
+
+
+def test_only_applies_missing_migrations(engine):
+    create_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("PRAGMA user_version=1"))
+        connection.execute(
+            text("INSERT INTO domains (domain, robots) VALUES ('Mixed.Case.com', '')")
+        )
+
+    upgrade_schema(engine)
+
+    assert user_version(engine) == len(MIGRATIONS)
+    with engine.connect() as connection:
+        assert connection.execute(
+            text("SELECT domain FROM domains")
+        ).scalars().all() == ["mixed.case.com"]